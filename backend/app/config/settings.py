@@ -15,11 +15,69 @@ class Settings(BaseSettings):
     DB_USER: str = "root"
     DB_PASSWORD: str = ""
     DB_NAME: str = "ecommerce"
+    DB_POOL_SIZE: int = 10  # 连接池常驻连接数（看板面板并发查询）
+    DB_MAX_OVERFLOW: int = 20  # 连接池临时溢出连接数
     
     # JWT配置
     SECRET_KEY: str = "your-secret-key-here-please-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440  # 24小时
+
+    # 查询结果缓存配置（ADS表只读，按数据集版本缓存）
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 缓存总容量上限（字节）
+    CACHE_TTL_SECONDS: int = 600  # 缓存新鲜期
+    CACHE_STALE_SECONDS: int = 300  # 过期后仍可返回旧值并后台刷新的时长
+    ADS_VERSION_CHECK_SECONDS: int = 30  # ADS数据集版本检查间隔
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 0  # 数据接口 Cache-Control max-age，0 表示每次用 ETag 协商
+
+    # 看板面板并发加载配置
+    PANEL_TIMEOUT_SECONDS: float = 5.0  # 单个面板的超时时间，超时后返回部分数据
+
+    # 价格敏感度全表扫描配置
+    PRICE_SCAN_CHUNK_ROWS: int = 50000  # 流式扫描每块行数（决定内存上限）
+    PRICE_SAMPLE_POINTS: int = 200  # 商品页散点图的分层抽样点数
+
+    # 流量趋势配置
+    TREND_MAX_POINTS: int = 120  # 趋势图最大点数（auto 粒度的选择依据，超过时 LTTB 降采样）
+
+    # 桑基图配置
+    SANKEY_TOP_K: int = 200  # /api/data/sankey 未指定 top_k 时最多下发的边数，其余合并到"其他"节点
+
+    # 全表导出配置
+    EXPORT_CHUNK_ROWS: int = 5000  # 服务端游标每块读取的行数
+
+    # 预测配置
+    FORECAST_HORIZON: int = 7  # 预测天数
+    FORECAST_HISTORY_DAYS: int = 7  # 预测页展示的历史天数
+    FORECAST_BACKTEST_FOLDS: int = 7  # 模型选择时滚动起点回测的折数
+    SKU_FORECAST_SHARD_SIZE: int = 2000  # 批量 SKU 预测每个分片的 SKU 数（etl/sku_forecast.py）
+    SKU_FORECAST_HISTORY_DAYS: int = 56  # 批量 SKU 预测拟合使用的天数
+
+    # 数据推送配置（SSE）
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # 空闲连接的保活间隔（同时用于检测客户端断开）
+
+    # 用户位图配置（app/crud/cohort.py）
+    COHORT_PERIODS: int = 7  # 同期群矩阵展示新用户之后第 0..N 天的留存
+
+    # 热门项草图配置（etl/build_ads.py 生成，商品页按日期范围合并）
+    HEAVY_HITTER_CAPACITY: int = 200  # 每天每个维度保存的计数器个数，合并误差不超过 范围总额/容量
+
+    # UV 去重草图配置（app/utils/hll.py）
+    UV_SKETCH_PRECISION: int = 14  # etl/build_ads.py 生成草图的精度，寄存器数为 2^精度，相对误差约 1.04/sqrt(2^精度)
+
+    # 批量导入配置（etl/loader.py）
+    LOADER_BATCH_ROWS: int = 10000  # executemany 每批行数
+
+    # ADS 构建配置（etl/build_ads.py，需要安装 pandas）
+    BUILD_CHUNK_ROWS: int = 1000000  # 每块读取的事件行数
+    SESSION_IDLE_MINUTES: int = 30  # 会话超过该分钟数没有新事件即视为结束
+
+    # 外排序会话统计配置（etl/sessionize.py，需要安装 pandas）
+    SESSIONIZE_RUN_ROWS: int = 2000000  # 每个有序段（溢写文件）的事件行数，同时是归并阶段缓冲的总行数
+
+    # ADS 本地副本配置（需要安装 duckdb）
+    ADS_REPLICA_MODE: str = "off"  # off：只读 MySQL；sync：从 MySQL 同步副本后读副本；offline：不连 MySQL，只读副本
+    ADS_REPLICA_DIR: str = "replica"  # 副本文件目录
     
     @property
     def DATABASE_URL(self) -> str:
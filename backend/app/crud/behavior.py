@@ -0,0 +1,150 @@
+"""
+按日切片的行为数据合并
+ads_*_daily 行为表（热力图、漏斗、桑基图、RFM）每个数据集版本只读取一次，
+在内存中按 (日期, 维度键) 组织，任意日期范围的汇总由数组运算得到：
+- DailyCube：维度键较少的表（热力图 日期×星期×小时、漏斗步骤、RFM分层）
+  保存按日期的前缀和矩阵，范围合计为两行相减，与日期范围长度无关
+- DailySparse：维度键很多的表（桑基图的边）按日期排序保存稀疏行，
+  范围合计为二分定位后对范围内的行做一次 bincount，避免 日期×边 的稠密矩阵
+日期筛选后的行为面板与不筛选时一样不按请求查询数据库。
+"""
+from datetime import date
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.data import (
+    ActivityHeatmapDaily,
+    ConversionFunnelDaily,
+    UserPathSankeyDaily,
+    UserRfmStatDaily,
+)
+from ..utils.cache import cached_query
+
+
+class _DailySlices:
+    """按日切片数据的公共部分：维度键列表和日期范围定位"""
+
+    def __init__(self, keys: List[Hashable], days: np.ndarray):
+        self.keys = keys
+        self.days = days
+
+    @property
+    def empty(self) -> bool:
+        """日表尚未导入数据"""
+        return len(self.days) == 0
+
+    def locate(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        """日期范围在日期数组中的下标区间 [i, j)"""
+        start = date.fromisoformat(start_date).toordinal()
+        end = date.fromisoformat(end_date).toordinal()
+        i = int(np.searchsorted(self.days, start, side="left"))
+        j = int(np.searchsorted(self.days, end, side="right"))
+        return i, max(i, j)
+
+
+class DailyCube(_DailySlices):
+    """稠密前缀和：cum[k, m] 为前 k 个日期中维度键 m 的合计"""
+
+    def __init__(self, keys: List[Hashable], days: np.ndarray, day_idx: np.ndarray, key_idx: np.ndarray, values: np.ndarray):
+        super().__init__(keys, days)
+        cube = np.zeros((len(days) + 1, len(keys)), dtype=np.int64)
+        np.add.at(cube, (day_idx + 1, key_idx), values)
+        self.cum = np.cumsum(cube, axis=0)
+
+    @property
+    def nbytes(self) -> int:
+        return self.cum.nbytes + self.days.nbytes + 64 * len(self.keys)
+
+    def total(self, start_date: str, end_date: str) -> Optional[np.ndarray]:
+        """日期范围内各维度键的合计；范围内没有数据时返回 None"""
+        i, j = self.locate(start_date, end_date)
+        if i >= j:
+            return None
+        return self.cum[j] - self.cum[i]
+
+
+class DailySparse(_DailySlices):
+    """稀疏切片：按日期排序的 (日期下标, 维度键下标, 数值) 行"""
+
+    def __init__(self, keys: List[Hashable], days: np.ndarray, day_idx: np.ndarray, key_idx: np.ndarray, values: np.ndarray):
+        super().__init__(keys, days)
+        order = np.argsort(day_idx, kind="stable")
+        self.key_idx = key_idx[order]
+        self.values = values[order]
+        # offsets[k] 为第 k 个日期的首行位置
+        self.offsets = np.searchsorted(day_idx[order], np.arange(len(days) + 1), side="left")
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.key_idx, self.values, self.offsets, self.days)
+        return sum(a.nbytes for a in arrays) + 64 * len(self.keys)
+
+    def total(self, start_date: str, end_date: str) -> Optional[np.ndarray]:
+        """日期范围内各维度键的合计；范围内没有数据时返回 None"""
+        i, j = self.locate(start_date, end_date)
+        if i >= j:
+            return None
+        rows = slice(self.offsets[i], self.offsets[j])
+        return np.bincount(
+            self.key_idx[rows], weights=self.values[rows], minlength=len(self.keys)
+        ).astype(np.int64)
+
+
+async def _load_slices(db: AsyncSession, dt_column, key_columns, value_column, cls):
+    """
+    读取整张日表，构建 DailyCube / DailySparse
+    维度键按字典序编号，保证相同数据得到相同的键顺序
+    """
+    result = await db.execute(select(dt_column, *key_columns, value_column))
+    rows = result.all()
+    day_ords = [row[0].toordinal() for row in rows]
+    raw_keys = [tuple(row[1:-1]) for row in rows]
+    values = [int(row[-1]) for row in rows]
+
+    keys = sorted(set(raw_keys))
+    key_pos: Dict[Tuple, int] = {key: i for i, key in enumerate(keys)}
+    day_array = np.array(day_ords, dtype=np.int64)
+    days, day_idx = np.unique(day_array, return_inverse=True)
+    key_idx = np.fromiter((key_pos[key] for key in raw_keys), dtype=np.int64, count=len(raw_keys))
+    return cls(keys, days, day_idx.astype(np.int64), key_idx, np.array(values, dtype=np.int64))
+
+
+@cached_query(ttl=None)
+async def get_heatmap_cube(db: AsyncSession) -> DailyCube:
+    """热力图日期×(小时, 星期)前缀和"""
+    return await _load_slices(
+        db, ActivityHeatmapDaily.dt,
+        (ActivityHeatmapDaily.hour_val, ActivityHeatmapDaily.week_val),
+        ActivityHeatmapDaily.activity_count, DailyCube,
+    )
+
+
+@cached_query(ttl=None)
+async def get_funnel_cube(db: AsyncSession) -> DailyCube:
+    """漏斗日期×步骤前缀和"""
+    return await _load_slices(
+        db, ConversionFunnelDaily.dt, (ConversionFunnelDaily.step_name,),
+        ConversionFunnelDaily.step_value, DailyCube,
+    )
+
+
+@cached_query(ttl=None)
+async def get_sankey_slices(db: AsyncSession) -> DailySparse:
+    """桑基图按日稀疏边"""
+    return await _load_slices(
+        db, UserPathSankeyDaily.dt,
+        (UserPathSankeyDaily.source_node, UserPathSankeyDaily.target_node),
+        UserPathSankeyDaily.flow_value, DailySparse,
+    )
+
+
+@cached_query(ttl=None)
+async def get_rfm_cube(db: AsyncSession) -> DailyCube:
+    """RFM 日期×分层前缀和"""
+    return await _load_slices(
+        db, UserRfmStatDaily.dt, (UserRfmStatDaily.rfm_segment,),
+        UserRfmStatDaily.user_count, DailyCube,
+    )
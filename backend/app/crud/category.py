@@ -0,0 +1,167 @@
+"""
+品类层级树
+ads_category_sales_stat 的 category_path 为点分隔路径（如 electronics.audio.headphone）。
+每个数据集版本读取一次全表，构建品类树并把销售额、销售笔数逐级汇总到每个祖先节点。
+旭日图下钻、词云、看板品类销售都由这棵树得出，不按请求查询数据库，也不再逐行 split。
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.data import CategorySalesStat
+from ..utils.cache import cached_query
+
+OTHER_NODE = "其他"
+
+
+class CategoryNode:
+    """
+    品类树节点
+    own_* 为该路径本身在表中的数值（中间路径可能没有对应行），sales/count 为含全部子孙的汇总
+    """
+    __slots__ = ("path", "name", "level", "own_sales", "own_count", "sales", "count", "has_row", "children")
+
+    def __init__(self, path: str, level: int):
+        self.path = path
+        self.name = path.rsplit(".", 1)[-1]
+        self.level = level
+        self.own_sales = 0.0
+        self.own_count = 0
+        self.sales = 0.0
+        self.count = 0
+        self.has_row = False
+        self.children: List["CategoryNode"] = []
+
+
+class CategoryTree:
+    """按数据集版本构建的品类树"""
+
+    def __init__(self, rows):
+        self.root = CategoryNode("", 0)
+        self.nodes: Dict[str, CategoryNode] = {"": self.root}
+        for path, sales, count in rows:
+            node = self._ensure(str(path))
+            node.own_sales += float(sales or 0)
+            node.own_count += int(count or 0)
+            node.has_row = True
+        self._roll_up(self.root)
+        # 有对应行的路径按自身数值排序，供扁平的看板品类销售和词云使用
+        self.rows = [node for node in self.nodes.values() if node.has_row]
+
+    @property
+    def nbytes(self) -> int:
+        return 256 * len(self.nodes)
+
+    def _ensure(self, path: str) -> CategoryNode:
+        """创建路径及其所有祖先节点"""
+        node = self.nodes.get(path)
+        if node is not None:
+            return node
+        parent_path, _, _ = path.rpartition(".")
+        parent = self._ensure(parent_path) if parent_path else self.root
+        node = CategoryNode(path, parent.level + 1)
+        parent.children.append(node)
+        self.nodes[path] = node
+        return node
+
+    def _roll_up(self, root: CategoryNode) -> None:
+        """后序遍历汇总子孙数值，子节点按销售额降序（同额按路径）排列"""
+        stack = [(root, False)]
+        while stack:
+            node, visited = stack.pop()
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children)
+                continue
+            node.sales = node.own_sales + sum(child.sales for child in node.children)
+            node.count = node.own_count + sum(child.count for child in node.children)
+            node.children.sort(key=lambda child: (-child.sales, child.path))
+
+    def find(self, root: Optional[str]) -> Optional[CategoryNode]:
+        """按路径查找节点，None 或空字符串为整棵树的根"""
+        return self.nodes.get((root or "").strip("."))
+
+    def subtree(self, root: Optional[str], depth: int, top_n: int) -> dict:
+        """
+        旭日图数据：root 以下 depth 层，每个节点最多 top_n 个子节点，其余合并为"其他"
+        节点自身有数值（中间路径也有对应行）时，父节点 value 大于子节点之和，旭日图会留出空隙
+        """
+        node = self.find(root)
+        if node is None:
+            return {"root": root, "value": 0, "count": 0, "children": []}
+        return {
+            "root": node.path or None,
+            "value": round(node.sales, 2),
+            "count": node.count,
+            "children": self._children(node, depth, top_n),
+        }
+
+    def _children(self, node: CategoryNode, depth: int, top_n: int) -> List[dict]:
+        if depth <= 0 or not node.children:
+            return []
+        shown = node.children[:top_n]
+        rest = node.children[top_n:]
+        children = []
+        for child in shown:
+            item = {"name": child.name, "path": child.path, "value": round(child.sales, 2), "count": child.count}
+            grandchildren = self._children(child, depth - 1, top_n)
+            if grandchildren:
+                item["children"] = grandchildren
+            children.append(item)
+        if rest:
+            children.append({
+                "name": OTHER_NODE,
+                "path": None,
+                "value": round(sum(child.sales for child in rest), 2),
+                "count": sum(child.count for child in rest),
+            })
+        return children
+
+    def level_nodes(self, root: Optional[str], depth: Optional[int]) -> List[CategoryNode]:
+        """
+        root 以下第 depth 层的节点；比该层浅的叶子节点也计入（路径较短的品类）
+        depth 为 None 时返回 root 以下所有有对应行的路径
+        """
+        node = self.find(root)
+        if node is None:
+            return []
+        if depth is None:
+            prefix = node.path + "." if node.path else ""
+            return [row for row in self.rows if row is node or row.path.startswith(prefix)]
+
+        result = []
+        stack = [node]
+        target = node.level + depth
+        while stack:
+            current = stack.pop()
+            if current.level == target or (not current.children and current is not node):
+                result.append(current)
+            else:
+                stack.extend(current.children)
+        return result
+
+
+@cached_query(ttl=None)
+async def get_category_tree(db: AsyncSession) -> CategoryTree:
+    """读取 ads_category_sales_stat 全表构建品类树（每个数据集版本一次）"""
+    result = await db.execute(
+        select(
+            CategorySalesStat.category_path,
+            CategorySalesStat.total_sales,
+            CategorySalesStat.sales_count
+        )
+    )
+    return CategoryTree(result.all())
+
+
+def top_by_sales(nodes: List[CategoryNode], top_n: int, rolled_up: bool) -> List[CategoryNode]:
+    """按销售额降序取前 top_n（同额按路径）"""
+    key = (lambda n: (-n.sales, n.path)) if rolled_up else (lambda n: (-n.own_sales, n.path))
+    return sorted(nodes, key=key)[:top_n]
+
+
+def top_by_count(nodes: List[CategoryNode], top_n: int, rolled_up: bool) -> List[CategoryNode]:
+    """按销售笔数降序取前 top_n（同数按路径）"""
+    key = (lambda n: (-n.count, n.path)) if rolled_up else (lambda n: (-n.own_count, n.path))
+    return sorted(nodes, key=key)[:top_n]
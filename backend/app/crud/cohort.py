@@ -0,0 +1,233 @@
+"""
+用户位图索引（精确去重、留存、同期群）
+ads_user_bitmap_daily 每个数据集版本只读取一次，每种行为（活跃/加购/购买）解码为 日期×字节 的位图矩阵，
+另外预先计算每天的新用户位图（当天活跃且此前各天都未活跃）。
+- 范围去重用户数：范围内各天位图按位或后计数
+- 第 N 日留存：第 d 天活跃用户与第 d+N 天活跃用户按位与后计数
+- 同期群：第 d 天的新用户分别与之后各天活跃用户按位与后计数
+- 漏斗交集：范围内活跃、加购、购买用户集合逐级按位与
+结果都是精确值；按请求只做按位运算，不查询数据库。
+"""
+import asyncio
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config.settings import settings
+from ..models.data import UserBitmapDaily
+from ..utils import bitmap
+from ..utils.cache import cached_query
+from .behavior import _DailySlices
+from .version import dataset_version, get_dataset_version
+
+BEHAVIORS = ("active", "cart", "purchase")
+RETENTION_DAYS = (1, 3, 7)
+# 留存/同期群按位与时每批参与计算的位图字节数上限
+OVERLAP_BLOCK_BYTES = 8 << 20
+
+
+class UserBitmapIndex(_DailySlices):
+    """按数据集版本构建的用户位图索引；matrix[行为][k] 为第 k 个日期的位图"""
+
+    def __init__(self, days: np.ndarray, matrix: Dict[str, np.ndarray]):
+        super().__init__(list(BEHAVIORS), days)
+        self.matrix = matrix
+        active = matrix["active"]
+        self.new_users = np.empty_like(active)
+        seen = np.zeros(active.shape[1], dtype=np.uint8)
+        for k in range(len(days)):
+            self.new_users[k] = active[k] & ~seen
+            seen |= active[k]
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + self.new_users.nbytes + sum(m.nbytes for m in self.matrix.values())
+
+    def users(self, behavior: str, i: int, j: int) -> np.ndarray:
+        """日下标区间 [i, j) 内有该行为的用户位图"""
+        return bitmap.union(self.matrix[behavior][i:j])
+
+    def day_index(self, ordinal: int) -> Optional[int]:
+        """日期序号在日期数组中的下标；该日没有数据时返回 None"""
+        k = int(np.searchsorted(self.days, ordinal))
+        return k if k < len(self.days) and self.days[k] == ordinal else None
+
+    def span(self, start_date: Optional[str], end_date: Optional[str]):
+        """日期范围对应的下标区间 [i, j)；未指定范围时为全部日期"""
+        if not start_date or not end_date:
+            return 0, len(self.days)
+        return self.locate(start_date, end_date)
+
+    def overlap(self, sources: np.ndarray, offsets: List[int], rows: range) -> List[List[Optional[int]]]:
+        """
+        sources[k] 中的用户在 rows[k] 对应日期之后第 offsets 天仍活跃的人数
+        返回 len(rows)×len(offsets) 的列表，目标日期不在数据中时为 None
+        逐个偏移、每次最多 OVERLAP_BLOCK_BYTES 字节的行参与按位与，临时内存与日期范围长度无关
+        """
+        result: List[List[Optional[int]]] = [[None] * len(offsets) for _ in rows]
+        block = max(OVERLAP_BLOCK_BYTES // max(sources.shape[1], 1), 1)
+        active = self.matrix["active"]
+        for column, offset in enumerate(offsets):
+            targets = [self.day_index(int(self.days[k]) + offset) for k in rows]
+            found = np.array([row for row, target in enumerate(targets) if target is not None], dtype=np.int64)
+            for start in range(0, len(found), block):
+                part = found[start:start + block]
+                target = np.array([targets[row] for row in part.tolist()], dtype=np.int64)
+                counts = bitmap.count_rows(sources[part] & active[target])
+                for row, value in zip(part.tolist(), counts.tolist()):
+                    result[row][column] = value
+        return result
+
+
+async def _load_bitmap_index(db: AsyncSession) -> UserBitmapIndex:
+    """整表读取 ads_user_bitmap_daily 构建位图索引"""
+    result = await db.execute(
+        select(UserBitmapDaily.dt, UserBitmapDaily.behavior, UserBitmapDaily.bitmap)
+    )
+    rows = [(row.dt.toordinal(), row.behavior, bitmap.decode(row.bitmap)) for row in result.all()]
+    days = np.array(sorted({row[0] for row in rows}), dtype=np.int64)
+    width = max((len(row[2]) for row in rows), default=0)
+    matrix = {behavior: np.zeros((len(days), width), dtype=np.uint8) for behavior in BEHAVIORS}
+    for ordinal, behavior, bits in rows:
+        if behavior in matrix:
+            matrix[behavior][int(np.searchsorted(days, ordinal))] = bitmap.resize(bits, width)
+    return UserBitmapIndex(days, matrix)
+
+
+class BitmapIndexHolder:
+    """
+    按数据集版本保存位图索引
+    索引约为 4×天数×用户数/8 字节，可能接近或超过结果缓存的 CACHE_MAX_BYTES，
+    单独保存、不参与按字节的 LRU 淘汰；每个版本只构建一次，版本变化后释放旧索引
+    """
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        self.index: Optional[UserBitmapIndex] = None
+        self.loads = 0
+        self._lock = asyncio.Lock()
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "bytes": self.index.nbytes if self.index is not None else 0,
+            "loads": self.loads,
+        }
+
+    async def get(self, db: AsyncSession) -> UserBitmapIndex:
+        version = await get_dataset_version()
+        if self.index is not None and self.version == version:
+            return self.index
+        async with self._lock:
+            # 等锁期间可能已由其他协程构建
+            if self.index is None or self.version != version:
+                self.index = await _load_bitmap_index(db)
+                self.version = version
+                self.loads += 1
+        return self.index
+
+    async def drop_outdated(self, version: str) -> None:
+        """数据集版本变化后释放旧版本的索引"""
+        if self.version != version:
+            self.index = None
+            self.version = None
+
+
+bitmap_index = BitmapIndexHolder()
+dataset_version.add_listener(bitmap_index.drop_outdated)
+
+
+async def get_bitmap_index(db: AsyncSession) -> UserBitmapIndex:
+    """当前数据集版本的位图索引（每个版本整表读取一次）"""
+    return await bitmap_index.get(db)
+
+
+def _rate(part: int, base: int) -> Optional[float]:
+    """百分比，保留两位小数；基数为 0 时为 None"""
+    return round(part * 100 / base, 2) if base else None
+
+
+def _empty_activity() -> dict:
+    """用户活跃交集的空结果"""
+    return {"activeUsers": 0, "cartUsers": 0, "purchaseUsers": 0, "funnel": []}
+
+
+@cached_query(fallback=_empty_activity)
+async def get_user_activity(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
+    """
+    范围内的精确去重用户数和漏斗交集
+    漏斗：活跃用户 → 其中加购过的用户 → 其中加购且购买过的用户
+    """
+    index = await get_bitmap_index(db)
+    i, j = index.span(start_date, end_date)
+    if i >= j:
+        return _empty_activity()
+    active = index.users("active", i, j)
+    cart = index.users("cart", i, j) & active
+    purchase = index.users("purchase", i, j) & active
+    counts = bitmap.count_rows(np.stack([active, cart, purchase, cart & purchase])).tolist()
+    return {
+        "activeUsers": counts[0],
+        "cartUsers": counts[1],
+        "purchaseUsers": counts[2],
+        "funnel": [
+            {"name": "活跃用户", "value": counts[0]},
+            {"name": "加购用户", "value": counts[1]},
+            {"name": "加购并购买", "value": counts[3]},
+        ],
+    }
+
+
+def _empty_retention() -> dict:
+    """留存曲线的空结果"""
+    return {"xAxis": [], "series": []}
+
+
+@cached_query(fallback=_empty_retention)
+async def get_retention(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
+    """
+    范围内每天活跃用户的第 1/3/7 日留存率（%）
+    第 d+N 天不在数据中时为 None
+    """
+    index = await get_bitmap_index(db)
+    i, j = index.span(start_date, end_date)
+    if i >= j:
+        return _empty_retention()
+    sources = index.matrix["active"][i:j]
+    base = bitmap.count_rows(sources).tolist()
+    retained = index.overlap(sources, list(RETENTION_DAYS), range(i, j))
+    series = [
+        {
+            "name": f"第{n}日留存",
+            "data": [None if row[column] is None else _rate(row[column], size) for row, size in zip(retained, base)],
+        }
+        for column, n in enumerate(RETENTION_DAYS)
+    ]
+    return {
+        "xAxis": [date.fromordinal(int(ordinal)).isoformat() for ordinal in index.days[i:j]],
+        "series": series,
+    }
+
+
+@cached_query(fallback=list)
+async def get_cohorts(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
+    """
+    新用户同期群：范围内每天的新用户数，及其在之后第 0..COHORT_PERIODS 天仍活跃的比例（%）
+    新用户为当天活跃且在数据中更早的日期都未活跃的用户；之后的日期不在数据中时为 None
+    """
+    index = await get_bitmap_index(db)
+    i, j = index.span(start_date, end_date)
+    sources = index.new_users[i:j]
+    sizes = bitmap.count_rows(sources).tolist()
+    retained = index.overlap(sources, list(range(settings.COHORT_PERIODS + 1)), range(i, j))
+    return [
+        {
+            "date": date.fromordinal(int(index.days[k])).isoformat(),
+            "size": size,
+            "retention": [None if value is None else _rate(value, size) for value in row],
+        }
+        for k, size, row in zip(range(i, j), sizes, retained)
+    ]
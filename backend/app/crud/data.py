@@ -2,309 +2,416 @@
 数据CRUD操作（ORM版本）
 使用 SQLAlchemy ORM 模型进行数据库查询，替代原生SQL
 所有 ads_* 数据仓库表通过 ORM 模型访问
+读取函数经 @cached_query 按 ADS 数据集版本缓存，查询异常时返回空值且不写入缓存
 """
+from datetime import timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
 from typing import Optional
 
+import numpy as np
+
+from ..config.settings import settings
+from ..utils.cache import cached_query
+from ..utils.forecast import forecast as forecast_model
+from .price import get_price_distribution
+from .traffic import build_trend, get_traffic_index
+from .sankey import SankeyGraph, get_sankey_graph
+from .category import get_category_tree, top_by_count, top_by_sales
+from .ranking import get_ranking_page
+from . import behavior as behavior_crud
+from . import top_sales as top_sales_crud
 from ..models.data import (
-    TrafficTrendDaily,
     ActivityHeatmap,
-    CategorySalesStat,
     BrandSalesTop10,
     ConversionFunnel,
-    UserPathSankey,
     UserRfmStat,
-    SkuPriceSensitivity,
 )
 
 
 # ==================== 辅助函数 ====================
 
+def _empty_traffic_trend() -> dict:
+    """流量趋势的空结果"""
+    return {
+        "xAxis": [],
+        "series": [
+            {"name": "PV (浏览量)", "data": []},
+            {"name": "UV (访客数)", "data": []}
+        ]
+    }
+
+
+def _empty_dashboard_plan() -> dict:
+    """看板查询计划的空结果"""
+    return {
+        "has_data": False,
+        "metrics": {"gmv": 0, "pv": 0, "uv": 0},
+    }
+
+
+@cached_query(fallback=_empty_dashboard_plan)
+async def get_dashboard_plan(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
+    """
+    看板查询计划：范围探测结果和GMV/PV/UV汇总。
+    由流量趋势索引的前缀和数组得出——二分定位日期范围后两次数组查找相减，
+    不按请求查询数据库（索引每个数据集版本只构建一次）。
+    指标卡片以及其他面板的"范围内是否有数据"判断都由此结果推导。
+    """
+    index = await get_traffic_index(db)
+    i, j = index.locate(start_date, end_date)
+    if i >= j:
+        plan = _empty_dashboard_plan()
+        # 未指定日期时不做范围限制，与原逻辑一致
+        plan["has_data"] = not (start_date and end_date)
+        return plan
+
+    return {
+        "has_data": True,
+        "metrics": index.metrics(i, j),
+    }
+
+
 async def _has_data_in_range(db: AsyncSession, start_date: str, end_date: str) -> bool:
     """
     检查指定日期范围内是否有数据（基于TrafficTrendDaily表）。
     由于数据仅覆盖某一个月（如2019-10），如果用户筛选到其他月份，
     所有图表和数字都应该为空。
+    结果取自看板查询计划（趋势索引），不单独发起探测查询。
     """
     if not start_date or not end_date:
         return True
 
-    result = await db.execute(
-        select(func.count()).select_from(TrafficTrendDaily).where(
-            TrafficTrendDaily.dt >= start_date,
-            TrafficTrendDaily.dt <= end_date
-        )
-    )
-    count = result.scalar()
-    return count > 0 if count else False
+    plan = await get_dashboard_plan(db, start_date, end_date)
+    return plan["has_data"]
 
 
 # ==================== Dashboard数据读取 ====================
 
+@cached_query(fallback=lambda: {"gmv": 0, "pv": 0, "uv": 0})
 async def get_dashboard_metrics(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
     """
     获取看板核心指标（GMV/PV/UV）
     支持日期过滤：当日期范围内无数据时返回零值
     """
-    empty = {"gmv": 0, "pv": 0, "uv": 0}
+    plan = await get_dashboard_plan(db, start_date, end_date)
+    return plan["metrics"]
+
 
+@cached_query(fallback=list)
+async def get_activity_heatmap(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
+    """
+    获取活动热力图数据
+    指定日期范围且按日表已有数据时，合并范围内的日切片；否则读取整月汇总表
+    """
     if start_date and end_date:
+        cube = await behavior_crud.get_heatmap_cube(db)
+        if not cube.empty:
+            totals = cube.total(start_date, end_date)
+            if totals is None:
+                return []
+            return [[int(hour), int(week), count] for (hour, week), count in zip(cube.keys, totals.tolist())]
         has_data = await _has_data_in_range(db, start_date, end_date)
         if not has_data:
-            return empty
-
-    try:
-        query = select(
-            func.sum(TrafficTrendDaily.total_pv).label("pv"),
-            func.sum(TrafficTrendDaily.total_uv).label("uv"),
-            func.sum(TrafficTrendDaily.total_gmv).label("gmv"),
-        )
-        if start_date and end_date:
-            query = query.where(
-                TrafficTrendDaily.dt >= start_date,
-                TrafficTrendDaily.dt <= end_date
-            )
+            return []
 
-        result = await db.execute(query)
-        row = result.one()
-        return {
-            "gmv": float(row.gmv) if row.gmv else 0,
-            "pv": int(row.pv) if row.pv else 0,
-            "uv": int(row.uv) if row.uv else 0,
-        }
-    except Exception as e:
-        print(f"get_dashboard_metrics error: {e}")
-        return empty
+    result = await db.execute(
+        select(
+            ActivityHeatmap.hour_val,
+            ActivityHeatmap.week_val,
+            ActivityHeatmap.activity_count
+        ).order_by(ActivityHeatmap.hour_val, ActivityHeatmap.week_val)
+    )
+    rows = result.all()
+    return [[int(row.hour_val), int(row.week_val), int(row.activity_count)] for row in rows]
 
 
-async def get_activity_heatmap(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
-    """获取活动热力图数据"""
+@cached_query(fallback=list)
+async def get_category_sales(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
+    """获取品类销售数据（旭日图TOP20，取自品类树）"""
     if start_date and end_date:
         has_data = await _has_data_in_range(db, start_date, end_date)
         if not has_data:
             return []
 
-    try:
-        result = await db.execute(
-            select(
-                ActivityHeatmap.hour_val,
-                ActivityHeatmap.week_val,
-                ActivityHeatmap.activity_count
-            ).order_by(ActivityHeatmap.hour_val, ActivityHeatmap.week_val)
-        )
-        rows = result.all()
-        return [[int(row.hour_val), int(row.week_val), int(row.activity_count)] for row in rows]
-    except Exception as e:
-        print(f"get_activity_heatmap error: {e}")
-        return []
+    tree = await get_category_tree(db)
+    return [
+        {"name": node.path, "value": node.own_sales}
+        for node in top_by_sales(tree.rows, 20, rolled_up=False)
+    ]
 
 
-async def get_category_sales(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
-    """获取品类销售数据（旭日图TOP20）"""
+@cached_query(fallback=lambda: {"root": None, "value": 0, "count": 0, "children": []})
+async def get_category_hierarchy(db: AsyncSession, root: str = None, depth: int = 2, top_n: int = 20) -> dict:
+    """
+    获取品类层级（旭日图下钻）
+    :param root: 起始品类路径，默认为全部一级品类
+    :param depth: 向下展开的层数
+    :param top_n: 每个节点最多展示的子品类数，其余合并为"其他"
+    """
+    tree = await get_category_tree(db)
+    return tree.subtree(root, depth, top_n)
+
+
+@cached_query(fallback=_empty_traffic_trend)
+async def get_traffic_trend(
+    db: AsyncSession,
+    start_date: str = None,
+    end_date: str = None,
+    resolution: str = "auto",
+    points: Optional[int] = None,
+) -> dict:
+    """
+    获取流量趋势数据（支持日期过滤）
+    由按数据集版本构建的趋势索引切片得到，不按请求查询数据库
+    :param resolution: day / week / month / auto（auto 取点数不超过上限的最细粒度）
+    :param points: 最大点数，默认 TREND_MAX_POINTS，超过时做 LTTB 降采样
+    """
+    index = await get_traffic_index(db)
+    trend = build_trend(index, start_date, end_date, resolution, points)
+    return trend if trend is not None else _empty_traffic_trend()
+
+
+# ==================== 转化数据读取 ====================
+
+@cached_query(fallback=list)
+async def get_conversion_funnel(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
+    """
+    获取转化漏斗数据
+    指定日期范围且按日表已有数据时，合并范围内的日切片；否则读取整月汇总表
+    """
     if start_date and end_date:
+        cube = await behavior_crud.get_funnel_cube(db)
+        if not cube.empty:
+            totals = cube.total(start_date, end_date)
+            if totals is None:
+                return []
+            steps = [{"name": str(name), "value": value} for (name,), value in zip(cube.keys, totals.tolist())]
+            return sorted(steps, key=lambda step: -step["value"])
         has_data = await _has_data_in_range(db, start_date, end_date)
         if not has_data:
             return []
 
-    try:
-        result = await db.execute(
-            select(
-                CategorySalesStat.category_path,
-                CategorySalesStat.total_sales
-            ).order_by(CategorySalesStat.total_sales.desc()).limit(20)
-        )
-        rows = result.all()
-        return [{"name": str(row.category_path), "value": float(row.total_sales)} for row in rows]
-    except Exception as e:
-        print(f"get_category_sales error: {e}")
-        return []
-
-
-async def get_traffic_trend(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
-    """获取流量趋势数据（支持日期过滤）"""
-    empty = {
-        "xAxis": [],
-        "series": [
-            {"name": "PV (浏览量)", "data": []},
-            {"name": "UV (访客数)", "data": []}
-        ]
-    }
+    result = await db.execute(
+        select(
+            ConversionFunnel.step_name,
+            ConversionFunnel.step_value
+        ).order_by(ConversionFunnel.step_value.desc())
+    )
+    rows = result.all()
+    return [{"name": str(row.step_name), "value": int(row.step_value)} for row in rows]
+
+
+def _empty_sankey() -> dict:
+    """桑基图的空结果"""
+    return {"nodes": [], "links": []}
 
-    try:
-        query = select(
-            TrafficTrendDaily.dt,
-            TrafficTrendDaily.total_pv,
-            TrafficTrendDaily.total_uv
-        ).order_by(TrafficTrendDaily.dt)
-
-        if start_date and end_date:
-            query = query.where(
-                TrafficTrendDaily.dt >= start_date,
-                TrafficTrendDaily.dt <= end_date
+
+@cached_query(fallback=_empty_sankey)
+async def get_sankey_data(
+    db: AsyncSession,
+    start_date: str = None,
+    end_date: str = None,
+    top_k: Optional[int] = None,
+    min_share: float = 0.0,
+    max_depth: Optional[int] = None,
+    compact: bool = False,
+) -> dict:
+    """
+    获取桑基图数据
+    使用按数据集版本编译好的整数编号图剪枝后输出；指定日期范围且按日表已有数据时，
+    由范围内合并后的边（只保留流量大于0的边）编译
+    :param top_k: 最多保留的边数，其余按来源合并到"其他"节点；None 为不限（/conversion 的桑基图面板输出全部边）
+    :param min_share: 边流量占总流量的最小比例
+    :param max_depth: 从入口节点出发的最大步数
+    :param compact: 为 True 时边用节点下标表示，并附带剪枝统计
+    """
+    graph = None
+    if start_date and end_date:
+        slices = await behavior_crud.get_sankey_slices(db)
+        if not slices.empty:
+            totals = slices.total(start_date, end_date)
+            if totals is None:
+                return _empty_sankey()
+            graph = SankeyGraph.from_edges(
+                (source, target, value)
+                for (source, target), value in zip(slices.keys, totals.tolist()) if value > 0
             )
+        else:
+            has_data = await _has_data_in_range(db, start_date, end_date)
+            if not has_data:
+                return _empty_sankey()
+    if graph is None:
+        graph = await get_sankey_graph(db)
 
-        result = await db.execute(query)
-        rows = result.all()
+    links, pruned = graph.prune(top_k, min_share, max_depth)
+    data = graph.encode(links, by_index=compact)
+    if compact:
+        data["totalLinks"] = len(graph.value)
+        data["prunedLinks"] = pruned
+    return data
 
-        if rows:
-            return {
-                "xAxis": [str(row.dt) for row in rows],
-                "series": [
-                    {"name": "PV (浏览量)", "data": [int(row.total_pv) for row in rows]},
-                    {"name": "UV (访客数)", "data": [int(row.total_uv) for row in rows]}
-                ]
-            }
-        return empty
-    except Exception as e:
-        print(f"get_traffic_trend error: {e}")
-        return empty
 
+# ==================== 商品数据读取 ====================
 
-# ==================== 转化数据读取 ====================
+@cached_query(fallback=lambda: {"brands": [], "sales": [], "errors": []})
+async def get_brand_top10(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
+    """
+    获取品牌TOP10
+    指定日期范围且热门项草图表已有数据时，合并范围内每天的草图（sales 为上界，errors 为误差）；
+    否则优先取全量品牌表 ads_brand_sales_stat 排行的第一页，该表尚未导入时读取 ads_brand_sales_top10
+    """
+    if start_date and end_date:
+        top = await top_sales_crud.get_top_sales(db, "brand", start_date, end_date, 10)
+        if top is not None:
+            return {"brands": top["names"], "sales": top["sales"], "errors": top["errors"]}
+        has_data = await _has_data_in_range(db, start_date, end_date)
+        if not has_data:
+            return {"brands": [], "sales": [], "errors": []}
 
-async def get_conversion_funnel(db: AsyncSession) -> list:
-    """获取转化漏斗数据"""
-    try:
-        result = await db.execute(
-            select(
-                ConversionFunnel.step_name,
-                ConversionFunnel.step_value
-            ).order_by(ConversionFunnel.step_value.desc())
-        )
-        rows = result.all()
-        return [{"name": str(row.step_name), "value": int(row.step_value)} for row in rows]
-    except Exception as e:
-        print(f"get_conversion_funnel error: {e}")
-        return []
-
-
-async def get_sankey_data(db: AsyncSession) -> dict:
-    """获取桑基图数据"""
-    try:
-        result = await db.execute(
-            select(
-                UserPathSankey.source_node,
-                UserPathSankey.target_node,
-                UserPathSankey.flow_value
-            )
-        )
-        rows = result.all()
-
-        if rows:
-            nodes_set = set()
-            links = []
-            for row in rows:
-                source = str(row.source_node)
-                target = str(row.target_node)
-                value = int(row.flow_value)
-                nodes_set.add(source)
-                nodes_set.add(target)
-                links.append({"source": source, "target": target, "value": value})
-
-            nodes = [{"name": node} for node in nodes_set]
-            return {"nodes": nodes, "links": links}
-        return {"nodes": [], "links": []}
-    except Exception as e:
-        print(f"get_sankey_data error: {e}")
-        return {"nodes": [], "links": []}
+    page = await get_ranking_page(db, "brand", limit=10)
+    if page["items"]:
+        return {
+            "brands": [item["brand"] for item in page["items"]],
+            "sales": [item["sales"] for item in page["items"]],
+            "errors": [0.0] * len(page["items"]),
+        }
 
+    result = await db.execute(
+        select(
+            BrandSalesTop10.brand_name,
+            BrandSalesTop10.total_sales
+        ).order_by(BrandSalesTop10.total_sales.desc()).limit(10)
+    )
+    rows = result.all()
 
-# ==================== 商品数据读取 ====================
+    if rows:
+        return {
+            "brands": [str(row.brand_name) for row in rows],
+            "sales": [float(row.total_sales) for row in rows],
+            "errors": [0.0] * len(rows),
+        }
+    return {"brands": [], "sales": [], "errors": []}
 
-async def get_brand_top10(db: AsyncSession) -> dict:
-    """获取品牌TOP10"""
-    try:
-        result = await db.execute(
-            select(
-                BrandSalesTop10.brand_name,
-                BrandSalesTop10.total_sales
-            ).order_by(BrandSalesTop10.total_sales.desc()).limit(10)
-        )
-        rows = result.all()
-
-        if rows:
-            return {
-                "brands": [str(row.brand_name) for row in rows],
-                "sales": [float(row.total_sales) for row in rows]
-            }
-        return {"brands": [], "sales": []}
-    except Exception as e:
-        print(f"get_brand_top10 error: {e}")
-        return {"brands": [], "sales": []}
-
-
-async def get_category_wordcloud(db: AsyncSession) -> list:
-    """获取品类词云数据"""
-    try:
-        result = await db.execute(
-            select(
-                CategorySalesStat.category_path,
-                CategorySalesStat.sales_count
-            ).order_by(CategorySalesStat.sales_count.desc()).limit(32)
-        )
-        rows = result.all()
-        return [
-            {
-                "name": str(row.category_path).split('.')[-1] if '.' in str(row.category_path) else str(row.category_path),
-                "value": int(row.sales_count)
-            }
-            for row in rows
-        ]
-    except Exception as e:
-        print(f"get_category_wordcloud error: {e}")
-        return []
 
+@cached_query(fallback=lambda: {"categories": [], "sales": [], "errors": []})
+async def get_category_top10(db: AsyncSession, start_date: str = None, end_date: str = None) -> dict:
+    """
+    获取品类（品类路径自身销售额）TOP10
+    指定日期范围且热门项草图表已有数据时合并范围内每天的草图；否则取自品类树
+    """
+    if start_date and end_date:
+        top = await top_sales_crud.get_top_sales(db, "category", start_date, end_date, 10)
+        if top is not None:
+            return {"categories": top["names"], "sales": top["sales"], "errors": top["errors"]}
+        has_data = await _has_data_in_range(db, start_date, end_date)
+        if not has_data:
+            return {"categories": [], "sales": [], "errors": []}
 
+    tree = await get_category_tree(db)
+    nodes = top_by_sales(tree.rows, 10, rolled_up=False)
+    return {
+        "categories": [node.path for node in nodes],
+        "sales": [node.own_sales for node in nodes],
+        "errors": [0.0] * len(nodes),
+    }
+
+
+@cached_query(fallback=list)
+async def get_category_wordcloud(
+    db: AsyncSession, root: str = None, depth: Optional[int] = None, top_n: int = 32
+) -> list:
+    """
+    获取品类词云数据（取自品类树）
+    :param root: 只统计该品类路径下的子品类
+    :param depth: 统计 root 以下第几层的汇总数值；默认使用表中各路径自身的数值
+    :param top_n: 词数
+    """
+    tree = await get_category_tree(db)
+    rolled_up = depth is not None
+    nodes = top_by_count(tree.level_nodes(root, depth), top_n, rolled_up)
+    return [{"name": node.name, "value": node.count if rolled_up else node.own_count} for node in nodes]
+
+
+@cached_query(fallback=list)
 async def get_price_sensitivity(db: AsyncSession) -> list:
-    """获取价格敏感度散点图数据"""
-    try:
-        result = await db.execute(
-            select(
-                SkuPriceSensitivity.avg_price,
-                SkuPriceSensitivity.total_sales
-            ).limit(50)
-        )
-        rows = result.all()
-        return [[float(row.avg_price), int(row.total_sales)] for row in rows]
-    except Exception as e:
-        print(f"get_price_sensitivity error: {e}")
-        return []
+    """
+    获取价格敏感度散点图数据
+    对全表按价格分层抽样（含销量/价格离群点），点数由 PRICE_SAMPLE_POINTS 控制
+    """
+    sample = await get_price_distribution(db, mode="sample", n=settings.PRICE_SAMPLE_POINTS)
+    return sorted(sample["points"] + sample.get("outliers", []))
 
 
 # ==================== 用户洞察数据读取 ====================
 
-async def get_user_segmentation(db: AsyncSession) -> list:
-    """获取用户分层数据（RFM）"""
-    try:
-        result = await db.execute(
-            select(
-                UserRfmStat.rfm_segment,
-                UserRfmStat.user_count
-            ).order_by(UserRfmStat.user_count.desc())
-        )
-        rows = result.all()
-        return [{"name": str(row.rfm_segment), "value": int(row.user_count)} for row in rows]
-    except Exception as e:
-        print(f"get_user_segmentation error: {e}")
-        return []
+@cached_query(fallback=list)
+async def get_user_segmentation(db: AsyncSession, start_date: str = None, end_date: str = None) -> list:
+    """
+    获取用户分层数据（RFM）
+    指定日期范围且按日表已有数据时，统计最近一次购买落在范围内的用户；否则读取整月汇总表
+    """
+    if start_date and end_date:
+        cube = await behavior_crud.get_rfm_cube(db)
+        if not cube.empty:
+            totals = cube.total(start_date, end_date)
+            if totals is None:
+                return []
+            segments = [{"name": str(name), "value": value} for (name,), value in zip(cube.keys, totals.tolist())]
+            return sorted(segments, key=lambda segment: -segment["value"])
+        has_data = await _has_data_in_range(db, start_date, end_date)
+        if not has_data:
+            return []
 
+    result = await db.execute(
+        select(
+            UserRfmStat.rfm_segment,
+            UserRfmStat.user_count
+        ).order_by(UserRfmStat.user_count.desc())
+    )
+    rows = result.all()
+    return [{"name": str(row.rfm_segment), "value": int(row.user_count)} for row in rows]
 
-# ==================== 智能预测数据（暂用模拟数据） ====================
 
+# ==================== 智能预测数据 ====================
+
+def _empty_prediction() -> dict:
+    """预测数据的空结果"""
+    return {
+        "historical": {"dates": [], "pv": []},
+        "forecast": {"dates": [], "pv": [], "confidenceInterval": {"upper": [], "lower": []}},
+        "model": None,
+    }
+
+
+@cached_query(ttl=None, fallback=_empty_prediction)
 async def get_prediction_data(db: AsyncSession) -> dict:
-    """获取预测数据（暂用模拟数据，表 ads_sku_sales_daily_prediction 预留）"""
+    """
+    获取 PV 预测数据（每个数据集版本拟合一次）
+    在 ads_traffic_trend_daily 的日 PV 序列上回测季节朴素、Holt-Winters、周季节回归三个模型，
+    取回测误差最小的模型预测未来 FORECAST_HORIZON 天，附 95% 预测区间
+    """
+    index = await get_traffic_index(db)
+    if not len(index.days):
+        return _empty_prediction()
+
+    horizon = settings.FORECAST_HORIZON
+    result = forecast_model(index.pv, horizon, settings.FORECAST_BACKTEST_FOLDS)
+    lower, upper = result.interval()
+    last = index.last_day
+    history = slice(max(len(index.days) - settings.FORECAST_HISTORY_DAYS, 0), None)
     return {
         "historical": {
-            "dates": ["10-25", "10-26", "10-27", "10-28", "10-29", "10-30", "10-31"],
-            "pv": [180000, 195000, 190000, 185000, 200000, 210000, 205000]
+            "dates": [label[5:] for label in index.labels[history]],
+            "pv": index.pv[history].tolist()
         },
         "forecast": {
-            "dates": ["11-01", "11-02", "11-03", "11-04", "11-05", "11-06", "11-07"],
-            "pv": [215000, 220000, 218000, 225000, 230000, 240000, 235000],
+            "dates": [(last + timedelta(days=k)).strftime("%m-%d") for k in range(1, horizon + 1)],
+            "pv": np.rint(np.maximum(result.mean, 0)).astype(np.int64).tolist(),
             "confidenceInterval": {
-                "upper": [225000, 230000, 228000, 235000, 245000, 255000, 250000],
-                "lower": [205000, 210000, 208000, 215000, 215000, 225000, 220000]
+                "upper": np.rint(np.maximum(upper, 0)).astype(np.int64).tolist(),
+                "lower": np.rint(np.maximum(lower, 0)).astype(np.int64).tolist()
             }
-        }
+        },
+        "model": result.model,
     }
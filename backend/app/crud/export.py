@@ -0,0 +1,123 @@
+"""
+ADS 表全量导出
+只允许导出 app/models/data.py 中定义的 ads_* 表。
+使用服务端游标（stream_results + yield_per）逐块读取，每块编码为 NDJSON 或 CSV 后立即发送，
+内存占用只与块大小有关，与表的行数无关。
+"""
+import csv
+import io
+from datetime import date
+from typing import AsyncIterator, List, Optional, Set
+
+from sqlalchemy import Select, null, select, text
+from sqlalchemy.sql.schema import Column
+
+from ..config.database import AsyncSessionLocal, Base
+from ..config.settings import settings
+from ..models import data as data_models
+from ..utils.serialization import dumps
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# 表名 -> ORM 模型（只包含数据仓库表模型）
+EXPORT_MODELS = {
+    model.__tablename__: model
+    for model in vars(data_models).values()
+    if isinstance(model, type) and issubclass(model, Base) and model.__module__ == data_models.__name__
+}
+
+
+def build_export_query(
+    table: str,
+    columns: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    available: Optional[Set[str]] = None,
+) -> Select:
+    """
+    构建导出查询，按主键排序
+    :param columns: 逗号分隔的列名，默认全部列
+    :param start_date/end_date: 按 dt 列过滤（只支持有 dt 列的表）
+    :param available: 源表实际存在的列（source_columns()）；模型中后来新增、源表尚未补建的可空列输出为 NULL
+    :raises KeyError: 表不可导出
+    :raises ValueError: 列名不存在、表没有日期列或源表缺少非空列
+    """
+    table_obj = EXPORT_MODELS[table].__table__
+    if columns:
+        names = [name.strip() for name in columns.split(",") if name.strip()]
+        unknown = [name for name in names if name not in table_obj.c]
+        if unknown:
+            raise ValueError(f"未知的列: {', '.join(unknown)}")
+        selected: List[Column] = [table_obj.c[name] for name in names]
+    else:
+        selected = list(table_obj.c)
+
+    if available is not None:
+        missing = [column.name for column in selected if column.name not in available and not column.nullable]
+        if missing:
+            raise ValueError(f"{table} 缺少列: {', '.join(missing)}")
+        selected = [
+            column if column.name in available else null().cast(column.type).label(column.name)
+            for column in selected
+        ]
+
+    query = select(*selected).select_from(table_obj).order_by(*table_obj.primary_key.columns)
+    if start_date or end_date:
+        if "dt" not in table_obj.c:
+            raise ValueError(f"{table} 没有日期列 dt，不支持日期过滤")
+        if start_date:
+            query = query.where(table_obj.c.dt >= date.fromisoformat(start_date))
+        if end_date:
+            query = query.where(table_obj.c.dt <= date.fromisoformat(end_date))
+    return query
+
+
+_COLUMNS_SQL = text(
+    "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+)
+
+
+async def source_columns(table: str) -> Optional[Set[str]]:
+    """MySQL 中该表实际存在的列名；表不存在时返回 None"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(_COLUMNS_SQL, {"table": table})
+        names = {row[0] for row in result.all()}
+    return names or None
+
+
+def _encode_ndjson(names: List[str], rows) -> bytes:
+    """每行一个 JSON 对象"""
+    return b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+
+def _encode_csv(rows) -> bytes:
+    """CSV 行（Decimal 按原样输出，不损失精度）"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+async def stream_export(query: Select, fmt: str, session_factory=AsyncSessionLocal) -> AsyncIterator[bytes]:
+    """
+    逐块产出导出内容
+    会话在生成器内部创建：StreamingResponse 开始发送时路由的依赖已经结束，不能复用请求级会话
+    :param session_factory: 会话工厂，默认直接读 MySQL
+    """
+    names = [column.name for column in query.selected_columns]
+    if fmt == "csv":
+        yield _encode_csv([names])
+
+    chunk_rows = settings.EXPORT_CHUNK_ROWS
+    async with session_factory() as session:
+        result = await session.stream(
+            query.execution_options(stream_results=True, yield_per=chunk_rows)
+        )
+        async for partition in result.partitions(chunk_rows):
+            if fmt == "csv":
+                yield _encode_csv(partition)
+            else:
+                yield _encode_ndjson(names, partition)
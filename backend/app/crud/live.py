@@ -0,0 +1,175 @@
+"""
+页面数据推送（Server-Sent Events）
+看板等页面打开后不再定时轮询，而是按 (页面, 参数) 订阅：
+- 同一 (页面, 参数) 的所有订阅共享一个主题，数据集版本变化时每个主题只组装一次响应，再分发给全部订阅者
+- 响应内容与上次推送相同时不推送
+- 有订阅时后台按 ADS_VERSION_CHECK_SECONDS 检查一次数据集版本（只查询 information_schema），
+  版本不变时不查询业务表；没有订阅时不检查
+每个订阅者使用容量为 1 的队列，消费慢的连接只会收到最新一份数据，不会积压。
+"""
+import asyncio
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ..config.settings import settings
+from ..schemas.response import ResponseModel
+from ..utils.serialization import render_response
+from .panels import PAGES
+from .snapshot import SnapshotKey, snapshot_key, snapshot_store
+from .version import UNKNOWN_VERSION, dataset_version, get_dataset_version
+
+# 支持订阅的页面（不带分页游标等一次性参数的页面）
+STREAM_PAGES = ("dashboard", "conversion", "product", "user-insight", "prediction")
+
+# 队列中的一项：(数据集版本, 响应字节)
+Event = Tuple[str, bytes]
+
+
+def _offer(queue: asyncio.Queue, event: Event) -> None:
+    """放入最新数据；队列已满时丢弃未消费的旧数据"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+def encode_event(version: str, body: bytes) -> bytes:
+    """编码为 SSE 消息：id 为数据集版本，data 为完整的响应 JSON（单行）"""
+    return b"id: " + version.encode() + b"\nevent: payload\ndata: " + body + b"\n\n"
+
+
+class _Topic:
+    """一个 (页面, 参数) 的订阅主题"""
+
+    def __init__(self, page: str, params: Dict[str, Any]):
+        self.page = page
+        self.params = params
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.version: Optional[str] = None
+        self.body: Optional[bytes] = None
+        self.refreshing: Optional[asyncio.Task] = None
+        self.refreshing_version: Optional[str] = None
+
+
+class LiveHub:
+    """管理订阅主题、按版本组装响应并分发"""
+
+    def __init__(self):
+        self._topics: Dict[SnapshotKey, _Topic] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self.renders = 0
+        self.pushes = 0
+
+    def stats(self) -> dict:
+        """推送统计"""
+        return {
+            "topics": len(self._topics),
+            "subscribers": sum(len(topic.subscribers) for topic in self._topics.values()),
+            "renders": self.renders,
+            "pushes": self.pushes,
+        }
+
+    async def subscribe(
+        self, page: str, params: Dict[str, Any], last_event_id: Optional[str] = None
+    ) -> Tuple[SnapshotKey, asyncio.Queue]:
+        """
+        订阅页面数据，返回 (主题键, 队列)
+        主题已有数据时立即放入队列（与客户端 Last-Event-ID 相同时跳过），版本落后时后台重新组装
+        """
+        key = snapshot_key(page, params)
+        topic = self._topics.get(key)
+        if topic is None:
+            topic = self._topics[key] = _Topic(page, params)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        topic.subscribers.add(queue)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+
+        if topic.body is not None and last_event_id != topic.version:
+            _offer(queue, (topic.version, topic.body))
+        version = await get_dataset_version()
+        if topic.version != version:
+            self._schedule(topic, version)
+        return key, queue
+
+    def unsubscribe(self, key: SnapshotKey, queue: asyncio.Queue) -> None:
+        """取消订阅；主题没有订阅者时删除"""
+        topic = self._topics.get(key)
+        if topic is None:
+            return
+        topic.subscribers.discard(queue)
+        if not topic.subscribers:
+            if topic.refreshing and not topic.refreshing.done():
+                topic.refreshing.cancel()
+            del self._topics[key]
+
+    def refresh(self, version: str) -> None:
+        """数据集版本变化：每个主题重新组装一次"""
+        for topic in list(self._topics.values()):
+            self._schedule(topic, version)
+
+    def _schedule(self, topic: _Topic, version: str) -> None:
+        """后台组装主题响应；同一版本已在组装时不重复，旧版本的组装任务取消"""
+        if topic.refreshing and not topic.refreshing.done():
+            if topic.refreshing_version == version:
+                return
+            topic.refreshing.cancel()
+        topic.refreshing_version = version
+        topic.refreshing = asyncio.create_task(self._render(topic, version))
+
+    async def _render(self, topic: _Topic, version: str) -> None:
+        """组装主题响应（优先使用预生成快照），内容变化时分发给全部订阅者"""
+        body = snapshot_store.get(version, topic.page, topic.params)
+        failed = False
+        if body is None:
+            try:
+                result = await PAGES[topic.page](**topic.params)
+            except Exception as e:
+                result = ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+            self.renders += 1
+            failed = result.code != 200 or (isinstance(result.data, dict) and result.data.get("failedPanels"))
+            # 已推送过完整数据时，不用出错或部分失败的结果覆盖
+            if failed and topic.body is not None:
+                print(f"live {topic.page} {topic.params} render failed for version {version}")
+                return
+            body = render_response(result)
+
+        if version != dataset_version.peek():
+            return
+        if failed:
+            # 首次组装失败：错误响应只推给当前订阅者，不记录版本，之后的订阅或版本检查会重新组装
+            print(f"live {topic.page} {topic.params} first render failed for version {version}")
+            for queue in topic.subscribers:
+                _offer(queue, (version, body))
+            return
+        topic.version = version
+        if body == topic.body:
+            return
+        topic.body = body
+        for queue in topic.subscribers:
+            _offer(queue, (version, body))
+            self.pushes += 1
+
+    async def _poll(self) -> None:
+        """有订阅时定期检查数据集版本，版本变化由监听回调触发重新组装"""
+        while self._topics:
+            await asyncio.sleep(settings.ADS_VERSION_CHECK_SECONDS)
+            try:
+                version = await get_dataset_version()
+            except Exception as e:
+                print(f"live version poll error: {e}")
+                continue
+            # 版本未变化时不会触发回调，组装失败的主题在这里重试
+            for topic in list(self._topics.values()):
+                if topic.version != version:
+                    self._schedule(topic, version)
+
+
+live_hub = LiveHub()
+
+
+async def _on_version_change(version: str) -> None:
+    """数据集版本变化后重新组装所有订阅主题"""
+    if version != UNKNOWN_VERSION:
+        live_hub.refresh(version)
+
+
+dataset_version.add_listener(_on_version_change)
@@ -0,0 +1,224 @@
+"""
+页面面板并发加载
+一个页面由多个互不依赖的面板组成，每个面板使用独立的连接池会话并发查询，
+并设置单面板超时。超时或失败的面板返回空值，同时在 failedPanels 中标记，
+避免一个慢面板拖垮整个接口。
+PAGES 中的页面组装函数同时供路由实时查询和快照预生成使用。
+"""
+import asyncio
+from decimal import Decimal, InvalidOperation
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+from ..schemas.response import ResponseModel
+from . import cohort as cohort_crud
+from . import data as data_crud
+from .replica import read_session
+from . import price as price_crud
+from . import ranking as ranking_crud
+from ..utils.cursor import decode_cursor
+
+# 面板定义：(CRUD读取函数, 关键字参数)
+PanelSpec = Tuple[Callable[..., Awaitable[Any]], Dict[str, Any]]
+
+
+async def _run_panel(func: Callable[..., Awaitable[Any]], kwargs: Dict[str, Any], timeout: float) -> Any:
+    """在独立会话中执行单个面板查询"""
+    async with read_session() as session:
+        return await asyncio.wait_for(func(session, **kwargs), timeout)
+
+
+async def gather_panels(panels: Dict[str, PanelSpec], timeout: float = None) -> Tuple[dict, List[str]]:
+    """
+    并发加载多个面板
+    :param panels: {面板名: (CRUD函数, 参数)}
+    :param timeout: 单面板超时（秒），默认取 PANEL_TIMEOUT_SECONDS
+    :return: (面板数据, 失败的面板名列表)
+    """
+    timeout = timeout or settings.PANEL_TIMEOUT_SECONDS
+    names = list(panels)
+    results = await asyncio.gather(
+        *(_run_panel(func, kwargs, timeout) for func, kwargs in panels.values()),
+        return_exceptions=True
+    )
+
+    data = {}
+    failed = []
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            reason = "timeout" if isinstance(result, asyncio.TimeoutError) else repr(result)
+            print(f"panel {name} failed: {reason}")
+            fallback = getattr(panels[name][0], "fallback", None)
+            data[name] = fallback() if fallback else None
+            failed.append(name)
+        else:
+            data[name] = result
+    return data, failed
+
+
+# ==================== 各页面的面板组合 ====================
+
+async def build_dashboard_data(
+    start_date: str = None, end_date: str = None, resolution: str = "auto", points: Optional[int] = None
+) -> Tuple[dict, List[str]]:
+    """运营看板：指标卡片、活动热力图、品类销售、流量趋势"""
+    dates = {"start_date": start_date, "end_date": end_date}
+    return await gather_panels({
+        "metrics": (data_crud.get_dashboard_metrics, dates),
+        "activityHeatmap": (data_crud.get_activity_heatmap, dates),
+        "categorySales": (data_crud.get_category_sales, dates),
+        "pvuvTrend": (data_crud.get_traffic_trend, {**dates, "resolution": resolution, "points": points}),
+    })
+
+
+async def build_conversion_data(start_date: str = None, end_date: str = None) -> Tuple[dict, List[str]]:
+    """转化页面：漏斗图、桑基图"""
+    dates = {"start_date": start_date, "end_date": end_date}
+    return await gather_panels({
+        "funnel": (data_crud.get_conversion_funnel, dates),
+        "sankey": (data_crud.get_sankey_data, dates),
+    })
+
+
+async def build_product_data(start_date: str = None, end_date: str = None) -> Tuple[dict, List[str]]:
+    """商品页面：品牌TOP10、品类TOP10（按日期范围）、品类词云、价格敏感度散点图（全部日期）"""
+    dates = {"start_date": start_date, "end_date": end_date}
+    return await gather_panels({
+        "brandTop10": (data_crud.get_brand_top10, dates),
+        "categoryTop10": (data_crud.get_category_top10, dates),
+        "categoryWordCloud": (data_crud.get_category_wordcloud, {}),
+        "priceSensitivity": (data_crud.get_price_sensitivity, {}),
+    })
+
+
+# ==================== 页面响应组装 ====================
+
+def panel_response(data: dict, failed: List[str]) -> ResponseModel:
+    """组装面板接口响应；部分面板失败时仍返回200，并在 failedPanels 中标记"""
+    data["failedPanels"] = failed
+    message = "success" if not failed else f"部分数据加载失败: {', '.join(failed)}"
+    return ResponseModel(code=200, message=message, data=data)
+
+
+async def dashboard_page(
+    start_date: str = None, end_date: str = None, resolution: str = "auto", points: Optional[int] = None
+) -> ResponseModel:
+    """运营看板响应"""
+    return panel_response(*await build_dashboard_data(start_date, end_date, resolution, points))
+
+
+async def conversion_page(start_date: str = None, end_date: str = None) -> ResponseModel:
+    """转化页面响应"""
+    return panel_response(*await build_conversion_data(start_date, end_date))
+
+
+async def product_page(start_date: str = None, end_date: str = None) -> ResponseModel:
+    """商品页面响应"""
+    return panel_response(*await build_product_data(start_date, end_date))
+
+
+async def user_insight_page(start_date: str = None, end_date: str = None) -> ResponseModel:
+    """用户洞察页面响应：用户分层环形图、精确去重用户与漏斗交集、留存曲线、新用户同期群"""
+    dates = {"start_date": start_date, "end_date": end_date}
+    return panel_response(*await gather_panels({
+        "userSegmentation": (data_crud.get_user_segmentation, dates),
+        "userActivity": (cohort_crud.get_user_activity, dates),
+        "retention": (cohort_crud.get_retention, dates),
+        "cohorts": (cohort_crud.get_cohorts, dates),
+    }))
+
+
+async def prediction_page() -> ResponseModel:
+    """预测页面响应：历史数据、预测数据、预测区间、选中的模型"""
+    async with read_session() as session:
+        prediction = await data_crud.get_prediction_data(session)
+    return ResponseModel(code=200, message="success", data=prediction)
+
+
+async def price_sensitivity_page(
+    mode: str = "hist2d", bins: int = 50, log_price: bool = False, n: int = 2000
+) -> ResponseModel:
+    """价格敏感度全表分布响应：二维直方图 / 六边形分箱 / 分层抽样"""
+    async with read_session() as session:
+        distribution = await price_crud.get_price_distribution(session, mode, bins, log_price, n)
+    return ResponseModel(code=200, message="success", data=distribution)
+
+
+async def sankey_page(
+    start_date: str = None,
+    end_date: str = None,
+    top_k: Optional[int] = None,
+    min_share: float = 0.0,
+    max_depth: Optional[int] = None,
+) -> ResponseModel:
+    """桑基图剪枝响应：边用节点下标表示，附带剪枝统计；未指定 top_k 时最多保留 SANKEY_TOP_K 条边"""
+    async with read_session() as session:
+        sankey = await data_crud.get_sankey_data(
+            session, start_date, end_date, top_k or settings.SANKEY_TOP_K, min_share, max_depth, compact=True
+        )
+    return ResponseModel(code=200, message="success", data=sankey)
+
+
+async def category_tree_page(root: str = None, depth: int = 2, top_n: int = 20) -> ResponseModel:
+    """品类层级响应（旭日图下钻）"""
+    async with read_session() as session:
+        tree = await data_crud.get_category_hierarchy(session, root, depth, top_n)
+    return ResponseModel(code=200, message="success", data=tree)
+
+
+async def category_wordcloud_page(root: str = None, depth: Optional[int] = None, top_n: int = 32) -> ResponseModel:
+    """品类词云响应"""
+    async with read_session() as session:
+        words = await data_crud.get_category_wordcloud(session, root, depth, top_n)
+    return ResponseModel(code=200, message="success", data=words)
+
+
+async def _ranking_page(ranking: str, cursor: Optional[str], limit: int) -> ResponseModel:
+    """排行分页响应；游标无效时返回400"""
+    after = None
+    if cursor:
+        try:
+            fields = decode_cursor(ranking, cursor)
+            if len(fields) != 3:
+                raise ValueError("invalid cursor")
+            last_value, last_key, offset = fields
+            # 排序值必须是有限的十进制数，主键为字符串，已返回行数为非负整数
+            value = Decimal(last_value) if isinstance(last_value, str) else None
+            valid = (
+                value is not None and value.is_finite() and isinstance(last_key, str)
+                and type(offset) is int and offset >= 0
+            )
+            if not valid:
+                raise ValueError("invalid cursor")
+            after = (value, last_key, offset)
+        except (ValueError, InvalidOperation):
+            return ResponseModel(code=400, message="无效的分页游标", data=None)
+    async with read_session() as session:
+        page = await ranking_crud.get_ranking_page(session, ranking, after, limit)
+    return ResponseModel(code=200, message="success", data=page)
+
+
+async def brand_ranking_page(cursor: str = None, limit: int = 20) -> ResponseModel:
+    """品牌销售额排行（键集分页）"""
+    return await _ranking_page("brand", cursor, limit)
+
+
+async def sku_ranking_page(cursor: str = None, limit: int = 20) -> ResponseModel:
+    """SKU 销量排行（键集分页）"""
+    return await _ranking_page("sku", cursor, limit)
+
+
+# 页面名 -> 组装函数（关键字参数即接口查询参数）
+PAGES: Dict[str, Callable[..., Awaitable[ResponseModel]]] = {
+    "dashboard": dashboard_page,
+    "conversion": conversion_page,
+    "product": product_page,
+    "user-insight": user_insight_page,
+    "prediction": prediction_page,
+    "price-sensitivity": price_sensitivity_page,
+    "sankey": sankey_page,
+    "category-tree": category_tree_page,
+    "category-wordcloud": category_wordcloud_page,
+    "brand-ranking": brand_ranking_page,
+    "sku-ranking": sku_ranking_page,
+}
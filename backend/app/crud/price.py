@@ -0,0 +1,276 @@
+"""
+价格敏感度全表分析
+ads_sku_price_sensitivity 可能有数十万到上百万个 SKU，不再只取任意 50 行，而是流式扫描全表：
+- hist2d：价格×销量二维直方图（价格轴可选对数分箱），附带密度
+- hexbin：六边形分箱，适合直接画散点密度图
+- sample：按价格分层的均匀抽样，并保留销量/价格极端值（离群点）
+按主键顺序分块读取（服务端游标），每块转为 NumPy 数组做向量化累加，
+内存只与分箱数/抽样点数和块大小有关，与 SKU 总数无关。
+"""
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config.settings import settings
+from ..models.data import SkuPriceSensitivity
+from ..utils.cache import cached_query
+
+PRICE_MODES = ("hist2d", "hexbin", "sample")
+
+
+def _empty_distribution(mode: str = "hist2d") -> dict:
+    """分布结果的空值"""
+    return {"mode": mode, "total": 0, "cells": [], "points": []}
+
+
+async def _value_ranges(db: AsyncSession, log_price: bool) -> Optional[Tuple[float, float, float, float, int]]:
+    """查询价格/销量的取值范围和行数（对数模式下只统计正价格）"""
+    query = select(
+        func.min(SkuPriceSensitivity.avg_price),
+        func.max(SkuPriceSensitivity.avg_price),
+        func.min(SkuPriceSensitivity.total_sales),
+        func.max(SkuPriceSensitivity.total_sales),
+        func.count(),
+    )
+    if log_price:
+        query = query.where(SkuPriceSensitivity.avg_price > 0)
+    row = (await db.execute(query)).one()
+    if not row[4]:
+        return None
+    return float(row[0]), float(row[1]), float(row[2]), float(row[3]), int(row[4])
+
+
+async def _scan_chunks(db: AsyncSession, log_price: bool, with_ids: bool = False):
+    """
+    按主键顺序流式读取 (价格, 销量[, 商品ID])，每次产出一块 NumPy 数组
+    使用 yield_per 让驱动走服务端游标，不一次性加载全表
+    """
+    columns = [SkuPriceSensitivity.avg_price, SkuPriceSensitivity.total_sales]
+    if with_ids:
+        columns.append(SkuPriceSensitivity.product_id)
+    query = select(*columns).order_by(SkuPriceSensitivity.product_id)
+    if log_price:
+        query = query.where(SkuPriceSensitivity.avg_price > 0)
+
+    chunk_rows = settings.PRICE_SCAN_CHUNK_ROWS
+    result = await db.stream(query.execution_options(yield_per=chunk_rows))
+    async for partition in result.partitions(chunk_rows):
+        price = np.fromiter((float(row[0]) for row in partition), dtype=np.float64, count=len(partition))
+        sales = np.fromiter((float(row[1]) for row in partition), dtype=np.float64, count=len(partition))
+        ids = np.array([str(row[2]) for row in partition], dtype=object) if with_ids else None
+        yield price, sales, ids
+
+
+def _axis(low: float, high: float, log: bool) -> Tuple[float, float]:
+    """坐标轴的变换后范围，保证非零宽度"""
+    if log:
+        low, high = math.log10(low), math.log10(high)
+    if high <= low:
+        high = low + 1.0
+    return low, high
+
+
+def _round(values: np.ndarray) -> list:
+    """坐标保留4位有效小数，减小响应体积"""
+    return np.round(values, 4).tolist()
+
+
+async def _hist2d(db: AsyncSession, bins: int, log_price: bool, ranges) -> dict:
+    """价格×销量二维直方图"""
+    pmin, pmax, smin, smax, _ = ranges
+    px0, px1 = _axis(pmin, pmax, log_price)
+    sy0, sy1 = _axis(smin, smax, False)
+    x_edges = np.linspace(px0, px1, bins + 1)
+    y_edges = np.linspace(sy0, sy1, bins + 1)
+
+    counts = np.zeros((bins, bins), dtype=np.int64)
+    total = 0
+    async for price, sales, _ in _scan_chunks(db, log_price):
+        x = np.log10(price) if log_price else price
+        chunk_counts, _, _ = np.histogram2d(x, sales, bins=[x_edges, y_edges])
+        counts += chunk_counts.astype(np.int64)
+        total += len(price)
+
+    xi, yi = np.nonzero(counts)
+    values = counts[xi, yi]
+    price_edges = np.power(10.0, x_edges) if log_price else x_edges
+    return {
+        "mode": "hist2d",
+        "logPrice": log_price,
+        "total": total,
+        "priceEdges": _round(price_edges),
+        "salesEdges": _round(y_edges),
+        # [价格分箱序号, 销量分箱序号, SKU数, 密度(占比)]
+        "cells": [
+            [int(i), int(j), int(c), round(float(c) / total, 6)]
+            for i, j, c in zip(xi, yi, values)
+        ] if total else [],
+        "maxCount": int(values.max()) if len(values) else 0,
+    }
+
+
+async def _hexbin(db: AsyncSession, bins: int, log_price: bool, ranges) -> dict:
+    """
+    六边形分箱（与 matplotlib.hexbin 相同的双格点算法）
+    两套矩形格点分别求最近中心，按距离取较近者，再用 bincount 累加
+    """
+    pmin, pmax, smin, smax, _ = ranges
+    px0, px1 = _axis(pmin, pmax, log_price)
+    sy0, sy1 = _axis(smin, smax, False)
+    nx = bins
+    ny = max(1, int(nx / math.sqrt(3)))
+    sx_scale = nx / (px1 - px0)
+    sy_scale = ny / (sy1 - sy0)
+
+    counts1 = np.zeros((nx + 1) * (ny + 1), dtype=np.int64)
+    counts2 = np.zeros(nx * ny, dtype=np.int64)
+    total = 0
+    async for price, sales, _ in _scan_chunks(db, log_price):
+        x = np.log10(price) if log_price else price
+        sx = (x - px0) * sx_scale
+        sy = (sales - sy0) * sy_scale
+        ix1 = np.round(sx).astype(np.int64)
+        iy1 = np.round(sy).astype(np.int64)
+        ix2 = np.floor(sx).astype(np.int64)
+        iy2 = np.floor(sy).astype(np.int64)
+        d1 = (sx - ix1) ** 2 + 3.0 * (sy - iy1) ** 2
+        d2 = (sx - ix2 - 0.5) ** 2 + 3.0 * (sy - iy2 - 0.5) ** 2
+        first = d1 < d2
+        # 第二套格点在最大边界上向内收一格
+        ix2 = np.clip(ix2, 0, nx - 1)
+        iy2 = np.clip(iy2, 0, ny - 1)
+        counts1 += np.bincount(
+            (ix1[first] * (ny + 1) + iy1[first]), minlength=counts1.size
+        )[:counts1.size]
+        counts2 += np.bincount(
+            (ix2[~first] * ny + iy2[~first]), minlength=counts2.size
+        )[:counts2.size]
+        total += len(price)
+
+    cells = []
+    for counts, offset, height in ((counts1, 0.0, ny + 1), (counts2, 0.5, ny)):
+        idx = np.nonzero(counts)[0]
+        cx = idx // height + offset
+        cy = idx % height + offset
+        x = cx / sx_scale + px0
+        y = cy / sy_scale + sy0
+        if log_price:
+            x = np.power(10.0, x)
+        for xv, yv, c in zip(_round(x), _round(y), counts[idx].tolist()):
+            cells.append([xv, yv, c, round(c / total, 6)])
+    cells.sort(key=lambda cell: (cell[0], cell[1]))
+
+    return {
+        "mode": "hexbin",
+        "logPrice": log_price,
+        "total": total,
+        # 六边形的半径（变换后坐标系），前端按此绘制
+        "hexSize": {"price": round(1.0 / sx_scale, 6), "sales": round(1.0 / sy_scale, 6)},
+        # [中心价格, 中心销量, SKU数, 密度(占比)]
+        "cells": cells,
+        "maxCount": max((cell[2] for cell in cells), default=0),
+    }
+
+
+async def _stratified_sample(db: AsyncSession, bins: int, n: int, log_price: bool, ranges) -> dict:
+    """
+    按价格分层抽样，并保留离群点
+    - 每个价格层用"最小随机优先级 k 个"（bottom-k）做无放回均匀抽样，分块结果可直接合并
+    - 额外保留销量最高的若干 SKU 以及价格最高/最低的 SKU
+    随机数使用固定种子并按主键顺序扫描，相同数据得到相同结果
+    """
+    pmin, pmax, _, _, _ = ranges
+    px0, px1 = _axis(pmin, pmax, log_price)
+    per_bin = max(1, n // bins)
+    outlier_count = max(1, n // 20)
+    rng = np.random.default_rng(0)
+
+    # 抽样状态：价格层、随机优先级、价格、销量、ID
+    keep = None
+    top = None
+    extremes = {}
+    total = 0
+    async for price, sales, ids in _scan_chunks(db, log_price, with_ids=True):
+        x = np.log10(price) if log_price else price
+        layer = np.clip(((x - px0) / (px1 - px0) * bins).astype(np.int64), 0, bins - 1)
+        priority = rng.random(len(price))
+        chunk = (layer, priority, price, sales, ids)
+        if keep is not None:
+            chunk = tuple(np.concatenate([a, b]) for a, b in zip(keep, chunk))
+        # 每层保留优先级最小的 per_bin 个
+        order = np.lexsort((chunk[1], chunk[0]))
+        layer_sorted = chunk[0][order]
+        starts = np.searchsorted(layer_sorted, layer_sorted, side="left")
+        rank = np.arange(len(order)) - starts
+        selected = order[rank < per_bin]
+        keep = tuple(a[selected] for a in chunk)
+
+        # 销量最高的 outlier_count 个
+        candidates = (price, sales, ids)
+        if top is not None:
+            candidates = tuple(np.concatenate([a, b]) for a, b in zip(top, candidates))
+        if len(candidates[1]) > outlier_count:
+            best = np.argpartition(-candidates[1], outlier_count - 1)[:outlier_count]
+            candidates = tuple(a[best] for a in candidates)
+        top = candidates
+
+        # 价格最低/最高的 SKU
+        for name, i in (("min", np.argmin(price)), ("max", np.argmax(price))):
+            current = extremes.get(name)
+            if current is None or (price[i] < current[0] if name == "min" else price[i] > current[0]):
+                extremes[name] = (price[i], sales[i], ids[i])
+        total += len(price)
+
+    if keep is None:
+        return _empty_distribution("sample")
+
+    # 合并抽样点和离群点（销量最高 + 价格两端），按商品ID去重
+    points = {}
+    for p, s, pid in zip(keep[2], keep[3], keep[4]):
+        points[pid] = [round(float(p), 2), int(s)]
+    outliers = {}
+    for p, s, pid in zip(top[0], top[1], top[2]):
+        outliers[pid] = [round(float(p), 2), int(s)]
+    for p, s, pid in extremes.values():
+        outliers[pid] = [round(float(p), 2), int(s)]
+    for pid in outliers:
+        points.pop(pid, None)
+
+    return {
+        "mode": "sample",
+        "logPrice": log_price,
+        "total": total,
+        "points": sorted(points.values()),
+        "outliers": sorted(outliers.values()),
+    }
+
+
+@cached_query(fallback=_empty_distribution)
+async def get_price_distribution(
+    db: AsyncSession,
+    mode: str = "hist2d",
+    bins: int = 50,
+    log_price: bool = False,
+    n: int = 2000,
+) -> dict:
+    """
+    价格敏感度全表分布
+    :param mode: hist2d / hexbin / sample
+    :param bins: 分箱数（hist2d 为每个轴的分箱数，hexbin 为横向六边形数，sample 为价格分层数）
+    :param log_price: 价格轴是否使用对数分箱（会排除价格<=0的SKU）
+    :param n: sample 模式的抽样点数
+    """
+    if mode not in PRICE_MODES:
+        raise ValueError(f"unsupported mode: {mode}")
+    ranges = await _value_ranges(db, log_price)
+    if ranges is None:
+        return _empty_distribution(mode)
+
+    if mode == "hist2d":
+        return await _hist2d(db, bins, log_price, ranges)
+    if mode == "hexbin":
+        return await _hexbin(db, bins, log_price, ranges)
+    return await _stratified_sample(db, bins, n, log_price, ranges)
@@ -0,0 +1,95 @@
+"""
+品牌 / SKU 销售排行（键集分页）
+按 (销售额, 主键) 降序排列，下一页用 销售额 < v OR (销售额 = v AND 主键 < k)（v, k 为上一页最后一行）作为查询条件，
+配合 (total_sales, 主键) 联合索引，第 500 页与第 1 页一样只扫描 limit 行，
+不像 OFFSET 那样需要跳过前面所有行。
+"""
+from decimal import Decimal
+from typing import Optional, Tuple
+
+from sqlalchemy import Select, and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.data import BrandSalesStat, SkuPriceSensitivity
+from ..utils.cache import cached_query
+from ..utils.cursor import encode_cursor
+
+# 排行名 -> (排序值列, 主键列, 输出字段: 列)
+RANKINGS = {
+    "brand": (
+        BrandSalesStat.total_sales,
+        BrandSalesStat.brand_name,
+        {"brand": BrandSalesStat.brand_name, "sales": BrandSalesStat.total_sales},
+    ),
+    "sku": (
+        SkuPriceSensitivity.total_sales,
+        SkuPriceSensitivity.product_id,
+        {
+            "productId": SkuPriceSensitivity.product_id,
+            "sales": SkuPriceSensitivity.total_sales,
+            "avgPrice": SkuPriceSensitivity.avg_price,
+        },
+    ),
+}
+
+
+def _empty_page() -> dict:
+    """排行分页的空结果"""
+    return {"items": [], "nextCursor": None}
+
+
+def build_page_query(ranking: str, after: Optional[Tuple[Decimal, str, int]], limit: int) -> Select:
+    """一页排行的查询：按 (排序值, 主键) 降序，after 不为空时从上一页最后一行之后开始"""
+    sort_column, key_column, fields = RANKINGS[ranking]
+    query = (
+        select(*fields.values())
+        .order_by(sort_column.desc(), key_column.desc())
+        .limit(limit)
+    )
+    if after is not None:
+        last_value, last_key, _ = after
+        # 展开为 OR/AND 形式：MySQL 不对行构造器比较 (a, b) < (x, y) 做范围优化，展开后可走联合索引的范围扫描；
+        # 冗余的 排序值 <= v 是可下推的单列条件（DuckDB 副本据此按行组最小/最大值跳过数据）
+        query = query.where(
+            sort_column <= last_value,
+            or_(sort_column < last_value, and_(sort_column == last_value, key_column < last_key)),
+        )
+    return query
+
+
+@cached_query(fallback=_empty_page)
+async def get_ranking_page(
+    db: AsyncSession,
+    ranking: str,
+    after: Optional[Tuple[Decimal, str, int]] = None,
+    limit: int = 20,
+) -> dict:
+    """
+    读取一页排行
+    :param ranking: brand / sku
+    :param after: 已校验的游标 (上一页最后一行的排序值, 主键, 已返回行数)，None 为第一页
+    :param limit: 每页行数
+    """
+    _, key_column, fields = RANKINGS[ranking]
+    query = build_page_query(ranking, after, limit + 1)
+    offset = after[2] if after is not None else 0
+
+    rows = (await db.execute(query)).all()
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+
+    names = list(fields)
+    sort_index = names.index("sales")
+    key_index = list(fields.values()).index(key_column)
+    items = []
+    for rank, row in enumerate(rows, start=offset + 1):
+        item = {"rank": rank}
+        for name, value in zip(names, row):
+            item[name] = float(value) if isinstance(value, Decimal) else value
+        items.append(item)
+
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(ranking, str(last[sort_index]), str(last[key_index]), offset + len(rows))
+    return {"items": items, "nextCursor": next_cursor}
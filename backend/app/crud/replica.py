@@ -0,0 +1,330 @@
+"""
+ADS 层本地列式副本（DuckDB）
+ADS 表只读、体量小、每个批次才变化一次。副本模式下把全部 ads_* 表同步到
+按数据集版本命名的 DuckDB 文件（ADS_REPLICA_DIR/ads_<版本>.duckdb），
+CRUD 函数通过 read_session() 拿到的会话读取，函数本身不需要改动：
+- off：不使用副本，全部读 MySQL
+- sync：以 MySQL 为数据源，数据集版本变化时后台同步新副本，同步完成后读取切换到副本
+- offline：不连接 MySQL，直接读取目录中最新的副本文件（笔记本、CI 离线运行）
+
+副本会话与 AsyncSession 接口兼容（execute / stream），SQLAlchemy 语句按 PostgreSQL
+方言编译为字面量 SQL 交给 DuckDB 执行；DuckDB 调用在线程池中进行，不阻塞事件循环。
+"""
+import asyncio
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+from .export import EXPORT_MODELS, build_export_query, source_columns, stream_export
+from .version import UNKNOWN_VERSION, dataset_version, get_dataset_version
+
+try:
+    import duckdb
+except ImportError:  # 可选依赖，只有启用副本时才需要
+    duckdb = None
+
+REPLICA_MODES = ("off", "sync", "offline")
+# 读查询可能抛出的数据库错误：MySQL 会话为 DBAPIError，副本会话为 duckdb.Error
+QUERY_ERRORS = (DBAPIError, duckdb.Error) if duckdb is not None else (DBAPIError,)
+_DIALECT = postgresql.dialect()
+
+
+def _duck_type(column) -> str:
+    """ORM 列类型对应的 DuckDB 类型"""
+    sql_type = column.type
+    if isinstance(sql_type, Boolean):
+        return "BOOLEAN"
+    if isinstance(sql_type, Integer):
+        return "BIGINT"
+    if isinstance(sql_type, Float):
+        return "DOUBLE"
+    if isinstance(sql_type, Numeric):
+        if sql_type.precision:
+            return f"DECIMAL({sql_type.precision}, {sql_type.scale or 0})"
+        return "DECIMAL(38, 10)"
+    if isinstance(sql_type, DateTime):
+        return "TIMESTAMP"
+    if isinstance(sql_type, Date):
+        return "DATE"
+    return "VARCHAR"
+
+
+def _compile(statement) -> str:
+    """把 SQLAlchemy 语句编译为 DuckDB 可执行的字面量 SQL"""
+    return str(statement.compile(dialect=_DIALECT, compile_kwargs={"literal_binds": True}))
+
+
+class _ReplicaResult:
+    """与 SQLAlchemy Result 兼容的最小结果集"""
+
+    def __init__(self, rows: list):
+        self._rows = rows
+
+    def all(self) -> list:
+        return self._rows
+
+    def one(self):
+        if len(self._rows) != 1:
+            raise ValueError(f"expected one row, got {len(self._rows)}")
+        return self._rows[0]
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+
+class _ReplicaStream:
+    """与 AsyncResult.partitions 兼容的分块读取"""
+
+    def __init__(self, cursor, row_type):
+        self._cursor = cursor
+        self._row_type = row_type
+
+    async def partitions(self, size: Optional[int] = None):
+        size = size or settings.EXPORT_CHUNK_ROWS
+        while True:
+            rows = await asyncio.to_thread(self._cursor.fetchmany, size)
+            if not rows:
+                break
+            yield [self._row_type._make(row) for row in rows]
+
+
+class Replica:
+    """一个只读打开的副本文件"""
+
+    def __init__(self, version: str, path: Path):
+        self.version = version
+        self.path = path
+        self.connection = duckdb.connect(str(path), read_only=True)
+        self._readers = 0
+        self._retired = False
+
+    def acquire(self) -> None:
+        """会话开始使用本副本"""
+        self._readers += 1
+
+    def release(self) -> None:
+        """会话结束；已被换下且没有其他会话时关闭连接"""
+        self._readers -= 1
+        if self._retired and not self._readers:
+            self.close()
+
+    def retire(self) -> None:
+        """被新副本换下：仍有会话在读取时等最后一个会话结束再关闭连接"""
+        self._retired = True
+        if not self._readers:
+            self.close()
+
+    def cursor(self, sql: str):
+        """在独立游标上执行查询（DuckDB 连接不能跨线程共享，游标可以）"""
+        cursor = self.connection.cursor()
+        cursor.execute(sql)
+        names = [description[0] for description in cursor.description]
+        return cursor, namedtuple("Row", names, rename=True)
+
+    def query(self, sql: str) -> list:
+        cursor, row_type = self.cursor(sql)
+        return [row_type._make(row) for row in cursor.fetchall()]
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ReplicaSession:
+    """
+    副本会话：CRUD 函数中用到的 AsyncSession 方法的替身
+    创建时登记为副本的读者，退出 async with 时注销，副本被换下后等所有读者结束才关闭连接
+    """
+
+    def __init__(self, replica: Replica):
+        self._replica = replica
+        replica.acquire()
+
+    async def __aenter__(self) -> "ReplicaSession":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._replica.release()
+
+    async def execute(self, statement) -> _ReplicaResult:
+        rows = await asyncio.to_thread(self._replica.query, _compile(statement))
+        return _ReplicaResult(rows)
+
+    async def stream(self, statement) -> _ReplicaStream:
+        cursor, row_type = await asyncio.to_thread(self._replica.cursor, _compile(statement))
+        return _ReplicaStream(cursor, row_type)
+
+    async def rollback(self) -> None:
+        """副本只读，没有需要回滚的事务"""
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+class ReplicaStore:
+    """管理副本文件的同步、切换和清理"""
+
+    def __init__(self, mode: str, directory: str):
+        if mode not in REPLICA_MODES:
+            raise ValueError(f"ADS_REPLICA_MODE must be one of {REPLICA_MODES}, got {mode}")
+        if mode != "off" and duckdb is None:
+            raise RuntimeError("ADS_REPLICA_MODE 需要安装 duckdb")
+        self.mode = mode
+        self.directory = Path(directory)
+        self.replica: Optional[Replica] = None
+        self._syncing: Optional[asyncio.Task] = None
+
+    def _path(self, version: str) -> Path:
+        return self.directory / f"ads_{version}.duckdb"
+
+    def active(self) -> Optional[Replica]:
+        """当前可读的副本；sync 模式下副本版本落后于数据集版本时不使用"""
+        if self.replica is None:
+            return None
+        if self.mode == "offline" or self.replica.version == dataset_version.peek():
+            return self.replica
+        return None
+
+    def stats(self) -> dict:
+        """副本状态"""
+        return {
+            "mode": self.mode,
+            "version": self.replica.version if self.replica else None,
+            "active": self.active() is not None,
+            "bytes": self.replica.path.stat().st_size if self.replica else 0,
+        }
+
+    def _open(self, version: str, path: Path) -> None:
+        """切换到新副本，并删除其他版本的副本文件（已打开的旧连接仍可读到最后一个读者结束）"""
+        previous = self.replica
+        self.replica = Replica(version, path)
+        if previous is not None:
+            previous.retire()
+        for stale in self.directory.glob("ads_*.duckdb"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+
+    def latest_file(self) -> Optional[Path]:
+        """目录中最新的副本文件"""
+        files = sorted(self.directory.glob("ads_*.duckdb"), key=lambda p: p.stat().st_mtime)
+        return files[-1] if files else None
+
+    async def latest_version(self) -> str:
+        """offline 模式的数据集版本：最新副本文件名中的版本"""
+        latest = self.latest_file()
+        if latest is None:
+            return UNKNOWN_VERSION
+        return latest.stem[len("ads_"):]
+
+    async def sync(self, version: str) -> None:
+        """
+        从 MySQL 同步全部 ads_* 表到新副本文件
+        每张表经导出模块的服务端游标流式写入临时 CSV，再由 DuckDB COPY 批量导入（MySQL 表尚未补建的可空列为 NULL，
+        MySQL 中不存在的表在副本中为空表）；
+        全部完成后原子替换文件，期间读取仍走 MySQL
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(version)
+        building = path.with_suffix(".building")
+        building.unlink(missing_ok=True)
+        connection = await asyncio.to_thread(duckdb.connect, str(building))
+        try:
+            for table, model in EXPORT_MODELS.items():
+                columns = ", ".join(f'"{c.name}" {_duck_type(c)}' for c in model.__table__.columns)
+                await asyncio.to_thread(connection.execute, f'CREATE TABLE "{table}" ({columns})')
+                available = await source_columns(table)
+                if available is None:
+                    # MySQL 中尚未创建的表（新增的 ads_* 表还没导入）在副本中保留为空表，与"尚未导入"的读取行为一致
+                    print(f"ads replica: table {table} not found in MySQL, left empty")
+                    continue
+                csv_path = self.directory / f"{table}.{version}.csv"
+                try:
+                    query = build_export_query(table, available=available)
+                    with open(csv_path, "wb") as output:
+                        async for chunk in stream_export(query, "csv"):
+                            output.write(chunk)
+                    await asyncio.to_thread(
+                        connection.execute,
+                        f"COPY \"{table}\" FROM '{csv_path.as_posix()}' (HEADER true)",
+                    )
+                finally:
+                    csv_path.unlink(missing_ok=True)
+            await asyncio.to_thread(connection.execute, "CHECKPOINT")
+        finally:
+            connection.close()
+
+        # 同步期间版本可能再次变化，只切换到仍为最新版本的副本
+        if version != dataset_version.peek():
+            building.unlink(missing_ok=True)
+            return
+        os.replace(building, path)
+        self._open(version, path)
+        print(f"ads replica synced for version {version}: {path}")
+
+    async def _sync_logged(self, version: str) -> None:
+        try:
+            await self.sync(version)
+        except Exception as e:
+            print(f"ads replica sync error: {e}")
+
+    def schedule(self, version: str) -> None:
+        """后台同步副本；已有同步任务时先取消"""
+        if self._syncing and not self._syncing.done():
+            self._syncing.cancel()
+        self._syncing = asyncio.create_task(self._sync_logged(version))
+
+    async def start(self) -> None:
+        """
+        启动：offline 模式打开最新副本；sync 模式复用当前版本已有的副本文件，否则后台同步
+        """
+        if self.mode == "off":
+            return
+        if self.mode == "offline":
+            latest = self.latest_file()
+            if latest is None:
+                print(f"ads replica: no replica file in {self.directory}")
+                return
+            self._open(latest.stem[len("ads_"):], latest)
+            return
+
+        version = await get_dataset_version()
+        if version == UNKNOWN_VERSION:
+            return
+        path = self._path(version)
+        if path.exists():
+            self._open(version, path)
+        else:
+            self.schedule(version)
+
+
+replica_store = ReplicaStore(settings.ADS_REPLICA_MODE, settings.ADS_REPLICA_DIR)
+
+if replica_store.mode == "offline":
+    dataset_version.set_source(replica_store.latest_version)
+
+
+async def _on_version_change(version: str) -> None:
+    """sync 模式下数据集版本变化后同步新副本"""
+    if replica_store.mode == "sync" and version != UNKNOWN_VERSION:
+        replica_store.schedule(version)
+
+
+dataset_version.add_listener(_on_version_change)
+
+
+def read_session():
+    """
+    ADS 只读查询使用的会话：副本可用时返回副本会话，否则返回 MySQL 会话
+    用法与 AsyncSessionLocal() 相同：async with read_session() as session
+    """
+    replica = replica_store.active()
+    if replica is not None:
+        return ReplicaSession(replica)
+    return AsyncSessionLocal()
@@ -0,0 +1,160 @@
+"""
+桑基图编译与剪枝
+用户路径表可能有上万条边，直接下发会让浏览器无法渲染。
+每个数据集版本把 ads_user_path_sankey 编译一次为整数编号的图：
+节点按名称排序编号，边保存为 (来源下标, 目标下标, 流量) 数组，并计算每个节点的层级
+（距入口节点的最短步数）。请求时在数组上剪枝：
+- max_depth：只保留从入口出发不超过指定步数的边
+- top_k / min_share：按流量保留前 K 条且占比不低于阈值的边
+- 被剪掉的边按来源节点合并到"其他"节点，保证保留节点的流出总量不变
+"""
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.data import UserPathSankey
+from ..utils.cache import cached_query
+
+OTHER_NODE = "其他"
+
+
+class SankeyGraph:
+    """整数编号的桑基图"""
+
+    def __init__(self, names: List[str], src: np.ndarray, dst: np.ndarray, value: np.ndarray):
+        self.names = names
+        self.src = src
+        self.dst = dst
+        self.value = value
+        self.depth = self._depths()
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str, int]]) -> "SankeyGraph":
+        """由 (来源, 目标, 流量) 构建；同一条边出现多次时流量相加，边按 (来源, 目标) 名称排序"""
+        merged = {}
+        for source, target, value in edges:
+            key = (str(source), str(target))
+            merged[key] = merged.get(key, 0) + int(value)
+        names = sorted({name for key in merged for name in key})
+        position = {name: i for i, name in enumerate(names)}
+        keys = sorted(merged)
+        return cls(
+            names,
+            np.array([position[s] for s, _ in keys], dtype=np.int64),
+            np.array([position[t] for _, t in keys], dtype=np.int64),
+            np.array([merged[key] for key in keys], dtype=np.int64),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.src, self.dst, self.value, self.depth)
+        return sum(a.nbytes for a in arrays) + 64 * len(self.names)
+
+    def _depths(self) -> np.ndarray:
+        """
+        节点层级：从入口节点（无流入边）出发的 BFS 最短步数
+        全部在环上、没有入口的连通部分，以其中流出最大的节点作为入口
+        """
+        count = len(self.names)
+        depth = np.full(count, -1, dtype=np.int64)
+        if not count:
+            return depth
+        order = np.argsort(self.src, kind="stable")
+        offsets = np.searchsorted(self.src[order], np.arange(count + 1))
+        targets = self.dst[order]
+
+        indegree = np.bincount(self.dst, minlength=count)
+        outflow = np.bincount(self.src, weights=self.value, minlength=count)
+        roots = list(np.flatnonzero(indegree == 0))
+        while True:
+            queue = deque()
+            for root in roots:
+                if depth[root] < 0:
+                    depth[root] = 0
+                    queue.append(root)
+            while queue:
+                node = queue.popleft()
+                for nxt in targets[offsets[node]:offsets[node + 1]]:
+                    if depth[nxt] < 0:
+                        depth[nxt] = depth[node] + 1
+                        queue.append(nxt)
+            unvisited = np.flatnonzero(depth < 0)
+            if not len(unvisited):
+                return depth
+            roots = [unvisited[np.argmax(outflow[unvisited])]]
+
+    def prune(
+        self,
+        top_k: Optional[int] = None,
+        min_share: float = 0.0,
+        max_depth: Optional[int] = None,
+    ) -> Tuple[List[Tuple[int, int, int]], int]:
+        """
+        剪枝，返回 (边列表, 未保留的边数)
+        边为 (来源下标, 目标下标, 流量)，目标下标为 len(names) 表示"其他"节点；
+        保留的边按原顺序排列，合并到"其他"的边附在最后
+        """
+        eligible = np.ones(len(self.value), dtype=bool)
+        if max_depth is not None:
+            eligible &= self.depth[self.src] < max_depth
+        candidates = np.flatnonzero(eligible)
+        total = int(self.value[candidates].sum())
+
+        # 按流量降序（同流量按原顺序）取前 top_k 条且占比达到阈值的边
+        ranked = candidates[np.argsort(-self.value[candidates], kind="stable")]
+        if min_share > 0 and total:
+            ranked = ranked[self.value[ranked] >= min_share * total]
+        if top_k is not None:
+            ranked = ranked[:top_k]
+        kept = np.sort(ranked)
+
+        links = [(int(s), int(t), int(v)) for s, t, v in zip(self.src[kept], self.dst[kept], self.value[kept])]
+
+        # 未保留的边：来源节点仍在图中时，按来源合并为 来源 -> 其他
+        dropped = np.setdiff1d(candidates, kept, assume_unique=True)
+        present = np.zeros(len(self.names), dtype=bool)
+        present[self.src[kept]] = True
+        present[self.dst[kept]] = True
+        tail = dropped[present[self.src[dropped]]]
+        if len(tail):
+            other = np.bincount(self.src[tail], weights=self.value[tail], minlength=len(self.names))
+            for source in np.flatnonzero(other):
+                links.append((int(source), len(self.names), int(other[source])))
+        return links, len(self.value) - len(kept)
+
+    def encode(self, links: List[Tuple[int, int, int]], by_index: bool = False) -> dict:
+        """
+        输出为前端格式，节点按首次出现顺序排列（相同数据得到字节一致的响应）
+        :param by_index: 为 True 时边的 source/target 为节点数组下标，否则为节点名称
+        """
+        other_name = OTHER_NODE
+        while other_name in self.names:
+            other_name += "*"
+        names = self.names + [other_name]
+
+        position = {}
+        for source, target, _ in links:
+            position.setdefault(source, len(position))
+            position.setdefault(target, len(position))
+        nodes = [{"name": names[node]} for node in position]
+        if by_index:
+            encoded = [{"source": position[s], "target": position[t], "value": v} for s, t, v in links]
+        else:
+            encoded = [{"source": names[s], "target": names[t], "value": v} for s, t, v in links]
+        return {"nodes": nodes, "links": encoded}
+
+
+@cached_query(ttl=None)
+async def get_sankey_graph(db: AsyncSession) -> SankeyGraph:
+    """编译 ads_user_path_sankey 全表（每个数据集版本一次）"""
+    result = await db.execute(
+        select(
+            UserPathSankey.source_node,
+            UserPathSankey.target_node,
+            UserPathSankey.flow_value
+        )
+    )
+    return SankeyGraph.from_edges(result.all())
@@ -0,0 +1,165 @@
+"""
+响应快照预生成
+前端绝大多数请求落在少数几个日期预设上：不筛选、整月、每周、最近7天。
+每当 ADS 数据集版本变化，预先把这些预设以及不带日期参数的页面
+组装成最终的响应字节，路由命中快照时直接返回，不查询数据库、不做序列化。
+"""
+import asyncio
+import inspect
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.cache import FallbackTracker, normalize_arguments
+from ..utils.serialization import render_response
+from .panels import PAGES
+from .replica import read_session
+from .traffic import get_traffic_index
+from .version import UNKNOWN_VERSION, dataset_version, get_dataset_version
+
+# 支持日期筛选、按日期预设生成快照的页面
+DATED_PAGES = ("dashboard", "conversion", "product", "user-insight")
+
+# 快照键：(页面名, 补全默认值并规范化后的参数)
+SnapshotKey = Tuple[str, Tuple]
+
+
+def snapshot_key(page: str, params: Dict[str, Any]) -> SnapshotKey:
+    """生成快照键：补全页面组装函数的默认参数，日期参数规范化"""
+    bound = inspect.signature(PAGES[page]).bind(**params)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    normalize_arguments(arguments)
+    return page, tuple(sorted(arguments.items()))
+
+
+def _month_end(day: date) -> date:
+    """当月最后一天"""
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def dashboard_presets(first: date, last: date) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    根据数据覆盖的日期范围生成看板的日期预设
+    - 不筛选
+    - 每个自然月（1日至月末）
+    - 每月按1日对齐的7天周（1-7、8-14、……，与"国庆黄金周"快捷项一致）
+    - 自然周（周一至周日）
+    - 最近7天
+    """
+    presets = [(None, None)]
+    ranges = []
+
+    month = first.replace(day=1)
+    while month <= last:
+        month_end = _month_end(month)
+        ranges.append((month, month_end))
+        week_start = month
+        while week_start <= month_end:
+            ranges.append((week_start, min(week_start + timedelta(days=6), month_end)))
+            week_start += timedelta(days=7)
+        month = month_end + timedelta(days=1)
+
+    week_start = first - timedelta(days=first.weekday())
+    while week_start <= last:
+        ranges.append((week_start, week_start + timedelta(days=6)))
+        week_start += timedelta(days=7)
+
+    ranges.append((last - timedelta(days=6), last))
+
+    for start, end in ranges:
+        preset = (start.isoformat(), end.isoformat())
+        if preset not in presets:
+            presets.append(preset)
+    return presets
+
+
+class SnapshotStore:
+    """按数据集版本保存的响应字节快照"""
+
+    def __init__(self):
+        self.version: Optional[str] = None
+        self._payloads: Dict[SnapshotKey, bytes] = {}
+        self._building: Optional[asyncio.Task] = None
+
+    def get(self, version: str, page: str, params: Dict[str, Any]) -> Optional[bytes]:
+        """读取快照；版本不一致或预设未覆盖时返回 None"""
+        if version != self.version or not self._payloads:
+            return None
+        return self._payloads.get(snapshot_key(page, params))
+
+    def stats(self) -> dict:
+        """快照统计"""
+        return {
+            "version": self.version,
+            "snapshots": len(self._payloads),
+            "bytes": sum(len(body) for body in self._payloads.values()),
+        }
+
+    async def _date_span(self) -> Optional[Tuple[date, date]]:
+        """数据覆盖的首末日期（取自流量趋势索引）"""
+        try:
+            async with read_session() as session:
+                index = await get_traffic_index(session)
+        except Exception as e:
+            print(f"snapshot date span error: {e}")
+            return None
+        if index.first_day is None:
+            return None
+        return index.first_day, index.last_day
+
+    async def rebuild(self, version: str) -> None:
+        """为指定版本生成全部快照，完成后整体替换"""
+        requests: List[Tuple[str, Dict[str, Any]]] = [(page, {}) for page in PAGES]
+        span = await self._date_span()
+        if span:
+            requests += [
+                (page, {"start_date": start, "end_date": end})
+                for start, end in dashboard_presets(*span)[1:]
+                for page in DATED_PAGES
+            ]
+
+        payloads: Dict[SnapshotKey, bytes] = {}
+        for page, params in requests:
+            try:
+                with FallbackTracker() as fallbacks:
+                    result = await PAGES[page](**params)
+            except Exception as e:
+                print(f"snapshot {page} {params} error: {e}")
+                continue
+            # 出错、部分面板失败或查询异常后回退为空值的结果不做快照
+            if result.code != 200 or (isinstance(result.data, dict) and result.data.get("failedPanels")):
+                continue
+            if fallbacks.count:
+                continue
+            payloads[snapshot_key(page, params)] = render_response(result)
+
+        # 生成期间版本可能再次变化，只接受仍为最新版本的结果
+        if version == dataset_version.peek():
+            self.version = version
+            self._payloads = payloads
+            print(f"snapshot rebuilt for version {version}: {len(payloads)} payloads")
+
+    def schedule(self, version: str) -> None:
+        """后台生成快照；已有生成任务时先取消"""
+        if self._building and not self._building.done():
+            self._building.cancel()
+        self._building = asyncio.create_task(self.rebuild(version))
+
+    async def warm(self) -> None:
+        """启动预热：为当前版本生成快照（版本未知时跳过，等待下次版本变化）"""
+        version = await get_dataset_version()
+        if version != UNKNOWN_VERSION:
+            self.schedule(version)
+
+
+snapshot_store = SnapshotStore()
+
+
+async def _on_version_change(version: str) -> None:
+    """数据集版本变化后重新生成快照"""
+    if version != UNKNOWN_VERSION:
+        snapshot_store.schedule(version)
+
+
+dataset_version.add_listener(_on_version_change)
@@ -0,0 +1,87 @@
+"""
+任意日期范围的品牌/品类销售额 TOP-K
+ads_sales_heavy_hitters_daily 每个数据集版本只读取一次，每天每个维度解码为一个 Space-Saving 草图；
+日期范围的 TOP-K 为范围内各天草图的合并结果，不保存、不扫描 品牌×日期 全表。
+每个名次给出销售额上界和误差（上界-误差为下界），误差不超过 范围内该维度总额 / HEAVY_HITTER_CAPACITY。
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.data import SalesHeavyHittersDaily
+from ..utils import heavy_hitters
+from ..utils.cache import cached_query
+from .behavior import _DailySlices
+
+DIMENSIONS = ("brand", "category")
+
+
+class SalesSketches(_DailySlices):
+    """按数据集版本构建：summaries[维度][k] 为第 k 个日期的草图（没有数据的日期为空草图）"""
+
+    def __init__(self, days: np.ndarray, summaries: Dict[str, List[heavy_hitters.Summary]], totals: Dict[str, np.ndarray]):
+        super().__init__(list(DIMENSIONS), days)
+        self.summaries = summaries
+        self.totals = totals
+
+    @property
+    def nbytes(self) -> int:
+        sketches = sum(summary.nbytes for summaries in self.summaries.values() for summary in summaries)
+        return self.days.nbytes + sketches + sum(total.nbytes for total in self.totals.values())
+
+    def top(self, dimension: str, start_date: str, end_date: str, k: int):
+        """
+        日期范围内该维度销售额前 k 的 (名称, 上界, 误差)（单位分）和范围总额
+        范围内没有数据时返回 None
+        """
+        i, j = self.locate(start_date, end_date)
+        if i >= j:
+            return None
+        summaries = self.summaries[dimension][i:j]
+        capacity = max((summary.capacity for summary in summaries), default=k)
+        merged = heavy_hitters.merge(summaries, max(capacity, k))
+        return merged.top(k), int(self.totals[dimension][i:j].sum())
+
+
+@cached_query(ttl=None)
+async def get_sales_sketches(db: AsyncSession) -> SalesSketches:
+    """整表读取 ads_sales_heavy_hitters_daily（每个数据集版本一次）"""
+    result = await db.execute(select(
+        SalesHeavyHittersDaily.dt,
+        SalesHeavyHittersDaily.dimension,
+        SalesHeavyHittersDaily.total_sales,
+        SalesHeavyHittersDaily.sketch,
+    ))
+    rows = [row for row in result.all() if row.dimension in DIMENSIONS]
+    days = np.array(sorted({row.dt.toordinal() for row in rows}), dtype=np.int64)
+    summaries = {dimension: [heavy_hitters.empty(0)] * len(days) for dimension in DIMENSIONS}
+    totals = {dimension: np.zeros(len(days), dtype=np.int64) for dimension in DIMENSIONS}
+    for row in rows:
+        k = int(np.searchsorted(days, row.dt.toordinal()))
+        summaries[row.dimension][k] = heavy_hitters.decode(row.sketch)
+        totals[row.dimension][k] = int(round(row.total_sales * 100))
+    return SalesSketches(days, summaries, totals)
+
+
+async def get_top_sales(
+    db: AsyncSession, dimension: str, start_date: str, end_date: str, k: int
+) -> Optional[dict]:
+    """
+    日期范围内的销售额 TOP-K：names、sales（上界，元）、errors（误差，元）、total（范围总额，元）
+    草图表尚未导入时返回 None（调用方退回整月汇总表）
+    """
+    sketches = await get_sales_sketches(db)
+    if sketches.empty:
+        return None
+    found = sketches.top(dimension, start_date, end_date, k)
+    if found is None:
+        return {"names": [], "sales": [], "errors": [], "total": 0}
+    items, total = found
+    return {
+        "names": [name for name, _, _ in items],
+        "sales": [count / 100 for _, count, _ in items],
+        "errors": [error / 100 for _, _, error in items],
+        "total": total / 100,
+    }
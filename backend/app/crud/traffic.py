@@ -0,0 +1,255 @@
+"""
+流量趋势索引
+ads_traffic_trend_daily 每个数据集版本只整表读取一次，在内存中构建：
+- 按日期排序的 PV/UV/GMV 数组
+- 周（周一起始）和月两级预聚合（rollup）
+- PV/UV/GMV 前缀和数组，任意日期范围的汇总指标为两次数组查找之差
+- 每天都有访客 HyperLogLog 草图（uv_sketch）时，保存 天数×寄存器 的矩阵：
+  范围 UV 和周/月粒度的 UV 为范围内草图合并后的去重估计，同一访客在多天活跃只计一次；
+  缺少草图时退回按天 UV 相加
+任意日期范围、任意粒度的趋势和指标卡片都由数组切片/查找得到，不再按请求查询数据库；
+点数超过上限时再用 LTTB 降采样，多年数据的趋势响应大小也保持恒定。
+"""
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config.settings import settings
+from ..models.data import TrafficTrendDaily
+from ..utils.cache import cached_query
+from .replica import QUERY_ERRORS
+from ..utils import hll
+from ..utils.downsample import lttb_indices
+
+RESOLUTIONS = ("day", "week", "month")
+
+
+class _Rollup:
+    """
+    一级预聚合
+    starts[k] 为第 k 个桶首日在日数组中的下标，bucket_of[i] 为第 i 天所属的桶
+    """
+
+    def __init__(self, keys: np.ndarray, labels: List[str], pv: np.ndarray, uv: np.ndarray):
+        self.starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1)).astype(np.int64)
+        self.ends = np.append(self.starts[1:], len(keys))
+        self.bucket_of = np.repeat(np.arange(len(self.starts)), self.ends - self.starts)
+        self.labels = [labels[i] for i in self.starts]
+        self.pv = np.add.reduceat(pv, self.starts) if len(keys) else pv
+        self.uv = np.add.reduceat(uv, self.starts) if len(keys) else uv
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.starts, self.ends, self.bucket_of, self.pv, self.uv)
+        return sum(a.nbytes for a in arrays) + 64 * len(self.labels)
+
+
+class TrafficIndex:
+    """按数据集版本构建的流量趋势内存索引"""
+
+    def __init__(
+        self,
+        days: List[date],
+        pv: List[int],
+        uv: List[int],
+        gmv: List[float],
+        sketches: Optional[List[Optional[str]]] = None,
+    ):
+        self.days = np.array([day.toordinal() for day in days], dtype=np.int64)
+        self.labels = [day.isoformat() for day in days]
+        self.pv = np.array(pv, dtype=np.int64)
+        self.uv = np.array(uv, dtype=np.int64)
+        self.gmv = np.array(gmv, dtype=np.float64)
+        # 前缀和：cum[k] 为前 k 天之和，[i, j) 的合计为 cum[j] - cum[i]
+        self.cum_pv = np.concatenate(([0], np.cumsum(self.pv))).astype(np.int64)
+        self.cum_uv = np.concatenate(([0], np.cumsum(self.uv))).astype(np.int64)
+        self.cum_gmv = np.concatenate(([0.0], np.cumsum(self.gmv)))
+        self.registers = self._decode_sketches(sketches)
+
+        # 周键：所在周周一的序号；月键：年*12+月
+        weekdays = np.array([day.weekday() for day in days], dtype=np.int64)
+        week_keys = self.days - weekdays
+        month_keys = np.array([day.year * 12 + day.month - 1 for day in days], dtype=np.int64)
+        week_labels = [date.fromordinal(int(key)).isoformat() for key in week_keys]
+        month_labels = [label[:7] for label in self.labels]
+        self.rollups: Dict[str, _Rollup] = {
+            "week": _Rollup(week_keys, week_labels, self.pv, self.uv),
+            "month": _Rollup(month_keys, month_labels, self.pv, self.uv),
+        }
+
+    @staticmethod
+    def _decode_sketches(sketches: Optional[List[Optional[str]]]) -> Optional[np.ndarray]:
+        """每天的 UV 草图解码为 (天数, 寄存器数) 矩阵；任何一天缺少草图、无法解码或精度不一致时返回 None"""
+        if not sketches or any(sketch is None for sketch in sketches):
+            return None
+        try:
+            return np.stack([hll.decode(sketch) for sketch in sketches])
+        except ValueError as e:
+            print(f"uv sketch decode error: {e}")
+            return None
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.days, self.pv, self.uv, self.gmv, self.cum_pv, self.cum_uv, self.cum_gmv)
+        return (
+            sum(a.nbytes for a in arrays)
+            + 64 * len(self.labels)
+            + sum(rollup.nbytes for rollup in self.rollups.values())
+            + (self.registers.nbytes if self.registers is not None else 0)
+        )
+
+    @property
+    def first_day(self) -> Optional[date]:
+        return date.fromordinal(int(self.days[0])) if len(self.days) else None
+
+    @property
+    def last_day(self) -> Optional[date]:
+        return date.fromordinal(int(self.days[-1])) if len(self.days) else None
+
+    def locate(self, start_date: Optional[str], end_date: Optional[str]) -> Tuple[int, int]:
+        """日期范围对应的日数组下标区间 [i, j)；未指定范围时为全部数据"""
+        if not start_date or not end_date:
+            return 0, len(self.days)
+        start = date.fromisoformat(start_date).toordinal()
+        end = date.fromisoformat(end_date).toordinal()
+        i = int(np.searchsorted(self.days, start, side="left"))
+        j = int(np.searchsorted(self.days, end, side="right"))
+        return i, max(i, j)
+
+    def distinct_uv(self, i: int, j: int) -> int:
+        """日下标区间 [i, j) 的去重访客数：合并范围内的草图后估计；没有草图时为按天 UV 相加"""
+        if self.registers is None:
+            return int(self.cum_uv[j] - self.cum_uv[i])
+        return int(round(float(hll.estimate(hll.merge(self.registers[i:j])))))
+
+    def metrics(self, i: int, j: int) -> dict:
+        """日下标区间 [i, j) 的 GMV/PV/UV 合计（GMV/PV 为前缀和相减，UV 为草图合并去重）"""
+        gmv = round(float(self.cum_gmv[j] - self.cum_gmv[i]), 2)
+        return {
+            "gmv": gmv if gmv else 0,
+            "pv": int(self.cum_pv[j] - self.cum_pv[i]),
+            "uv": self.distinct_uv(i, j),
+        }
+
+    def _bucket_span(self, resolution: str, i: int, j: int) -> Tuple[int, int]:
+        """日下标区间覆盖的桶下标区间 [b0, b1]"""
+        rollup = self.rollups[resolution]
+        return int(rollup.bucket_of[i]), int(rollup.bucket_of[j - 1])
+
+    def point_count(self, resolution: str, i: int, j: int) -> int:
+        """指定粒度下的点数"""
+        if resolution == "day":
+            return j - i
+        b0, b1 = self._bucket_span(resolution, i, j)
+        return b1 - b0 + 1
+
+    def series(self, resolution: str, i: int, j: int) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        指定粒度的 (横轴标签, PV, UV)
+        范围首尾落在桶中间时，只累计范围内的天数（用前缀和扣除范围外的部分）；
+        有草图时周/月的 UV 为桶内（范围内）各天草图合并后的去重估计
+        """
+        if resolution == "day":
+            return self.labels[i:j], self.pv[i:j], self.uv[i:j]
+
+        rollup = self.rollups[resolution]
+        b0, b1 = self._bucket_span(resolution, i, j)
+        pv = rollup.pv[b0:b1 + 1].copy()
+        uv = rollup.uv[b0:b1 + 1].copy()
+        head, tail = rollup.starts[b0], rollup.ends[b1]
+        pv[0] -= self.cum_pv[i] - self.cum_pv[head]
+        uv[0] -= self.cum_uv[i] - self.cum_uv[head]
+        pv[-1] -= self.cum_pv[tail] - self.cum_pv[j]
+        uv[-1] -= self.cum_uv[tail] - self.cum_uv[j]
+        if self.registers is not None:
+            bounds = np.concatenate(([i], rollup.starts[b0 + 1:b1 + 1])) - i
+            merged = np.maximum.reduceat(self.registers[i:j], bounds, axis=0)
+            uv = np.rint(hll.estimate(merged)).astype(np.int64)
+        return rollup.labels[b0:b1 + 1], pv, uv
+
+
+def _trend_query(with_sketch: bool):
+    columns = [
+        TrafficTrendDaily.dt,
+        TrafficTrendDaily.total_pv,
+        TrafficTrendDaily.total_uv,
+        TrafficTrendDaily.total_gmv,
+    ]
+    if with_sketch:
+        columns.append(TrafficTrendDaily.uv_sketch)
+    return select(*columns).order_by(TrafficTrendDaily.dt)
+
+
+@cached_query(ttl=None)
+async def get_traffic_index(db: AsyncSession) -> TrafficIndex:
+    """
+    整表读取 ads_traffic_trend_daily 构建趋势索引（每个数据集版本一次）
+    已存在的表未执行 ALTER TABLE 补建 uv_sketch 列（或副本文件早于该列）时，改为不读草图查询，范围 UV 退回按天相加
+    """
+    try:
+        rows = (await db.execute(_trend_query(with_sketch=True))).all()
+        sketches = [row.uv_sketch for row in rows]
+    except QUERY_ERRORS as e:
+        print(f"traffic trend uv_sketch unavailable: {e}")
+        await db.rollback()
+        rows = (await db.execute(_trend_query(with_sketch=False))).all()
+        sketches = None
+    return TrafficIndex(
+        [row.dt for row in rows],
+        [int(row.total_pv) for row in rows],
+        [int(row.total_uv) for row in rows],
+        [float(row.total_gmv) if row.total_gmv else 0.0 for row in rows],
+        sketches,
+    )
+
+
+def choose_resolution(index: TrafficIndex, i: int, j: int, max_points: int) -> str:
+    """auto 粒度：点数不超过上限的最细粒度，都超过时取月"""
+    for resolution in RESOLUTIONS:
+        if index.point_count(resolution, i, j) <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def build_trend(
+    index: TrafficIndex,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    resolution: str = "auto",
+    points: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    从索引生成趋势图数据；范围内没有数据时返回 None
+    :param resolution: day / week / month / auto
+    :param points: 最大点数，默认 TREND_MAX_POINTS；超过时按 PV 序列做 LTTB 降采样
+    """
+    max_points = points or settings.TREND_MAX_POINTS
+    i, j = index.locate(start_date, end_date)
+    if i >= j:
+        return None
+
+    if resolution == "auto":
+        resolution = choose_resolution(index, i, j, max_points)
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"unsupported resolution: {resolution}")
+
+    labels, pv, uv = index.series(resolution, i, j)
+    downsampled = len(pv) > max_points
+    if downsampled:
+        # PV 与 UV 共用同一组下标，保证两条折线的横轴一致
+        keep = lttb_indices(np.arange(len(pv)), pv, max_points)
+        labels = [labels[k] for k in keep]
+        pv, uv = pv[keep], uv[keep]
+
+    return {
+        "xAxis": list(labels),
+        "series": [
+            {"name": "PV (浏览量)", "data": pv.tolist()},
+            {"name": "UV (访客数)", "data": uv.tolist()}
+        ],
+        "resolution": resolution,
+        "downsampled": downsampled,
+    }
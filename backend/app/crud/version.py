@@ -0,0 +1,110 @@
+"""
+ADS 数据集版本
+ads_* 表由 Hive 批量导出，批次之间数据不变。
+这里用 information_schema 中各表的创建/更新时间生成一个版本指纹，
+缓存等模块以此判断数据是否已刷新。
+"""
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config.database import AsyncSessionLocal
+from ..config.settings import settings
+
+
+# 版本查询失败且此前没有已知版本时使用
+UNKNOWN_VERSION = "unknown"
+
+_VERSION_SQL = text(
+    "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME LIKE 'ads\\_%' "
+    "ORDER BY TABLE_NAME"
+)
+
+
+async def _fetch_version(db: AsyncSession) -> str:
+    """查询 ads_* 表的元数据并生成版本指纹"""
+    result = await db.execute(_VERSION_SQL)
+    digest = hashlib.sha1()
+    for row in result.all():
+        digest.update(f"{row[0]}|{row[1]}|{row[2]};".encode())
+    return digest.hexdigest()[:16]
+
+
+class DatasetVersionTracker:
+    """
+    数据集版本跟踪器
+    版本在 check_interval 秒内只查询一次，版本变化时通知已注册的监听函数
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        self._listeners: List[Callable[[str], Awaitable[None]]] = []
+        self._source: Optional[Callable[[], Awaitable[str]]] = None
+
+    def peek(self) -> Optional[str]:
+        """返回最近一次已知的版本（不访问数据库）"""
+        return self._version
+
+    def add_listener(self, listener: Callable[[str], Awaitable[None]]) -> None:
+        """注册版本变化回调，参数为新版本号"""
+        self._listeners.append(listener)
+
+    def set_source(self, source: Optional[Callable[[], Awaitable[str]]]) -> None:
+        """替换版本来源（离线副本模式下不访问 MySQL）；None 恢复为查询 information_schema"""
+        self._source = source
+
+    async def get(self, db: Optional[AsyncSession] = None) -> str:
+        """
+        获取当前数据集版本
+        :param db: 可选的会话；未传入时使用独立会话查询
+        """
+        if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return self._version
+
+        async with self._lock:
+            # 等锁期间可能已被其他协程刷新
+            if self._version is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._version
+            return await self.refresh(db)
+
+    async def refresh(self, db: Optional[AsyncSession] = None) -> str:
+        """强制重新查询版本，查询失败时沿用旧版本"""
+        try:
+            if self._source is not None:
+                version = await self._source()
+            elif db is not None:
+                version = await _fetch_version(db)
+            else:
+                async with AsyncSessionLocal() as session:
+                    version = await _fetch_version(session)
+        except Exception as e:
+            print(f"dataset version check error: {e}")
+            version = self._version or UNKNOWN_VERSION
+
+        previous = self._version
+        self._version = version
+        self._checked_at = time.monotonic()
+
+        if previous is not None and previous != version:
+            for listener in self._listeners:
+                try:
+                    await listener(version)
+                except Exception as e:
+                    print(f"dataset version listener error: {e}")
+        return version
+
+
+dataset_version = DatasetVersionTracker(settings.ADS_VERSION_CHECK_SECONDS)
+
+
+async def get_dataset_version(db: Optional[AsyncSession] = None) -> str:
+    """获取当前 ADS 数据集版本"""
+    return await dataset_version.get(db)
@@ -7,15 +7,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from .config.database import async_engine, Base
+from .config.settings import settings
+from .crud.replica import replica_store
+from .crud.snapshot import snapshot_store
 from .routers import auth, data
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时创建表
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # 启动时创建表（offline 模式不连接 MySQL）
+    if settings.ADS_REPLICA_MODE != "offline":
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    # 打开或后台同步 ADS 本地副本
+    await replica_store.start()
+    # 后台预生成常用响应快照
+    await snapshot_store.warm()
     yield
     # 关闭时清理资源
     await async_engine.dispose()
@@ -43,6 +51,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # 注册路由
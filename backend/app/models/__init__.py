@@ -5,8 +5,17 @@ from .data import (
     ActivityHeatmap,
     CategorySalesStat,
     BrandSalesTop10,
+    BrandSalesStat,
     ConversionFunnel,
     UserPathSankey,
     UserRfmStat,
     SkuPriceSensitivity,
+    SkuSalesDaily,
+    SkuSalesDailyPrediction,
+    ActivityHeatmapDaily,
+    ConversionFunnelDaily,
+    UserPathSankeyDaily,
+    UserRfmStatDaily,
+    SalesHeavyHittersDaily,
+    UserBitmapDaily,
 )
@@ -5,7 +5,8 @@
 """
 from datetime import date
 from decimal import Decimal
-from sqlalchemy import String
+from typing import Optional
+from sqlalchemy import Index, String, Text
 from sqlalchemy.orm import Mapped, mapped_column
 from ..config.database import Base
 
@@ -19,6 +20,9 @@ class TrafficTrendDaily(Base):
     total_gmv: Mapped[Decimal] = mapped_column(comment="当日总销售额")
     total_pv: Mapped[int] = mapped_column(comment="当日总浏览量")
     total_uv: Mapped[int] = mapped_column(comment="当日独立访客数")
+    uv_sketch: Mapped[Optional[str]] = mapped_column(
+        Text, nullable=True, comment="当日访客 HyperLogLog 草图（app/utils/hll.py 编码），用于跨天去重"
+    )
 
     def __repr__(self):
         return f"<TrafficTrendDaily(dt={self.dt}, pv={self.total_pv}, uv={self.total_uv})>"
@@ -62,6 +66,22 @@ class BrandSalesTop10(Base):
         return f"<BrandSalesTop10(brand={self.brand_name}, sales={self.total_sales})>"
 
 
+class BrandSalesStat(Base):
+    """品牌销售统计表（全部品牌）"""
+    __tablename__ = "ads_brand_sales_stat"
+    __table_args__ = (
+        # 品牌销售额排行的键集分页索引
+        Index("idx_brand_sales_stat_sales", "total_sales", "brand_name"),
+        {'extend_existing': True},
+    )
+
+    brand_name: Mapped[str] = mapped_column(String(255), primary_key=True, comment="品牌名称")
+    total_sales: Mapped[Decimal] = mapped_column(comment="总销售额")
+
+    def __repr__(self):
+        return f"<BrandSalesStat(brand={self.brand_name}, sales={self.total_sales})>"
+
+
 class ConversionFunnel(Base):
     """转化漏斗表"""
     __tablename__ = "ads_conversion_funnel"
@@ -102,7 +122,11 @@ class UserRfmStat(Base):
 class SkuPriceSensitivity(Base):
     """SKU价格敏感度表"""
     __tablename__ = "ads_sku_price_sensitivity"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # SKU 销量排行的键集分页索引
+        Index("idx_sku_price_sensitivity_sales", "total_sales", "product_id"),
+        {'extend_existing': True},
+    )
 
     product_id: Mapped[str] = mapped_column(String(100), primary_key=True, comment="商品ID")
     avg_price: Mapped[Decimal] = mapped_column(comment="平均价格")
@@ -110,3 +134,118 @@ class SkuPriceSensitivity(Base):
 
     def __repr__(self):
         return f"<SkuPriceSensitivity(id={self.product_id}, price={self.avg_price}, sales={self.total_sales})>"
+
+
+class SkuSalesDaily(Base):
+    """SKU 每日销量表（批量 SKU 预测的输入）"""
+    __tablename__ = "ads_sku_sales_daily"
+    __table_args__ = {'extend_existing': True}
+
+    product_id: Mapped[str] = mapped_column(String(100), primary_key=True, comment="商品ID")
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    sales_count: Mapped[int] = mapped_column(comment="当日销量")
+
+    def __repr__(self):
+        return f"<SkuSalesDaily(id={self.product_id}, dt={self.dt}, sales={self.sales_count})>"
+
+
+class SkuSalesDailyPrediction(Base):
+    """SKU 每日销量预测表（由 etl/sku_forecast.py 批量写入）"""
+    __tablename__ = "ads_sku_sales_daily_prediction"
+    __table_args__ = {'extend_existing': True}
+
+    product_id: Mapped[str] = mapped_column(String(100), primary_key=True, comment="商品ID")
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="预测日期")
+    forecast_sales: Mapped[float] = mapped_column(comment="预测销量")
+    lower_bound: Mapped[float] = mapped_column(comment="95%预测区间下界")
+    upper_bound: Mapped[float] = mapped_column(comment="95%预测区间上界")
+    model_name: Mapped[str] = mapped_column(String(32), comment="所选预测模型")
+
+    def __repr__(self):
+        return f"<SkuSalesDailyPrediction(id={self.product_id}, dt={self.dt}, sales={self.forecast_sales})>"
+
+
+# ==================== 按日切片的行为表 ====================
+# 与上面的整月汇总表一一对应，多一个日期主键 dt，
+# 后端按日期范围合并切片，使日期筛选对热力图、漏斗、桑基图、RFM 生效
+
+class ActivityHeatmapDaily(Base):
+    """用户活跃时段热力图表（按日）"""
+    __tablename__ = "ads_activity_heatmap_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    hour_val: Mapped[int] = mapped_column(primary_key=True, comment="小时(0-23)")
+    week_val: Mapped[int] = mapped_column(primary_key=True, comment="星期(0-6)")
+    activity_count: Mapped[int] = mapped_column(comment="当日该时段活跃次数")
+
+    def __repr__(self):
+        return f"<ActivityHeatmapDaily(dt={self.dt}, hour={self.hour_val}, week={self.week_val}, count={self.activity_count})>"
+
+
+class ConversionFunnelDaily(Base):
+    """转化漏斗表（按日）"""
+    __tablename__ = "ads_conversion_funnel_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    step_name: Mapped[str] = mapped_column(String(100), primary_key=True, comment="漏斗步骤名称")
+    step_value: Mapped[int] = mapped_column(comment="当日步骤数值")
+
+    def __repr__(self):
+        return f"<ConversionFunnelDaily(dt={self.dt}, step={self.step_name}, value={self.step_value})>"
+
+
+class UserPathSankeyDaily(Base):
+    """用户路径桑基图表（按日）"""
+    __tablename__ = "ads_user_path_sankey_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    source_node: Mapped[str] = mapped_column(String(100), primary_key=True, comment="来源节点")
+    target_node: Mapped[str] = mapped_column(String(100), primary_key=True, comment="目标节点")
+    flow_value: Mapped[int] = mapped_column(comment="当日流量值")
+
+    def __repr__(self):
+        return f"<UserPathSankeyDaily(dt={self.dt}, source={self.source_node}, target={self.target_node}, flow={self.flow_value})>"
+
+
+class UserRfmStatDaily(Base):
+    """用户RFM分层统计表（按用户最近一次购买日期切片，每个用户只计入一天，可直接相加）"""
+    __tablename__ = "ads_user_rfm_stat_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="用户最近一次购买日期")
+    rfm_segment: Mapped[str] = mapped_column(String(100), primary_key=True, comment="RFM分层名称")
+    user_count: Mapped[int] = mapped_column(comment="用户数量")
+
+    def __repr__(self):
+        return f"<UserRfmStatDaily(dt={self.dt}, segment={self.rfm_segment}, count={self.user_count})>"
+
+
+class SalesHeavyHittersDaily(Base):
+    """每日品牌/品类销售额热门项草图表（Space-Saving，app/utils/heavy_hitters.py 编码）"""
+    __tablename__ = "ads_sales_heavy_hitters_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    dimension: Mapped[str] = mapped_column(String(16), primary_key=True, comment="维度：brand / category")
+    total_sales: Mapped[Decimal] = mapped_column(comment="当日该维度非空的购买总额")
+    sketch: Mapped[str] = mapped_column(Text, comment="销售额（单位分）的热门项草图")
+
+    def __repr__(self):
+        return f"<SalesHeavyHittersDaily(dt={self.dt}, dimension={self.dimension}, total={self.total_sales})>"
+
+
+class UserBitmapDaily(Base):
+    """每日用户位图表（活跃/加购/购买用户集合，app/utils/bitmap.py 编码，位下标为稠密用户编号）"""
+    __tablename__ = "ads_user_bitmap_daily"
+    __table_args__ = {'extend_existing': True}
+
+    dt: Mapped[date] = mapped_column(primary_key=True, comment="日期")
+    behavior: Mapped[str] = mapped_column(String(16), primary_key=True, comment="行为：active / cart / purchase")
+    user_count: Mapped[int] = mapped_column(comment="用户数")
+    bitmap: Mapped[str] = mapped_column(Text(16777215), comment="用户位图（同一批次内所有行共用一套稠密用户编号）")
+
+    def __repr__(self):
+        return f"<UserBitmapDaily(dt={self.dt}, behavior={self.behavior}, count={self.user_count})>"
@@ -2,124 +2,317 @@
 数据API路由模块
 提供看板、转化、商品、用户洞察、预测等数据接口
 数据从MySQL数据库异步读取
+所有数据接口返回基于数据集版本的强 ETag，If-None-Match 命中时直接返回 304；
+常用日期预设和无参数页面由预生成快照直接返回
 """
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import inspect
+
+from fastapi import APIRouter, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from typing import Optional
 
-from ..config.database import get_db
+from ..config.settings import settings
 from ..schemas.response import ResponseModel
-from ..crud import data as data_crud
+from ..crud import export as export_crud
+from ..crud import panels
+from ..crud.cohort import bitmap_index
+from ..crud.live import STREAM_PAGES, encode_event, live_hub
+from ..crud.replica import read_session, replica_store
+from ..crud.snapshot import snapshot_store
+from ..crud.version import get_dataset_version
+from ..utils.cache import result_cache
+from ..utils.http_cache import make_etag, etag_matches, cache_headers, NO_STORE_HEADERS
+from ..utils.serialization import EnvelopeResponse
 
 router = APIRouter(prefix="/data", tags=["数据接口"])
 
 
+async def _serve(request: Request, page: str, **params) -> Response:
+    """
+    统一的数据接口响应流程：
+    1. 根据内存中的数据集版本计算 ETag，If-None-Match 命中时返回 304
+    2. 命中预生成快照时直接返回快照字节
+    3. 否则实时组装页面并序列化；出错或部分面板失败的响应不允许缓存
+    前两步不查询业务表、不做序列化
+    """
+    version = await get_dataset_version()
+    etag = make_etag(version, request)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+
+    body = snapshot_store.get(version, page, params)
+    if body is not None:
+        return EnvelopeResponse(content=body, headers=cache_headers(etag))
+
+    try:
+        result = await panels.PAGES[page](**params)
+    except Exception as e:
+        result = ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+
+    cacheable = result.code == 200 and not (
+        isinstance(result.data, dict) and result.data.get("failedPanels")
+    )
+    headers = cache_headers(etag) if cacheable else NO_STORE_HEADERS
+    return EnvelopeResponse(content=result, headers=headers)
+
+
 @router.get("/dashboard", response_model=ResponseModel)
 async def get_dashboard_data(
+    request: Request,
     start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
-    db: AsyncSession = Depends(get_db)
+    resolution: str = Query("auto", pattern="^(auto|day|week|month)$", description="趋势图粒度 auto / day / week / month"),
+    points: Optional[int] = Query(None, ge=10, le=1000, description="趋势图最大点数，超过时做 LTTB 降采样"),
 ):
     """
     获取运营看板数据
     包含：指标卡片(GMV/PV/UV)、活动热力图、品类销售、趋势图
     所有数据受日期筛选器控制——日期范围内无数据时全部返回空
+    各面板并发查询，超时的面板返回空值并记录在 failedPanels 中
+    趋势图按粒度从预聚合索引切片，点数超过上限时降采样，长时间范围的响应大小保持恒定
     """
-    try:
-        # 获取核心指标（日期过滤）
-        metrics = await data_crud.get_dashboard_metrics(db, start_date, end_date)
-        
-        # 获取活动热力图（日期过滤）
-        activity_heatmap = await data_crud.get_activity_heatmap(db, start_date, end_date)
-        
-        # 获取品类销售数据（日期过滤）
-        category_sales = await data_crud.get_category_sales(db, start_date, end_date)
-        
-        # 获取流量趋势（日期过滤）
-        traffic_trend = await data_crud.get_traffic_trend(db, start_date, end_date)
-        
-        response_data = {
-            "metrics": metrics,
-            "activityHeatmap": activity_heatmap,
-            "categorySales": category_sales,
-            "pvuvTrend": traffic_trend
-        }
-        
-        return ResponseModel(code=200, message="success", data=response_data)
-    except Exception as e:
-        return ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+    return await _serve(
+        request, "dashboard", start_date=start_date, end_date=end_date, resolution=resolution, points=points
+    )
 
 
 @router.get("/conversion", response_model=ResponseModel)
-async def get_conversion_data(db: AsyncSession = Depends(get_db)):
+async def get_conversion_data(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+):
     """
     获取转化数据
     包含：漏斗图、桑基图
+    指定日期范围时合并按日切片表中范围内的数据
     """
-    try:
-        funnel = await data_crud.get_conversion_funnel(db)
-        sankey = await data_crud.get_sankey_data(db)
-        
-        return ResponseModel(
-            code=200,
-            message="success",
-            data={"funnel": funnel, "sankey": sankey}
-        )
-    except Exception as e:
-        return ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+    return await _serve(request, "conversion", start_date=start_date, end_date=end_date)
+
+
+@router.get("/brand-ranking", response_model=ResponseModel)
+async def get_brand_ranking(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor，第一页不传"),
+    limit: int = Query(20, ge=1, le=200, description="每页条数"),
+):
+    """
+    获取全部品牌的销售额排行（键集分页）
+    按 (销售额, 品牌名) 降序，任意页的查询代价与第一页相同
+    """
+    return await _serve(request, "brand-ranking", cursor=cursor, limit=limit)
+
+
+@router.get("/sku-ranking", response_model=ResponseModel)
+async def get_sku_ranking(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor，第一页不传"),
+    limit: int = Query(20, ge=1, le=200, description="每页条数"),
+):
+    """
+    获取全部 SKU 的销量排行（键集分页）
+    按 (销量, 商品ID) 降序，任意页的查询代价与第一页相同
+    """
+    return await _serve(request, "sku-ranking", cursor=cursor, limit=limit)
+
+
+@router.get("/sankey", response_model=ResponseModel)
+async def get_sankey_data(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    top_k: Optional[int] = Query(None, ge=1, le=5000, description="最多保留的边数，默认 SANKEY_TOP_K"),
+    min_share: float = Query(0.0, ge=0.0, le=1.0, description="边流量占总流量的最小比例"),
+    max_depth: Optional[int] = Query(None, ge=1, le=50, description="从入口节点出发的最大步数"),
+):
+    """
+    获取剪枝后的用户路径桑基图
+    图按数据集版本编译为整数编号，服务端按流量 TOP-K、最小占比和最大深度剪枝，
+    剪掉的边按来源合并到"其他"节点；links 中的 source/target 为 nodes 数组下标
+    """
+    return await _serve(
+        request, "sankey",
+        start_date=start_date, end_date=end_date, top_k=top_k, min_share=min_share, max_depth=max_depth,
+    )
 
 
 @router.get("/product", response_model=ResponseModel)
-async def get_product_data(db: AsyncSession = Depends(get_db)):
+async def get_product_data(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+):
     """
     获取商品数据
-    包含：品牌TOP10、品类词云、价格敏感度散点图
+    包含：品牌TOP10、品类TOP10、品类词云、价格敏感度散点图
+    指定日期范围时品牌、品类TOP10 由范围内每天的热门项草图合并得出（sales 为上界，errors 为误差上限），
+    品类词云和价格敏感度仍为全部日期
     """
-    try:
-        brand_top10 = await data_crud.get_brand_top10(db)
-        category_wordcloud = await data_crud.get_category_wordcloud(db)
-        price_sensitivity = await data_crud.get_price_sensitivity(db)
-        
-        return ResponseModel(
-            code=200,
-            message="success",
-            data={
-                "brandTop10": brand_top10,
-                "categoryWordCloud": category_wordcloud,
-                "priceSensitivity": price_sensitivity
-            }
-        )
-    except Exception as e:
-        return ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+    return await _serve(request, "product", start_date=start_date, end_date=end_date)
+
+
+@router.get("/price-sensitivity", response_model=ResponseModel)
+async def get_price_sensitivity_data(
+    request: Request,
+    mode: str = Query("hist2d", pattern="^(hist2d|hexbin|sample)$", description="hist2d / hexbin / sample"),
+    bins: int = Query(50, ge=5, le=200, description="分箱数（sample 模式为价格分层数）"),
+    log_price: bool = Query(False, description="价格轴是否使用对数分箱"),
+    n: int = Query(2000, ge=10, le=20000, description="sample 模式的抽样点数"),
+):
+    """
+    获取价格敏感度全表分布
+    流式扫描 ads_sku_price_sensitivity 全表，返回二维直方图、六边形分箱或保留离群点的分层抽样
+    """
+    return await _serve(request, "price-sensitivity", mode=mode, bins=bins, log_price=log_price, n=n)
+
+
+@router.get("/category-tree", response_model=ResponseModel)
+async def get_category_tree_data(
+    request: Request,
+    root: Optional[str] = Query(None, description="起始品类路径，如 electronics.audio；默认为全部一级品类"),
+    depth: int = Query(2, ge=1, le=10, description="向下展开的层数"),
+    top_n: int = Query(20, ge=1, le=500, description="每个节点最多展示的子品类数，其余合并为\"其他\""),
+):
+    """
+    获取品类层级（旭日图下钻）
+    由按数据集版本构建的品类树得出，每个节点的销售额、销售笔数均已逐级汇总
+    """
+    return await _serve(request, "category-tree", root=root, depth=depth, top_n=top_n)
+
+
+@router.get("/category-wordcloud", response_model=ResponseModel)
+async def get_category_wordcloud_data(
+    request: Request,
+    root: Optional[str] = Query(None, description="只统计该品类路径下的子品类"),
+    depth: Optional[int] = Query(None, ge=1, le=10, description="统计 root 以下第几层的汇总数值，默认按表中各路径"),
+    top_n: int = Query(32, ge=1, le=500, description="词数"),
+):
+    """
+    获取品类词云
+    由品类树得出，可按层级汇总
+    """
+    return await _serve(request, "category-wordcloud", root=root, depth=depth, top_n=top_n)
 
 
 @router.get("/user-insight", response_model=ResponseModel)
-async def get_user_insight_data(db: AsyncSession = Depends(get_db)):
+async def get_user_insight_data(
+    request: Request,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+):
     """
     获取用户洞察数据
-    包含：用户分层环形图
+    包含：用户分层环形图、范围内精确去重用户数与漏斗交集、第1/3/7日留存、新用户同期群
+    指定日期范围时用户分层统计最近一次购买落在范围内的用户，其余面板只统计范围内的日期
     """
-    try:
-        user_segmentation = await data_crud.get_user_segmentation(db)
-        
-        return ResponseModel(
-            code=200,
-            message="success",
-            data={"userSegmentation": user_segmentation}
-        )
-    except Exception as e:
-        return ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+    return await _serve(request, "user-insight", start_date=start_date, end_date=end_date)
 
 
 @router.get("/prediction", response_model=ResponseModel)
-async def get_prediction_data(db: AsyncSession = Depends(get_db)):
+async def get_prediction_data(request: Request):
     """
-    获取预测数据（暂用模拟数据）
-    包含：历史数据、预测数据、置信区间
+    获取 PV 预测数据
+    在日 PV 序列上回测季节朴素、Holt-Winters、周季节回归三个模型，取回测误差最小的模型预测未来 FORECAST_HORIZON 天
+    包含：最近 FORECAST_HISTORY_DAYS 天历史 PV、预测 PV、95% 预测区间、选中的模型名
     """
+    return await _serve(request, "prediction")
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式 ndjson / csv"),
+    columns: Optional[str] = Query(None, description="逗号分隔的列名，默认全部列"),
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD（仅限有 dt 列的表）"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD（仅限有 dt 列的表）"),
+):
+    """
+    流式导出 ads_* 表全量数据
+    只允许导出数据仓库表模型；通过服务端游标逐块读取并发送，内存占用与表大小无关
+    """
+    # 读 MySQL 时按实际存在的列构建查询（模型新增、尚未补建的可空列导出为 NULL）；副本按模型建表，列总是齐全
+    available = None
+    if table in export_crud.EXPORT_MODELS and replica_store.active() is None:
+        try:
+            available = await export_crud.source_columns(table)
+        except Exception as e:
+            print(f"export columns error: {e}")
     try:
-        prediction = await data_crud.get_prediction_data(db)
-        
-        return ResponseModel(code=200, message="success", data=prediction)
-    except Exception as e:
-        return ResponseModel(code=500, message=f"获取数据失败: {str(e)}", data=None)
+        query = export_crud.build_export_query(table, columns, start_date, end_date, available)
+    except KeyError:
+        tables = ", ".join(sorted(export_crud.EXPORT_MODELS))
+        return EnvelopeResponse(
+            content=ResponseModel(code=404, message=f"不支持导出的表: {table}，可选: {tables}"),
+            status_code=404,
+        )
+    except ValueError as e:
+        return EnvelopeResponse(content=ResponseModel(code=400, message=str(e)), status_code=400)
+
+    return StreamingResponse(
+        export_crud.stream_export(query, format, read_session),
+        media_type=export_crud.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
+
+
+async def _event_stream(request: Request, page: str, params: dict):
+    """SSE 消息流：推送订阅主题的数据，空闲时定期发送注释行保活并检测断开"""
+    key, queue = await live_hub.subscribe(page, params, request.headers.get("last-event-id"))
+    try:
+        while True:
+            try:
+                version, body = await asyncio.wait_for(queue.get(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield b": ping\n\n"
+                continue
+            yield encode_event(version, body)
+    finally:
+        live_hub.unsubscribe(key, queue)
+
+
+@router.get("/stream/{page}")
+async def stream_page(
+    request: Request,
+    page: str,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    resolution: Optional[str] = Query(None, pattern="^(auto|day|week|month)$", description="趋势图粒度（仅看板）"),
+    points: Optional[int] = Query(None, ge=10, le=1000, description="趋势图最大点数（仅看板）"),
+):
+    """
+    订阅页面数据（Server-Sent Events）
+    连接后立即推送一次当前数据，之后只在 ADS 数据集版本变化且内容改变时推送；
+    同一页面和参数的所有订阅共享一次组装结果。消息 id 为数据集版本，断线重连时浏览器自动带上 Last-Event-ID，
+    版本未变时不重复推送
+    """
+    if page not in STREAM_PAGES:
+        return EnvelopeResponse(
+            content=ResponseModel(code=404, message=f"不支持订阅的页面: {page}，可选: {', '.join(STREAM_PAGES)}"),
+            status_code=404,
+        )
+    accepted = inspect.signature(panels.PAGES[page]).parameters
+    candidates = {"start_date": start_date, "end_date": end_date, "resolution": resolution, "points": points}
+    params = {name: value for name, value in candidates.items() if value is not None and name in accepted}
+
+    return StreamingResponse(
+        _event_stream(request, page, params),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache-stats", response_model=ResponseModel)
+async def get_cache_stats():
+    """
+    获取查询缓存统计
+    包含：条目数、占用字节、命中/未命中/旧值命中次数、淘汰次数，以及响应快照、本地副本、推送订阅和用户位图索引状态
+    """
+    data = result_cache.stats()
+    data["snapshot"] = snapshot_store.stats()
+    data["replica"] = replica_store.stats()
+    data["live"] = live_hub.stats()
+    data["bitmapIndex"] = bitmap_index.stats()
+    return ResponseModel(code=200, message="success", data=data)
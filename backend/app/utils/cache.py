@@ -0,0 +1,323 @@
+"""
+查询结果缓存模块
+ADS 表只在 Hive 批次导出后变化，CRUD 读取结果可按数据集版本缓存：
+- 缓存键 = 函数名 + 规范化后的日期参数 + 数据集版本
+- TTL 过期后在宽限期内先返回旧值，同时后台刷新（stale-while-revalidate）
+- 按估算字节数做 LRU 淘汰
+- 同一个键的并发未命中只查询一次
+"""
+import asyncio
+import copy
+import functools
+import inspect
+import sys
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+from ..config.settings import settings
+from ..crud.replica import read_session
+from ..crud.version import dataset_version, get_dataset_version
+
+
+class _LoadCancelled(Exception):
+    """在途加载的发起者被取消，等待者需要自行重新加载"""
+
+
+@dataclass
+class _Entry:
+    """缓存条目"""
+    value: Any
+    size: int
+    fresh_until: float
+    stale_until: float
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算对象占用的字节数（用于LRU容量控制）"""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    进程内结果缓存
+    :param max_bytes: 缓存总容量（估算字节数）
+    :param ttl: 默认新鲜期（秒），None 表示仅随数据集版本失效
+    :param stale_ttl: 过期后允许返回旧值的宽限期（秒）
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float], stale_ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # 后台刷新任务的强引用，事件循环只持有弱引用，未保存的任务可能在完成前被回收
+        self._tasks: Set[asyncio.Task] = set()
+        self._bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fallbacks = 0
+
+    def stats(self) -> dict:
+        """返回命中/未命中等统计信息"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self.hits,
+            "staleHits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fallbacks": self.fallbacks,
+            "hitRate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0,
+        }
+
+    def clear(self, keep: Optional[Callable[[Hashable], bool]] = None) -> None:
+        """清空缓存；传入 keep 时只保留 keep(key) 为真的条目"""
+        for key in list(self._entries):
+            if keep is None or not keep(key):
+                self._bytes -= self._entries.pop(key).size
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        fresh_until = now + ttl if ttl is not None else float("inf")
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = _Entry(value, size, fresh_until, fresh_until + self.stale_ttl)
+        self._bytes += size
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> Any:
+        """
+        执行加载并写入缓存；同一键只允许一个加载在途
+        在途加载的发起者被取消时，等待者各自重新加载（第一个恢复的成为新的发起者），不受其取消影响
+        """
+        future = self._inflight.get(key)
+        while future is not None:
+            try:
+                return await asyncio.shield(future)
+            except _LoadCancelled:
+                future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            # 发起者被取消（如面板超时、客户端断开）时，不把取消传染给其他等待者，由它们重新加载
+            future.set_exception(_LoadCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        else:
+            self._store(key, value, ttl)
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _revalidate(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float]) -> None:
+        try:
+            await self._load(key, loader, ttl)
+        except Exception as e:
+            print(f"cache revalidate error {key!r}: {e}")
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        background_loader: Optional[Callable[[], Awaitable[Any]]] = None,
+        ttl: Optional[float] = ...,
+    ) -> Any:
+        """
+        读取缓存，未命中时调用 loader 加载
+        :param background_loader: 旧值宽限期内后台刷新使用的加载函数（需自带数据库会话）
+        :param ttl: 本次写入的新鲜期，默认使用缓存的 ttl
+        """
+        if ttl is ...:
+            ttl = self.ttl
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry.fresh_until:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if now < entry.stale_until and background_loader is not None:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    task = asyncio.create_task(self._revalidate(key, background_loader, ttl))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+                return entry.value
+
+        self.misses += 1
+        return await self._load(key, loader, ttl)
+
+
+result_cache = ResultCache(
+    max_bytes=settings.CACHE_MAX_BYTES,
+    ttl=settings.CACHE_TTL_SECONDS,
+    stale_ttl=settings.CACHE_STALE_SECONDS,
+)
+
+
+def normalize_date(value: Any) -> Optional[str]:
+    """把日期参数规范化为 YYYY-MM-DD，无法解析时原样返回（去除空白）"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        return value
+
+
+def normalize_range(start_date: Any, end_date: Any) -> Tuple[Optional[str], Optional[str]]:
+    """规范化日期范围；只传一端时与不传等价（与CRUD的过滤逻辑一致）"""
+    start = normalize_date(start_date)
+    end = normalize_date(end_date)
+    if not start or not end:
+        return None, None
+    return start, end
+
+
+def normalize_arguments(arguments: Dict[str, Any]) -> None:
+    """就地规范化参数字典中的 start_date/end_date"""
+    if "start_date" not in arguments and "end_date" not in arguments:
+        return
+    arguments["start_date"], arguments["end_date"] = normalize_range(
+        arguments.get("start_date"), arguments.get("end_date")
+    )
+
+
+class FallbackTracker:
+    """
+    统计一段调用内回退为默认值的查询次数
+    在 with 块内调用的 cached_query 函数（包括块内创建的子任务，如并发面板）回退时计数，
+    与同时进行的其他请求互不影响。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._token = None
+
+    def __enter__(self) -> "FallbackTracker":
+        self._token = _fallback_tracker.set(self)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        _fallback_tracker.reset(self._token)
+
+
+_fallback_tracker: ContextVar[Optional[FallbackTracker]] = ContextVar("fallback_tracker", default=None)
+
+
+class _FallbackResult(Exception):
+    """查询失败时携带默认值，跳过写入缓存"""
+
+    def __init__(self, value: Any):
+        super().__init__("fallback")
+        self.value = value
+
+
+def cached_query(
+    name: Optional[str] = None,
+    fallback: Optional[Callable[[], Any]] = None,
+    ttl: Optional[float] = ...,
+):
+    """
+    CRUD 读取函数的缓存装饰器
+    被装饰函数的第一个参数必须是 db: AsyncSession，其余参数需可哈希。
+    :param name: 缓存键中的函数名，默认使用函数名
+    :param fallback: 查询异常时返回的默认值工厂；异常结果不会被缓存
+    :param ttl: 新鲜期（秒），None 表示仅随数据集版本失效
+
+    注意：缓存命中时返回的是共享对象，调用方不得修改。
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        key_name = name or func.__name__
+        signature = inspect.signature(func)
+
+        async def _call(db, arguments: Dict[str, Any]) -> Any:
+            try:
+                return await func(db, **arguments)
+            except Exception as e:
+                if fallback is None:
+                    raise
+                print(f"{func.__name__} error: {e}")
+                raise _FallbackResult(fallback())
+
+        @functools.wraps(func)
+        async def wrapper(db, *args, **kwargs):
+            bound = signature.bind(db, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            arguments.pop(next(iter(signature.parameters)))
+            normalize_arguments(arguments)
+
+            version = await get_dataset_version()
+            key: Tuple = (key_name, version) + tuple(sorted(arguments.items()))
+
+            async def background_loader():
+                async with read_session() as session:
+                    return await _call(session, arguments)
+
+            try:
+                return await result_cache.get_or_load(
+                    key,
+                    lambda: _call(db, arguments),
+                    background_loader,
+                    ttl,
+                )
+            except _FallbackResult as result:
+                result_cache.fallbacks += 1
+                tracker = _fallback_tracker.get()
+                if tracker is not None:
+                    tracker.count += 1
+                return copy.deepcopy(result.value)
+
+        wrapper.fallback = fallback
+        return wrapper
+
+    return decorator
+
+
+async def _drop_outdated(version: str) -> None:
+    """数据集版本变化后清除旧版本的缓存条目"""
+    result_cache.clear(keep=lambda key: isinstance(key, tuple) and len(key) > 1 and key[1] == version)
+
+
+dataset_version.add_listener(_drop_outdated)
@@ -0,0 +1,30 @@
+"""
+分页游标编码
+键集（seek）分页的游标保存上一页最后一行的排序键和已返回行数，
+编码为 URL 安全的 base64 字符串，前端只需原样传回，不需要理解其内容。
+"""
+import base64
+from typing import Any, Tuple
+
+import orjson
+
+
+def encode_cursor(kind: str, *values: Any) -> str:
+    """把游标类型和排序键编码为不透明字符串"""
+    raw = orjson.dumps([kind, *values])
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(kind: str, token: str) -> Tuple:
+    """
+    解码游标并校验类型
+    :raises ValueError: 游标格式错误或不属于该类型的分页
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if not isinstance(payload, list) or not payload or payload[0] != kind:
+        raise ValueError("invalid cursor")
+    return tuple(payload[1:])
@@ -0,0 +1,47 @@
+"""
+时间序列降采样
+Largest-Triangle-Three-Buckets（LTTB）：把序列分成若干桶，每个桶选出
+与前一个选中点、后一个桶均值构成三角形面积最大的点。
+相比等间隔抽取或按桶取平均，LTTB 能保留峰值和拐点，折线形状基本不变。
+"""
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    计算 LTTB 降采样后保留的下标（升序，始终包含首尾两点）
+    :param x: 横坐标（单调递增，如日期序号）
+    :param y: 纵坐标
+    :param threshold: 目标点数；不小于序列长度或小于3时不降采样
+    """
+    length = len(y)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 首尾两点单独保留，中间 length-2 个点均分为 threshold-2 个桶
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的均值点（最后一个桶取末点）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = length - 1, length
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        # 三角形面积的2倍（省略常数因子不影响取最大值）
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
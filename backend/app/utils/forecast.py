@@ -0,0 +1,276 @@
+"""
+时间序列预测
+三个向量化 NumPy 模型，都按 season（日数据取 7，即周季节性）建模：
+- seasonal_naive：季节朴素，预测值为上一季同一位置的观测值
+- holt_winters：加性 Holt-Winters；平滑参数在网格上选择，网格中所有参数组合
+  作为一个向量同时递推，一次遍历序列得到全部组合的一步预测误差
+- seasonal_regression：截距 + 线性趋势 + 周内位置哑变量的最小二乘回归
+预测区间为 均值 ± z·标准差，标准差由样本内残差和各模型的多步方差系数得到。
+select_model 用滚动起点回测（rolling-origin backtest）选择误差最小的模型。
+每个模型都有 *_batch 版本，对 (序列数, 长度) 的矩阵一次拟合全部序列，供批量 SKU 预测使用；
+单条序列的版本即序列数为 1 的批量版本。
+"""
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 95% 预测区间
+INTERVAL_Z = 1.96
+
+# Holt-Winters 平滑参数网格（水平、趋势、季节）
+HW_ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7, 0.9])
+HW_BETAS = np.array([0.0, 0.01, 0.05, 0.1, 0.2])
+HW_GAMMAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5])
+
+
+class Forecast:
+    """预测结果：各步的均值和标准差"""
+
+    def __init__(self, model: str, mean: np.ndarray, std: np.ndarray):
+        self.model = model
+        self.mean = mean
+        self.std = std
+
+    def interval(self, z: float = INTERVAL_Z):
+        """(下界, 上界)"""
+        return self.mean - z * self.std, self.mean + z * self.std
+
+
+def _rows(values: np.ndarray) -> np.ndarray:
+    """转为 (序列数, 长度) 的浮点矩阵"""
+    matrix = np.asarray(values, dtype=np.float64)
+    return matrix[None, :] if matrix.ndim == 1 else matrix
+
+
+def _row_sigma(residuals: np.ndarray, dof: int) -> np.ndarray:
+    """每条序列的残差标准差；没有残差时为 0"""
+    if not residuals.shape[1]:
+        return np.zeros(len(residuals))
+    return np.sqrt(np.sum(residuals ** 2, axis=1) / max(dof, 1))
+
+
+def seasonal_naive_batch(y: np.ndarray, horizon: int, season: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    季节朴素预测（多条序列），返回 (均值, 标准差)，形状均为 (序列数, horizon)
+    序列短于一季时退化为朴素预测（重复最后一个值）
+    """
+    y = _rows(y)
+    length = y.shape[1]
+    if not length:
+        raise ValueError("empty series")
+    m = season if length >= season else 1
+    steps = np.arange(horizon)
+    mean = y[:, length - m + steps % m]
+    residuals = y[:, m:] - y[:, :-m]
+    # 第 h 步的方差为 σ²·(⌊(h-1)/m⌋+1)
+    std = _row_sigma(residuals, residuals.shape[1])[:, None] * np.sqrt(steps // m + 1)
+    return mean, std
+
+
+def holt_winters_batch(
+    y: np.ndarray, horizon: int, season: int = 7,
+    alphas: np.ndarray = HW_ALPHAS, betas: np.ndarray = HW_BETAS, gammas: np.ndarray = HW_GAMMAS,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    加性 Holt-Winters（多条序列），返回 (均值, 标准差)
+    每条序列 × 每组平滑参数作为 (序列数, 参数组数) 的矩阵同时递推，
+    每条序列取一步预测误差平方和最小的参数组合。
+    初值：首季均值为水平，前两季均值之差为趋势，首季去均值为季节分量
+    :raises ValueError: 序列短于两季
+    """
+    y = _rows(y)
+    count, length = y.shape
+    m = season
+    if length < 2 * m:
+        raise ValueError("holt_winters needs at least two seasons")
+    a, b, g = (grid.ravel() for grid in np.meshgrid(alphas, betas, gammas, indexing="ij"))
+    first = y[:, :m].mean(axis=1, keepdims=True)
+    level = np.repeat(first, len(a), axis=1)
+    trend = np.repeat((y[:, m:2 * m].mean(axis=1, keepdims=True) - first) / m, len(a), axis=1)
+    seasonal = np.repeat((y[:, :m] - first)[:, None, :], len(a), axis=1)
+    sse = np.zeros((count, len(a)))
+    for t in range(m, length):
+        position = t % m
+        observed = y[:, t:t + 1]
+        s = seasonal[:, :, position]
+        error = observed - (level + trend + s)
+        sse += error ** 2
+        new_level = a * (observed - s) + (1 - a) * (level + trend)
+        trend = b * (new_level - level) + (1 - b) * trend
+        seasonal[:, :, position] = g * (observed - new_level) + (1 - g) * s
+        level = new_level
+
+    rows = np.arange(count)
+    best = np.argmin(sse, axis=1)
+    alpha, beta, gamma = a[best][:, None], b[best][:, None], g[best][:, None]
+    steps = np.arange(1, horizon + 1)
+    mean = (
+        level[rows, best][:, None]
+        + steps * trend[rows, best][:, None]
+        + seasonal[rows, best][:, (length + steps - 1) % m]
+    )
+    # 加性模型 h 步方差：σ²·(1 + Σ_{j<h} c_j²)，c_j = α(1+jβ) + γ(1-α)·[j mod m = 0]
+    j = np.arange(1, horizon)
+    c = alpha * (1 + j * beta) + gamma * (1 - alpha) * (j % m == 0)
+    factor = np.concatenate((np.ones((count, 1)), 1 + np.cumsum(c ** 2, axis=1)), axis=1)
+    sigma = np.sqrt(sse[rows, best] / max(length - m, 1))
+    return mean, sigma[:, None] * np.sqrt(factor)
+
+
+def _design(t: np.ndarray, season: int) -> np.ndarray:
+    """回归设计矩阵：截距、线性趋势、周内位置哑变量（第 0 位为基准）"""
+    columns = [np.ones(len(t)), t.astype(np.float64)]
+    columns += [(t % season == k).astype(np.float64) for k in range(1, season)]
+    return np.column_stack(columns)
+
+
+def seasonal_regression_batch(y: np.ndarray, horizon: int, season: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    截距 + 线性趋势 + 周内位置哑变量的最小二乘回归（多条序列），返回 (均值, 标准差)
+    所有序列共用同一个设计矩阵，系数由一次矩阵乘法得到
+    :raises ValueError: 观测数不多于参数个数
+    """
+    y = _rows(y)
+    length = y.shape[1]
+    x = _design(np.arange(length), season)
+    if length <= x.shape[1]:
+        raise ValueError("seasonal_regression needs more observations than parameters")
+    pinv = np.linalg.pinv(x)
+    coef = y @ pinv.T
+    sigma = _row_sigma(y - coef @ x.T, length - x.shape[1])
+
+    future = _design(np.arange(length, length + horizon), season)
+    mean = coef @ future.T
+    # 预测方差含参数估计误差：σ²·(1 + x₀ (XᵀX)⁻¹ x₀ᵀ)
+    leverage = np.einsum("ij,jk,ik->i", future, pinv @ pinv.T, future)
+    return mean, sigma[:, None] * np.sqrt(1 + leverage)
+
+
+def seasonal_naive(y: np.ndarray, horizon: int, season: int = 7) -> Forecast:
+    """季节朴素预测（单条序列）"""
+    mean, std = seasonal_naive_batch(y, horizon, season)
+    return Forecast("seasonal_naive", mean[0], std[0])
+
+
+def holt_winters(y: np.ndarray, horizon: int, season: int = 7) -> Forecast:
+    """加性 Holt-Winters（单条序列），参数取网格上一步预测误差平方和最小的组合"""
+    mean, std = holt_winters_batch(y, horizon, season)
+    return Forecast("holt_winters", mean[0], std[0])
+
+
+def seasonal_regression(y: np.ndarray, horizon: int, season: int = 7) -> Forecast:
+    """周季节回归（单条序列）"""
+    mean, std = seasonal_regression_batch(y, horizon, season)
+    return Forecast("seasonal_regression", mean[0], std[0])
+
+
+MODELS: Dict[str, Callable[[np.ndarray, int, int], Forecast]] = {
+    "seasonal_naive": seasonal_naive,
+    "holt_winters": holt_winters,
+    "seasonal_regression": seasonal_regression,
+}
+
+
+BATCH_MODELS: Dict[str, Callable[..., Tuple[np.ndarray, np.ndarray]]] = {
+    "seasonal_naive": seasonal_naive_batch,
+    "holt_winters": holt_winters_batch,
+    "seasonal_regression": seasonal_regression_batch,
+}
+
+
+def smape(actual: np.ndarray, predicted: np.ndarray) -> float:
+    """对称平均绝对百分比误差（0-2）"""
+    denominator = np.abs(actual) + np.abs(predicted)
+    ratio = np.divide(2 * np.abs(actual - predicted), denominator, out=np.zeros(len(actual)), where=denominator > 0)
+    return float(ratio.mean())
+
+
+def backtest(y: np.ndarray, model: str, horizon: int, folds: int, season: int = 7) -> Optional[dict]:
+    """
+    滚动起点回测：最后 folds 个起点各用之前的数据拟合，预测 horizon 步并与实际值比较
+    返回 sMAPE、MASE（以季节朴素的样本内误差为尺度）和平均拟合耗时；数据不足以做任何一折时返回 None
+    """
+    y = np.asarray(y, dtype=np.float64)
+    fit = MODELS[model]
+    errors: List[float] = []
+    scaled: List[float] = []
+    seconds = 0.0
+    for origin in range(len(y) - horizon - folds + 1, len(y) - horizon + 1):
+        if origin <= season:
+            continue
+        train, actual = y[:origin], y[origin:origin + horizon]
+        started = time.perf_counter()
+        try:
+            forecast = fit(train, horizon, season)
+        except ValueError:
+            continue
+        seconds += time.perf_counter() - started
+        errors.append(smape(actual, forecast.mean))
+        scale = np.abs(train[season:] - train[:-season]).mean()
+        if scale > 0:
+            scaled.append(float(np.abs(actual - forecast.mean).mean() / scale))
+    if not errors:
+        return None
+    return {
+        "smape": float(np.mean(errors)),
+        "mase": float(np.mean(scaled)) if scaled else None,
+        "folds": len(errors),
+        "fitSeconds": seconds / len(errors),
+    }
+
+
+def select_model(y: np.ndarray, horizon: int, folds: int, season: int = 7) -> str:
+    """回测 sMAPE 最小的模型；数据太短无法回测时使用季节朴素"""
+    scores = {}
+    for name in MODELS:
+        result = backtest(y, name, horizon, folds, season)
+        if result is not None:
+            scores[name] = result["smape"]
+    if not scores:
+        return "seasonal_naive"
+    return min(scores, key=scores.get)
+
+
+def forecast(y: np.ndarray, horizon: int, folds: int, season: int = 7) -> Forecast:
+    """选择模型并在全部数据上拟合；选中的模型拟合失败时退回季节朴素"""
+    name = select_model(y, horizon, folds, season)
+    try:
+        return MODELS[name](y, horizon, season)
+    except ValueError:
+        return seasonal_naive(y, horizon, season)
+
+
+def forecast_batch(y: np.ndarray, horizon: int, season: int = 7) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    多条序列逐条选模型并预测，返回 (模型名数组, 均值, 标准差)
+    每个模型在去掉最后 horizon 天的数据上拟合一次（全部序列同时），
+    按留出期的 sMAPE 为每条序列选择模型，再在全部数据上拟合；
+    数据不足以留出时全部使用季节朴素
+    """
+    y = _rows(y)
+    names = list(BATCH_MODELS)
+    train, actual = y[:, :-horizon], y[:, -horizon:]
+    errors = np.full((len(names), len(y)), np.inf)
+    if train.shape[1] > season:
+        for k, name in enumerate(names):
+            try:
+                predicted, _ = BATCH_MODELS[name](train, horizon, season)
+            except ValueError:
+                continue
+            denominator = np.abs(actual) + np.abs(predicted)
+            ratio = np.divide(
+                2 * np.abs(actual - predicted), denominator,
+                out=np.zeros(actual.shape), where=denominator > 0,
+            )
+            errors[k] = ratio.mean(axis=1)
+    # 所有模型都无法留出拟合时取季节朴素（第 0 个）
+    choice = np.where(np.isfinite(errors).any(axis=0), np.argmin(errors, axis=0), 0)
+
+    mean = np.empty((len(y), horizon))
+    std = np.empty((len(y), horizon))
+    for k, name in enumerate(names):
+        rows = np.flatnonzero(choice == k)
+        if len(rows):
+            mean[rows], std[rows] = BATCH_MODELS[name](y[rows], horizon, season)
+    return np.array(names, dtype=object)[choice], mean, std
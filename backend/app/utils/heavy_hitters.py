@@ -0,0 +1,109 @@
+"""
+Space-Saving 热门项草图（加权）
+一个草图最多保存 capacity 个 (键, 计数, 误差)，计数为真实值的上界、计数-误差为下界；
+草图已满时，不在草图中的键真实值不超过 floor（草图中的最小计数），未满时 floor 为 0。
+- 构建：每块数据先精确分组求和（exact），再与已有草图合并（merge）
+- 合并：两个草图的键取并集，某个草图中没有的键按该草图的 floor 计入计数和误差，再按计数保留前 capacity 个；
+  合并任意多个草图后误差上界为各草图总量之和 / capacity（Agarwal 等，Mergeable Summaries）
+- 存储：键（UTF-8，\\x00 分隔）和计数、误差（int64）经 zlib 压缩后 base64 编码为文本，
+  首字节为格式版本，随后 4 字节为 capacity（小端）
+"""
+import base64
+import struct
+import zlib
+from typing import Iterable
+
+import numpy as np
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<BI")
+_SEPARATOR = "\x00"
+
+
+class Summary:
+    """Space-Saving 草图：keys 为 str 数组，按计数降序、键升序排列"""
+
+    def __init__(self, keys: np.ndarray, counts: np.ndarray, errors: np.ndarray, capacity: int):
+        self.keys = keys
+        self.counts = counts
+        self.errors = errors
+        self.capacity = capacity
+
+    @property
+    def floor(self) -> int:
+        """不在草图中的键的真实值上界"""
+        return int(self.counts[-1]) if len(self.counts) and len(self.counts) >= self.capacity else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.keys.nbytes + self.counts.nbytes + self.errors.nbytes
+
+    def top(self, k: int):
+        """前 k 个 (键, 计数, 误差)"""
+        return list(zip(self.keys[:k].tolist(), self.counts[:k].tolist(), self.errors[:k].tolist()))
+
+
+def _truncate(keys: np.ndarray, counts: np.ndarray, errors: np.ndarray, capacity: int) -> Summary:
+    """按计数降序、键升序保留前 capacity 个"""
+    order = np.lexsort((keys, -counts))[:capacity]
+    return Summary(keys[order], counts[order], errors[order], capacity)
+
+
+def empty(capacity: int) -> Summary:
+    return Summary(np.array([], dtype=str), np.array([], dtype=np.int64), np.array([], dtype=np.int64), capacity)
+
+
+def exact(keys: Iterable, counts: Iterable, capacity: int) -> Summary:
+    """由精确计数（键不重复）构建草图：超出 capacity 的部分截去，floor 即为保留的最小计数"""
+    keys = np.asarray(keys).astype(str)
+    counts = np.asarray(counts, dtype=np.int64)
+    return _truncate(keys, counts, np.zeros(len(counts), dtype=np.int64), capacity)
+
+
+def merge(summaries: Iterable[Summary], capacity: int) -> Summary:
+    """合并多个草图，结果最多保留 capacity 个键"""
+    summaries = [summary for summary in summaries if len(summary.keys)]
+    if not summaries:
+        return empty(capacity)
+    floors = np.array([summary.floor for summary in summaries], dtype=np.int64)
+    keys, inverse = np.unique(np.concatenate([summary.keys for summary in summaries]), return_inverse=True)
+    inverse = inverse.ravel()
+    # 先按"所有草图都没有该键"计入全部 floor，再把出现的草图从 floor 替换为实际计数和误差
+    owner_floor = np.repeat(floors, [len(summary.keys) for summary in summaries])
+    counts = np.full(len(keys), floors.sum(), dtype=np.int64)
+    errors = counts.copy()
+    np.add.at(counts, inverse, np.concatenate([summary.counts for summary in summaries]) - owner_floor)
+    np.add.at(errors, inverse, np.concatenate([summary.errors for summary in summaries]) - owner_floor)
+    return _truncate(keys, counts, errors, capacity)
+
+
+def encode(summary: Summary) -> str:
+    """草图序列化为文本"""
+    names = _SEPARATOR.join(summary.keys.tolist()).encode("utf-8")
+    body = (
+        struct.pack("<II", len(summary.keys), len(names)) + names
+        + summary.counts.astype("<i8").tobytes() + summary.errors.astype("<i8").tobytes()
+    )
+    return base64.b64encode(_HEADER.pack(FORMAT_VERSION, summary.capacity) + zlib.compress(body, 6)).decode()
+
+
+def decode(text: str) -> Summary:
+    """
+    文本反序列化为草图
+    :raises ValueError: 格式版本或长度不正确
+    """
+    try:
+        payload = base64.b64decode(text.encode(), validate=True)
+        version, capacity = _HEADER.unpack_from(payload)
+        body = zlib.decompress(payload[_HEADER.size:])
+        size, length = struct.unpack_from("<II", body)
+        names = body[8:8 + length].decode("utf-8")
+    except (ValueError, struct.error, zlib.error) as e:
+        raise ValueError(f"invalid summary: {e}")
+    numbers = np.frombuffer(body[8 + length:], dtype="<i8")
+    if version != FORMAT_VERSION or len(numbers) != 2 * size:
+        raise ValueError("invalid summary")
+    keys = np.array(names.split(_SEPARATOR) if size else [], dtype=str)
+    if len(keys) != size:
+        raise ValueError("invalid summary")
+    return Summary(keys, numbers[:size].astype(np.int64), numbers[size:].astype(np.int64), capacity)
@@ -0,0 +1,102 @@
+"""
+HyperLogLog 去重计数草图
+每天的访客集合保存为 2^precision 个寄存器（uint8）的草图，任意几天的去重访客数为
+这些草图逐寄存器取最大值后的估计值，与天数和访客数无关，相对标准误差约 1.04/sqrt(2^precision)
+（precision=14 时约 0.81%）。
+- ETL：对 user_id 做 64 位哈希，按分组（日期）一次 np.maximum.at 得到全部草图
+- 存储：寄存器经 zlib 压缩后 base64 编码为文本，首字节为格式版本、第二字节为精度
+- 查询：decode 得到寄存器数组，merge 后 estimate
+"""
+import base64
+import zlib
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+# 2^-k 查表（寄存器值最大为 64-MIN_PRECISION+1）
+_INVERSE_POWERS = np.ldexp(1.0, -np.arange(66))
+
+
+def hash64(values: np.ndarray) -> np.ndarray:
+    """整数数组的 64 位哈希（SplitMix64 终结函数），返回 uint64 数组"""
+    z = np.asarray(values).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """uint64 数组每个元素的有效位数（0 的位数为 0）；高低 32 位分别转为浮点，frexp 的指数即为位数"""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1]).astype(np.int64)
+
+
+def group_registers(groups: np.ndarray, hashes: np.ndarray, group_count: int, precision: int) -> np.ndarray:
+    """
+    按分组构建草图，返回 (group_count, 2^precision) 的寄存器矩阵
+    :param groups: 每个哈希所属的分组下标（0 到 group_count-1）
+    :param hashes: hash64 的结果
+    """
+    if not MIN_PRECISION <= precision <= MAX_PRECISION:
+        raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+    width = 64 - precision
+    # 高 precision 位选寄存器，其余位中最高的 1 所在位置（从 1 开始，全 0 时为 width+1）为寄存器候选值
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    rest = hashes & np.uint64((1 << width) - 1)
+    rank = (width + 1 - _bit_length(rest)).astype(np.uint8)
+
+    size = 1 << precision
+    registers = np.zeros(group_count * size, dtype=np.uint8)
+    np.maximum.at(registers, np.asarray(groups, dtype=np.int64) * size + index, rank)
+    return registers.reshape(group_count, size)
+
+
+def registers_of(values: np.ndarray, precision: int) -> np.ndarray:
+    """一组整数的草图寄存器"""
+    hashes = hash64(values)
+    return group_registers(np.zeros(len(hashes), dtype=np.int64), hashes, 1, precision)[0]
+
+
+def merge(registers: np.ndarray) -> np.ndarray:
+    """多个草图（按行）合并为一个：逐寄存器取最大值"""
+    return registers.max(axis=0)
+
+
+def estimate(registers: np.ndarray) -> np.ndarray:
+    """
+    去重计数估计；registers 最后一维为寄存器，可一次估计多个草图
+    估计值不超过 2.5m 且有空寄存器时使用线性计数（小基数修正）；64 位哈希不需要大基数修正
+    """
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / _INVERSE_POWERS[registers].sum(axis=-1)
+    zeros = (registers == 0).sum(axis=-1)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+def encode(registers: np.ndarray) -> str:
+    """草图序列化为文本"""
+    precision = int(len(registers)).bit_length() - 1
+    payload = bytes((FORMAT_VERSION, precision)) + zlib.compress(registers.astype(np.uint8).tobytes(), 6)
+    return base64.b64encode(payload).decode()
+
+
+def decode(text: str) -> np.ndarray:
+    """
+    文本反序列化为寄存器数组
+    :raises ValueError: 格式版本、精度或长度不正确
+    """
+    try:
+        payload = base64.b64decode(text.encode(), validate=True)
+        version, precision = payload[0], payload[1]
+        raw = zlib.decompress(payload[2:])
+    except (ValueError, IndexError, zlib.error) as e:
+        raise ValueError(f"invalid sketch: {e}")
+    if version != FORMAT_VERSION or not MIN_PRECISION <= precision <= MAX_PRECISION or len(raw) != 1 << precision:
+        raise ValueError("invalid sketch")
+    return np.frombuffer(raw, dtype=np.uint8)
@@ -0,0 +1,41 @@
+"""
+HTTP 条件请求工具
+ADS 数据只在数据集版本变化时改变，接口响应的强 ETag 由
+数据集版本 + 请求路径 + 查询参数计算得到，不依赖响应内容，
+因此 If-None-Match 命中时无需查询数据库或序列化即可返回 304。
+"""
+import hashlib
+
+from fastapi import Request
+
+from ..config.settings import settings
+
+
+def make_etag(version: str, request: Request) -> str:
+    """根据数据集版本和请求参数生成强 ETag"""
+    params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{version}|{request.url.path}|{params}".encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """判断请求的 If-None-Match 是否命中（按 RFC 7232 使用弱比较）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+
+def cache_headers(etag: str) -> dict:
+    """可缓存响应的头部：ETag + Cache-Control"""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}, must-revalidate",
+    }
+
+
+# 出错或部分失败的响应不允许缓存
+NO_STORE_HEADERS = {"Cache-Control": "no-store"}
@@ -0,0 +1,56 @@
+"""
+响应序列化工具
+使用 orjson 把统一响应 {code, message, data} 直接序列化为 JSON 字节，
+不经过 jsonable_encoder 逐层遍历，也不对 data 做 Pydantic 校验。
+输出与 FastAPI 默认的 JSONResponse 字节一致（紧凑分隔符、UTF-8 原样输出中文），
+Decimal 转为 float，date/datetime 输出 ISO 格式。
+供实时响应和预生成快照共用。
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import Response
+
+from ..schemas.response import ResponseModel
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    """orjson 不支持的类型转换"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化任意 JSON 兼容对象"""
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def render_envelope(code: int = 200, message: str = "success", data: Any = None) -> bytes:
+    """直接把 CRUD 输出包装为统一响应并序列化"""
+    return dumps({"code": code, "message": message, "data": data})
+
+
+def render_response(result: ResponseModel) -> bytes:
+    """把统一响应序列化为 JSON 字节"""
+    return render_envelope(result.code, result.message, result.data)
+
+
+class EnvelopeResponse(Response):
+    """
+    统一响应格式的快速 JSON 响应类
+    content 可以是已序列化的字节（快照）、ResponseModel 或任意 JSON 兼容对象
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        if isinstance(content, ResponseModel):
+            return render_response(content)
+        return dumps(content)
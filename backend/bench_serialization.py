@@ -0,0 +1,128 @@
+"""
+响应序列化基准测试
+对比每个数据接口在两种序列化路径下的耗时：
+- before: ResponseModel 校验 + jsonable_encoder + json.dumps（FastAPI 默认路径）
+- after:  utils.serialization.render_envelope（orjson 直接序列化 CRUD 输出）
+同时校验两种路径输出的字节是否一致。
+
+用法：python bench_serialization.py [--days 31] [--points 5000] [--repeat 200]
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.schemas.response import ResponseModel
+from app.utils.serialization import render_envelope
+
+
+def build_payloads(days: int, points: int) -> dict:
+    """按各接口的真实结构生成模拟数据"""
+    rng = random.Random(42)
+    first = date(2019, 10, 1)
+    dates = [str(first + timedelta(days=i)) for i in range(days)]
+    return {
+        "dashboard": {
+            "metrics": {"gmv": 123456789.12, "pv": 98765432, "uv": 1234567},
+            "activityHeatmap": [[h, w, rng.randint(0, 100000)] for h in range(24) for w in range(7)],
+            "categorySales": [
+                {"name": f"electronics.category_{i}", "value": round(rng.uniform(1e3, 1e7), 2)} for i in range(20)
+            ],
+            "pvuvTrend": {
+                "xAxis": dates,
+                "series": [
+                    {"name": "PV (浏览量)", "data": [rng.randint(1e5, 1e6) for _ in dates]},
+                    {"name": "UV (访客数)", "data": [rng.randint(1e4, 1e5) for _ in dates]},
+                ],
+            },
+            "failedPanels": [],
+        },
+        "conversion": {
+            "funnel": [{"name": n, "value": rng.randint(1e4, 1e6)} for n in ("浏览", "加购", "购买")],
+            "sankey": {
+                "nodes": [{"name": f"节点{i}"} for i in range(50)],
+                "links": [
+                    {"source": f"节点{i}", "target": f"节点{j}", "value": rng.randint(1, 1e5)}
+                    for i in range(50) for j in range(i + 1, min(i + 6, 50))
+                ],
+            },
+            "failedPanels": [],
+        },
+        "product": {
+            "brandTop10": {
+                "brands": [f"brand_{i}" for i in range(10)],
+                "sales": [round(rng.uniform(1e5, 1e7), 2) for _ in range(10)],
+            },
+            "categoryWordCloud": [{"name": f"词{i}", "value": rng.randint(1, 1e5)} for i in range(32)],
+            "priceSensitivity": [[round(rng.lognormvariate(4, 1), 2), rng.randint(1, 10000)] for _ in range(points)],
+            "failedPanels": [],
+        },
+        "user-insight": {
+            "userSegmentation": [{"name": f"分层{i}", "value": rng.randint(1e3, 1e6)} for i in range(5)],
+            "failedPanels": [],
+        },
+        "prediction": {
+            "historical": {"dates": dates[-7:], "pv": [rng.randint(1e5, 1e6) for _ in range(7)]},
+            "forecast": {
+                "dates": dates[:7],
+                "pv": [rng.randint(1e5, 1e6) for _ in range(7)],
+                "confidenceInterval": {
+                    "upper": [rng.randint(1e5, 1e6) for _ in range(7)],
+                    "lower": [rng.randint(1e5, 1e6) for _ in range(7)],
+                },
+            },
+        },
+        # 未经 float 转换的原始类型（Decimal/date），验证原生支持。
+        # 默认路径会把 Any 中的 Decimal 输出为字符串，快速路径输出为数值，因此不比较字节
+        "raw-types": {
+            "rows": [{"dt": first + timedelta(days=i % days), "gmv": Decimal("1234.56") + i} for i in range(points)],
+        },
+    }
+
+
+def before(data) -> bytes:
+    """FastAPI 默认路径：response_model 校验 + jsonable_encoder + JSONResponse"""
+    model = ResponseModel(code=200, message="success", data=data)
+    return JSONResponse(content=jsonable_encoder(model)).body
+
+
+def after(data) -> bytes:
+    """orjson 快速路径"""
+    return render_envelope(200, "success", data)
+
+
+def bench(func, data, repeat: int) -> float:
+    """返回单次调用的平均耗时（微秒）"""
+    func(data)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(data)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="响应序列化基准测试")
+    parser.add_argument("--days", type=int, default=31, help="趋势序列天数")
+    parser.add_argument("--points", type=int, default=5000, help="散点数量")
+    parser.add_argument("--repeat", type=int, default=200, help="每个接口的重复次数")
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.days, args.points)
+    print(f"{'endpoint':<14}{'bytes':>10}{'before(us)':>14}{'after(us)':>12}{'speedup':>10}  identical")
+    for name, data in payloads.items():
+        old_body, new_body = before(data), after(data)
+        identical = "-" if name == "raw-types" else old_body == new_body
+        t_before = bench(before, data, args.repeat)
+        t_after = bench(after, data, args.repeat)
+        print(
+            f"{name:<14}{len(new_body):>10}{t_before:>14.1f}{t_after:>12.1f}"
+            f"{t_before / t_after:>9.1f}x  {identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
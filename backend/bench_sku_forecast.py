@@ -0,0 +1,79 @@
+"""
+批量 SKU 预测多进程扩展基准
+生成模拟的 SKU 日销量矩阵（泊松需求 × 周季节性，含大量零销量），按分片分发到 1、2、4…个进程，
+用 forecast_batch 拟合，输出各进程数下的吞吐量、加速比和并行效率。
+分片在子进程中按种子生成，测到的是拟合本身的扩展性，不含进程间传输数据的开销。
+
+用法：python bench_sku_forecast.py [--skus 40000] [--days 56] [--horizon 7] [--shard-size 2000] [--max-workers N]
+"""
+import os
+
+# 与 etl/sku_forecast.py 相同：每个进程只用一个 BLAS 线程
+for _name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_name, "1")
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.utils.forecast import forecast_batch
+
+
+def build_shard(seed: int, skus: int, days: int) -> np.ndarray:
+    """模拟一个分片的日销量：每个 SKU 的基础销量呈长尾分布，周末上浮"""
+    rng = np.random.default_rng(seed)
+    level = rng.lognormal(mean=0.5, sigma=1.2, size=(skus, 1))
+    weekly = 1 + 0.3 * (np.arange(days) % 7 >= 5)
+    return rng.poisson(level * weekly).astype(float)
+
+
+def fit_shard(task: tuple) -> int:
+    seed, skus, days, horizon = task
+    forecast_batch(build_shard(seed, skus, days), horizon)
+    return skus
+
+
+def measure(workers: int, tasks: list) -> float:
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        sum(pool.map(fit_shard, tasks))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量 SKU 预测多进程扩展基准")
+    parser.add_argument("--skus", type=int, default=40000, help="SKU 总数")
+    parser.add_argument("--days", type=int, default=56, help="每个 SKU 的历史天数")
+    parser.add_argument("--horizon", type=int, default=7, help="预测天数")
+    parser.add_argument("--shard-size", type=int, default=2000, help="每个分片的 SKU 数")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count(), help="最大进程数")
+    args = parser.parse_args()
+
+    tasks = [
+        (seed, min(args.shard_size, args.skus - start), args.days, args.horizon)
+        for seed, start in enumerate(range(0, args.skus, args.shard_size))
+    ]
+    counts = []
+    workers = 1
+    while workers < args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    counts.append(args.max_workers)
+
+    print(f"{args.skus} 个SKU × {args.days} 天，{len(tasks)} 个分片")
+    print(f"{'workers':>8}{'seconds':>10}{'SKU/s':>12}{'speedup':>10}{'efficiency':>12}")
+    baseline = None
+    for workers in counts:
+        seconds = measure(workers, tasks)
+        baseline = baseline or seconds
+        speedup = baseline / seconds
+        print(
+            f"{workers:>8}{seconds:>10.2f}{args.skus / seconds:>12,.0f}"
+            f"{speedup:>10.2f}{speedup / workers:>12.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
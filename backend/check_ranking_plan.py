@@ -0,0 +1,107 @@
+"""
+排行键集分页执行计划检查
+用 app/crud/ranking.py 生成的深页查询（带上一页游标）检查：
+- MySQL：EXPLAIN 的访问类型为 range，使用 (total_sales, 主键) 联合索引（需要能连接配置中的数据库，连接失败时跳过）
+- DuckDB 副本：排序值上界下推到 SEQ_SCAN 的过滤条件，深页耗时不高于第一页的 2 倍（DuckDB 没有范围索引扫描）
+
+用法：python check_ranking_plan.py [--rows 2000000]
+"""
+import argparse
+import sys
+import time
+from decimal import Decimal
+
+from sqlalchemy.dialects import mysql
+
+from app.crud.ranking import RANKINGS, build_page_query
+from app.crud.replica import _compile, _duck_type
+from app.models.data import BrandSalesStat, SkuPriceSensitivity
+
+# 排行 -> (表模型, 深页游标)
+DEEP_PAGES = {
+    "brand": (BrandSalesStat, (Decimal("5.00"), "brand-1234", 10000)),
+    "sku": (SkuPriceSensitivity, (Decimal("5.00"), "1234", 10000)),
+}
+INDEXES = {
+    "brand": "idx_brand_sales_stat_sales",
+    "sku": "idx_sku_price_sensitivity_sales",
+}
+
+
+def check_mysql() -> int:
+    """在配置的 MySQL 上 EXPLAIN 深页查询，返回失败数；无法连接时返回 0"""
+    from etl.loader import connect
+
+    try:
+        connection = connect(local_infile=False)
+    except Exception as e:
+        print(f"MySQL 跳过（无法连接: {e}）")
+        return 0
+    failed = 0
+    with connection.cursor() as cursor:
+        for ranking, (_, after) in DEEP_PAGES.items():
+            query = build_page_query(ranking, after, 21)
+            sql = str(query.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+            cursor.execute("EXPLAIN " + sql)
+            names = [column[0] for column in cursor.description]
+            plan = dict(zip(names, cursor.fetchone()))
+            ok = plan.get("type") == "range" and plan.get("key") == INDEXES[ranking]
+            print(f"MySQL {ranking}: type={plan.get('type')} key={plan.get('key')} rows={plan.get('rows')} {'OK' if ok else '失败'}")
+            failed += not ok
+    connection.close()
+    return failed
+
+
+def check_duckdb(rows: int) -> int:
+    """在内存 DuckDB 中按副本的建表方式造数据，检查过滤下推和深页耗时，返回失败数"""
+    try:
+        import duckdb
+    except ImportError:
+        print("DuckDB 跳过（未安装 duckdb）")
+        return 0
+    connection = duckdb.connect()
+    failed = 0
+    for ranking, (model, after) in DEEP_PAGES.items():
+        table = model.__table__
+        columns = ", ".join(f'"{c.name}" {_duck_type(c)}' for c in table.columns)
+        connection.execute(f'CREATE TABLE "{table.name}" ({columns})')
+        values = {
+            "brand_name": "'brand-' || i", "product_id": "i",
+            "total_sales": "(i % 100000) / 100.0", "avg_price": "(i % 997) / 10.0",
+        }
+        select_list = ", ".join(values[c.name] for c in table.columns)
+        connection.execute(f'INSERT INTO "{table.name}" SELECT {select_list} FROM range({rows}) t(i)')
+
+        deep = _compile(build_page_query(ranking, after, 21))
+        plan = "\n".join(row[1] for row in connection.execute("EXPLAIN " + deep).fetchall())
+        scan = plan[plan.index("SEQ_SCAN"):]
+        sort_column = RANKINGS[ranking][0].name
+        pushed = "Filters:" in scan and sort_column in scan.split("Filters:", 1)[1]
+
+        timings = []
+        for sql in (_compile(build_page_query(ranking, None, 21)), deep):
+            connection.execute(sql).fetchall()
+            started = time.perf_counter()
+            for _ in range(10):
+                connection.execute(sql).fetchall()
+            timings.append((time.perf_counter() - started) / 10 * 1000)
+        ok = pushed and timings[1] <= 2 * timings[0]
+        print(
+            f"DuckDB {ranking}: 上界下推={'是' if pushed else '否'} "
+            f"第一页 {timings[0]:.1f}ms 深页 {timings[1]:.1f}ms {'OK' if ok else '失败'}"
+        )
+        failed += not ok
+    connection.close()
+    return failed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000000, help="DuckDB 模拟表行数")
+    args = parser.parse_args()
+    failed = check_mysql() + check_duckdb(args.rows)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
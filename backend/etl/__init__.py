@@ -0,0 +1,4 @@
+"""
+数据仓库离线作业（命令行工具，不随 FastAPI 服务加载）
+在 backend 目录下以 python -m etl.<模块名> 运行
+"""
@@ -0,0 +1,616 @@
+"""
+从原始事件文件构建 ADS 表（单遍流式）
+读取 2019 年 10 月格式的原始事件 CSV（event_time, event_type, product_id, category_code, brand,
+price, user_id, user_session；多余的列如 category_id 忽略，支持 .gz 等 pandas 能自动识别的压缩），
+按 BUILD_CHUNK_ROWS 行一块，用 pandas/NumPy 对整块做分组聚合，一遍扫描同时得到全部 ADS 表，
+输出为 etl/loader.py 的输入目录布局（<output>/<表名>/000000_0，\\x01 分隔），再用 loader 原子换入。
+
+- 流量趋势 ads_traffic_trend_daily：GMV 为购买事件金额合计，PV 为浏览事件数，UV 为当日有任意事件的用户数，
+  uv_sketch 为当日访客的 HyperLogLog 草图（供跨天去重）
+- 活跃热力图 ads_activity_heatmap(_daily)：全部事件按 (小时, 星期) 计数，星期 0 为周日
+- 品类 / 品牌 / SKU：只统计购买事件；品类、品牌为空的事件不计入对应表，品牌 TOP10 取销售额前 10
+- SKU 日销量 ads_sku_sales_daily：每个 SKU 每天的购买事件数（批量 SKU 预测的输入）
+- 热门项草图 ads_sales_heavy_hitters_daily：每天品牌、品类销售额的 Space-Saving 草图（供任意日期范围的 TOP-K），
+  每块按 (日期, 品牌/品类) 精确求和后并入当天的草图，每天每个维度最多 HEAVY_HITTER_CAPACITY 个计数器
+- 漏斗和桑基图 ads_conversion_funnel(_daily) / ads_user_path_sankey(_daily)：按会话（user_session）统计，
+  漏斗步骤为包含浏览、加购、购买事件的会话数；路径节点为事件类型，相邻的相同类型合并，
+  会话以"进入"开始、以"离开"结束；整个会话计在首个事件的日期上
+- RFM ads_user_rfm_stat(_daily)：购买用户按 最近购买距统计截止日的天数、购买次数、购买金额
+  与全体均值比较分为五层，按用户最近一次购买日期切片
+- 用户位图 ads_user_bitmap_daily：每天的活跃（任意事件）、加购、购买用户集合，
+  user_id 按首次出现的顺序重映射为稠密编号，同一次构建的所有位图共用一套编号
+
+输入也可以是 etl/event_cache.py 生成的列式缓存（--cache），按块从内存映射的列中切片，不解析 CSV。
+
+内存：每块的部分结果暂存后定期合并，状态大小与不同键的个数（日期×用户、SKU、品牌、购买用户、
+仍打开的会话、用户编号表）成正比，与输入行数无关。会话跟踪假设事件文件按时间大致有序（原始导出即按时间排序）：
+同一会话中相邻事件间隔超过 SESSION_IDLE_MINUTES 分钟处切分为新会话（块内、跨块规则相同，结果与分块大小无关）。
+
+用法（在 backend 目录下）：
+    python -m etl.build_ads --input /data/events/2019-Oct.csv --output /data/ads_build
+    python -m etl.build_ads --cache /data/event_cache --output /data/ads_build
+    python -m etl.loader --input /data/ads_build
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.config.settings import settings
+from app.crud.export import EXPORT_MODELS
+from app.utils import bitmap, heavy_hitters, hll
+from .event_cache import EVENT_COLUMNS, EVENT_DTYPES, EVENT_TYPES, EventCache, event_files, parse_seconds
+from .loader import FIELD_DELIMITER, HIVE_NULL
+
+try:
+    import pandas as pd
+except ImportError:  # 可选依赖，只有构建 ADS 表时才需要
+    pd = None
+
+VIEW, CART, REMOVE, PURCHASE = range(len(EVENT_TYPES))
+
+# 桑基图节点：四种事件类型 + 会话入口和结束
+ENTER, EXIT = len(EVENT_TYPES), len(EVENT_TYPES) + 1
+NODE_NAMES = ("浏览", "加购", "移出购物车", "购买", "进入", "离开")
+FUNNEL_STEPS = ((VIEW, "浏览"), (CART, "加购"), (PURCHASE, "购买"))
+# 热门项草图的维度：名称和对应的事件列
+HEAVY_HITTER_DIMENSIONS = (("brand", "brand"), ("category", "category_code"))
+# 用户位图的行为：名称和对应的事件类型（active 为任意事件）
+BITMAP_BEHAVIORS = (("active", None), ("cart", CART), ("purchase", PURCHASE))
+
+RFM_HIGH_VALUE = "高价值用户"
+RFM_POTENTIAL = "潜力用户"
+RFM_RETAIN = "重要挽留用户"
+RFM_GENERAL = "一般价值用户"
+RFM_LOST = "流失用户"
+
+BRAND_TOP_N = 10
+SECONDS_PER_DAY = 86400
+# 部分结果合并的最小暂存行数
+MERGE_ROWS = 1_000_000
+
+
+def _dates(days: np.ndarray) -> np.ndarray:
+    """1970-01-01 起的天数转为 YYYY-MM-DD 字符串"""
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype("datetime64[D]"))
+
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    """1970-01-01 起的天数转为星期（0 为周日；1970-01-01 为周四）"""
+    return (days + 4) % 7
+
+
+class _Partial:
+    """
+    分块分组聚合：每块的部分结果先暂存，暂存行数超过上次合并结果的两倍时合并一次
+    agg 为空时做去重（用于 日期×用户 等去重计数）
+    """
+
+    def __init__(self, keys: List[str], agg: Dict[str, str]):
+        self.keys = keys
+        self.agg = agg
+        self._parts = []
+        self._rows = 0
+        self._merged_rows = 0
+
+    def add(self, part) -> None:
+        self._parts.append(part)
+        self._rows += len(part)
+        if self._rows > max(MERGE_ROWS, 2 * self._merged_rows):
+            self._merge()
+
+    def _merge(self) -> None:
+        frame = pd.concat(self._parts, ignore_index=True)
+        if self.agg:
+            frame = frame.groupby(self.keys, as_index=False, sort=False).agg(self.agg)
+        else:
+            frame = frame.drop_duplicates(self.keys, ignore_index=True)
+        self._parts = [frame]
+        self._rows = self._merged_rows = len(frame)
+
+    def result(self):
+        """合并后的聚合结果（列为 keys + agg 的列）"""
+        if not self._parts:
+            return pd.DataFrame(columns=self.keys + list(self.agg))
+        self._merge()
+        return self._parts[0]
+
+
+class TrafficTrend:
+    """每日 GMV、PV、UV 和访客草图"""
+
+    def __init__(self, sketch_precision: int):
+        self.daily = _Partial(["day"], {"gmv": "sum", "pv": "sum"})
+        self.visitors = _Partial(["day", "user_id"], {})
+        self.sketch_precision = sketch_precision
+        self.sketches: Dict[int, np.ndarray] = {}
+
+    def update(self, events) -> None:
+        part = pd.DataFrame({
+            "day": events["day"],
+            "gmv": np.where(events["type"] == PURCHASE, events["cents"], 0),
+            "pv": (events["type"] == VIEW).astype(np.int64),
+        })
+        self.daily.add(part.groupby("day", as_index=False).sum())
+        self.visitors.add(events[["day", "user_id"]].drop_duplicates())
+
+        # 块内各天的草图一次构建，再与此前块的同一天逐寄存器取最大值
+        days = events["day"].to_numpy()
+        first = int(days.min())
+        hashes = hll.hash64(events["user_id"].to_numpy())
+        registers = hll.group_registers(days - first, hashes, int(days.max()) - first + 1, self.sketch_precision)
+        for offset in np.flatnonzero(registers.any(axis=1)):
+            day = first + int(offset)
+            if day in self.sketches:
+                np.maximum(self.sketches[day], registers[offset], out=self.sketches[day])
+            else:
+                self.sketches[day] = registers[offset].copy()
+
+    def tables(self) -> dict:
+        daily = self.daily.result().sort_values("day")
+        uv = self.visitors.result().groupby("day").size()
+        return {
+            "ads_traffic_trend_daily": pd.DataFrame({
+                "dt": _dates(daily["day"]),
+                "total_gmv": daily["gmv"].to_numpy() / 100,
+                "total_pv": daily["pv"].to_numpy(),
+                "total_uv": uv.reindex(daily["day"], fill_value=0).to_numpy(),
+                "uv_sketch": [hll.encode(self.sketches[int(day)]) for day in daily["day"]],
+            }),
+        }
+
+
+class ActivityHeatmap:
+    """全部事件按 (日期, 小时) 计数，星期由日期得到"""
+
+    def __init__(self):
+        self.counts = _Partial(["day", "hour"], {"activity_count": "sum"})
+
+    def update(self, events) -> None:
+        part = events.groupby(["day", "hour"], sort=False).size().reset_index(name="activity_count")
+        self.counts.add(part)
+
+    def tables(self) -> dict:
+        counts = self.counts.result()
+        daily = pd.DataFrame({
+            "dt": _dates(counts["day"]),
+            "hour_val": counts["hour"].to_numpy(),
+            "week_val": _weekday(counts["day"].to_numpy()),
+            "activity_count": counts["activity_count"].to_numpy(),
+        }).sort_values(["dt", "hour_val"])
+        overall = daily.groupby(["hour_val", "week_val"], as_index=False)["activity_count"].sum()
+        return {"ads_activity_heatmap": overall, "ads_activity_heatmap_daily": daily}
+
+
+class Sales:
+    """购买事件按品类、品牌、SKU、SKU×日期汇总，以及每天品牌、品类销售额的热门项草图"""
+
+    def __init__(self, capacity: int):
+        self.category = _Partial(["category_code"], {"total_sales": "sum", "sales_count": "sum"})
+        self.brand = _Partial(["brand"], {"total_sales": "sum"})
+        self.product = _Partial(["product_id"], {"amount": "sum", "total_sales": "sum"})
+        self.product_daily = _Partial(["product_id", "day"], {"sales_count": "sum"})
+        self.capacity = capacity
+        # (维度, 日期) -> (草图, 总额)
+        self.sketches: Dict[tuple, tuple] = {}
+
+    def update(self, events) -> None:
+        purchases = events[events["type"] == PURCHASE]
+        price = purchases.groupby("category_code", sort=False)["cents"]
+        self.category.add(pd.DataFrame({"total_sales": price.sum(), "sales_count": price.size()}).reset_index())
+        self.brand.add(purchases.groupby("brand", sort=False)["cents"].sum().reset_index(name="total_sales"))
+        price = purchases.groupby("product_id", sort=False)["cents"]
+        self.product.add(pd.DataFrame({"amount": price.sum(), "total_sales": price.size()}).reset_index())
+        self.product_daily.add(
+            purchases.groupby(["product_id", "day"], sort=False).size().reset_index(name="sales_count")
+        )
+        for dimension, column in HEAVY_HITTER_DIMENSIONS:
+            totals = purchases.groupby(["day", column])["cents"].sum().reset_index()
+            for day, group in totals.groupby("day"):
+                chunk = heavy_hitters.exact(group[column].to_numpy(), group["cents"].to_numpy(), self.capacity)
+                total = int(group["cents"].sum())
+                key = (dimension, int(day))
+                if key in self.sketches:
+                    summary, previous = self.sketches[key]
+                    chunk, total = heavy_hitters.merge([summary, chunk], self.capacity), previous + total
+                self.sketches[key] = (chunk, total)
+
+    def tables(self) -> dict:
+        category = self.category.result().rename(columns={"category_code": "category_path"})
+        category["total_sales"] = category["total_sales"] / 100
+        brand = self.brand.result().rename(columns={"brand": "brand_name"})
+        brand["total_sales"] = brand["total_sales"] / 100
+        brand = brand.sort_values(["total_sales", "brand_name"], ascending=[False, True])
+        product = self.product.result()
+        product["avg_price"] = (product["amount"] / product["total_sales"]).round() / 100
+        daily = self.product_daily.result().sort_values(["product_id", "day"])
+        daily = pd.DataFrame({
+            "product_id": daily["product_id"].to_numpy(),
+            "dt": _dates(daily["day"]),
+            "sales_count": daily["sales_count"].to_numpy(),
+        })
+        sketches = pd.DataFrame(
+            [(day, dimension, total / 100, heavy_hitters.encode(summary))
+             for (dimension, day), (summary, total) in sorted(self.sketches.items(), key=lambda item: item[0][::-1])],
+            columns=["day", "dimension", "total_sales", "sketch"],
+        )
+        sketches["dt"] = _dates(sketches["day"].to_numpy(dtype=np.int64))
+        return {
+            "ads_sales_heavy_hitters_daily": sketches,
+            "ads_category_sales_stat": category,
+            "ads_brand_sales_stat": brand,
+            "ads_brand_sales_top10": brand.head(BRAND_TOP_N),
+            "ads_sku_price_sensitivity": product,
+            "ads_sku_sales_daily": daily,
+        }
+
+
+class RfmStat:
+    """购买用户的最近购买日期、购买次数、购买金额，结束时分层"""
+
+    def __init__(self):
+        self.users = _Partial(["user_id"], {"last_day": "max", "frequency": "sum", "monetary": "sum"})
+        self.max_day: Optional[int] = None
+
+    def update(self, events) -> None:
+        last = int(events["day"].max())
+        self.max_day = last if self.max_day is None else max(self.max_day, last)
+        purchases = events[events["type"] == PURCHASE].groupby("user_id", sort=False)
+        self.users.add(pd.DataFrame({
+            "last_day": purchases["day"].max(),
+            "frequency": purchases.size(),
+            "monetary": purchases["cents"].sum(),
+        }).reset_index())
+
+    def tables(self) -> dict:
+        users = self.users.result()
+        if len(users):
+            # 统计截止日为数据最后一天的次日
+            recency = self.max_day + 1 - users["last_day"].to_numpy()
+            frequency = users["frequency"].to_numpy()
+            monetary = users["monetary"].to_numpy()
+            recent = recency <= recency.mean()
+            frequent = frequency > frequency.mean()
+            valuable = monetary > monetary.mean()
+            segment = np.select(
+                [recent & frequent & valuable, recent & (frequent | valuable), recent, frequent | valuable],
+                [RFM_HIGH_VALUE, RFM_POTENTIAL, RFM_GENERAL, RFM_RETAIN],
+                default=RFM_LOST,
+            )
+        else:
+            segment = np.array([], dtype=object)
+        daily = pd.DataFrame({"day": users["last_day"].to_numpy(), "rfm_segment": segment})
+        daily = daily.groupby(["day", "rfm_segment"]).size().reset_index(name="user_count")
+        daily = pd.DataFrame({
+            "dt": _dates(daily["day"]),
+            "rfm_segment": daily["rfm_segment"].to_numpy(),
+            "user_count": daily["user_count"].to_numpy(),
+        })
+        overall = daily.groupby("rfm_segment", as_index=False)["user_count"].sum()
+        return {"ads_user_rfm_stat": overall, "ads_user_rfm_stat_daily": daily}
+
+
+class UserBitmaps:
+    """每日各行为的用户集合：user_id 按首次出现的顺序重映射为稠密编号，结束时编码为位图"""
+
+    def __init__(self):
+        self.users = pd.Index(np.array([], dtype=np.int64))
+        self.members = _Partial(["day", "behavior", "uid"], {})
+
+    def update(self, events) -> None:
+        ids = events["user_id"].to_numpy()
+        uid = self.users.get_indexer(ids)
+        if (uid < 0).any():
+            self.users = self.users.append(pd.Index(pd.unique(ids[uid < 0])))
+            uid = self.users.get_indexer(ids)
+        day = events["day"].to_numpy()
+        kind = events["type"].to_numpy()
+        parts = []
+        for code, (_, event_type) in enumerate(BITMAP_BEHAVIORS):
+            mask = slice(None) if event_type is None else kind == event_type
+            parts.append(pd.DataFrame({"day": day[mask], "behavior": code, "uid": uid[mask]}))
+        self.members.add(pd.concat(parts, ignore_index=True).drop_duplicates())
+
+    def tables(self) -> dict:
+        size = len(self.users)
+        members = self.members.result().sort_values(["day", "behavior", "uid"])
+        rows = [
+            (day, BITMAP_BEHAVIORS[code][0], len(group), bitmap.encode(group["uid"].to_numpy(), size))
+            for (day, code), group in members.groupby(["day", "behavior"], sort=True)
+        ]
+        frame = pd.DataFrame(rows, columns=["day", "behavior", "user_count", "bitmap"])
+        frame["dt"] = _dates(frame["day"].to_numpy(dtype=np.int64))
+        return {"ads_user_bitmap_daily": frame}
+
+
+class SessionPaths:
+    """
+    按会话统计漏斗和路径：只保存仍打开的会话（首日、最后事件时间、最后事件类型、事件类型位集合）
+    会话内相邻且类型不同的事件构成一条边，边在读到时立即计数；会话结束时计数 最后类型→离开 和漏斗步骤
+    """
+
+    def __init__(self, idle_seconds: int):
+        self.idle_seconds = idle_seconds
+        self.open = pd.DataFrame({
+            "start_day": np.array([], dtype=np.int64),
+            "last_ts": np.array([], dtype=np.int64),
+            "last_type": np.array([], dtype=np.int64),
+            "flags": np.array([], dtype=np.int64),
+        }, index=pd.Index([], dtype=object))
+        self.edges = _Partial(["day", "source", "target"], {"flow_value": "sum"})
+        self.closed = _Partial(["day", "flags"], {"sessions": "sum"})
+
+    def update(self, events) -> None:
+        codes, sessions = pd.factorize(events["user_session"])
+        order = np.lexsort((events["ts"].to_numpy(), codes))
+        code = codes[order]
+        ts = events["ts"].to_numpy()[order]
+        kind = events["type"].to_numpy().astype(np.int64)[order]
+
+        # 按 (会话, 时间) 排序后切段：会话变化或相邻事件间隔超过空闲时长处开始新段，每段为一个会话
+        first = np.r_[True, code[1:] != code[:-1]]
+        boundary = first | np.r_[False, ts[1:] - ts[:-1] > self.idle_seconds]
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], len(code)] - 1
+        segment = np.cumsum(boundary) - 1
+        owner = code[starts]
+        flags = np.bitwise_or.reduceat(np.left_shift(1, kind), starts)
+        start_day = ts[starts] // SECONDS_PER_DAY
+        source = np.full(len(starts), ENTER, dtype=np.int64)
+
+        # 会话在块内的首段与此前块中仍打开的同一会话衔接；间隔超过空闲时长时先结束打开的会话
+        previous = np.full(len(starts), -1, dtype=np.int64)
+        previous[first[starts]] = self.open.index.get_indexer(sessions[owner[first[starts]]])
+        carried = np.flatnonzero(previous >= 0)
+        rows = previous[carried]
+        joined = ts[starts[carried]] - self.open["last_ts"].to_numpy()[rows] <= self.idle_seconds
+        carried, rows = carried[joined], rows[joined]
+        start_day[carried] = self.open["start_day"].to_numpy()[rows]
+        flags[carried] |= self.open["flags"].to_numpy()[rows]
+        source[carried] = self.open["last_type"].to_numpy()[rows]
+        expired = np.zeros(len(self.open), dtype=bool)
+        expired[previous[previous >= 0]] = True
+        expired[rows] = False
+        self._close(expired)
+
+        step = ~boundary[1:] & (kind[1:] != kind[:-1])
+        entry = source != kind[starts]
+        self._add_edges(
+            np.r_[start_day[entry], start_day[segment[:-1][step]]],
+            np.r_[source[entry], kind[:-1][step]],
+            np.r_[kind[starts][entry], kind[1:][step]],
+        )
+
+        # 每个会话的最后一段仍打开，之前的段已因空闲超时结束
+        last = np.r_[owner[1:] != owner[:-1], True]
+        done = ~last
+        self._count(start_day[done], kind[ends][done], flags[done])
+        state = pd.DataFrame(
+            {"start_day": start_day[last], "last_ts": ts[ends][last], "last_type": kind[ends][last], "flags": flags[last]},
+            index=sessions[owner[last]],
+        )
+        self.open = pd.concat([self.open.drop(index=sessions[owner[last]], errors="ignore"), state])
+        self._close(self.open["last_ts"].to_numpy() < ts.max() - self.idle_seconds)
+
+    def _add_edges(self, day: np.ndarray, source: np.ndarray, target: np.ndarray) -> None:
+        part = pd.DataFrame({"day": day, "source": source, "target": target})
+        self.edges.add(part.groupby(["day", "source", "target"], sort=False).size().reset_index(name="flow_value"))
+
+    def _count(self, day: np.ndarray, last_type: np.ndarray, flags: np.ndarray) -> None:
+        """计数结束的会话：最后类型→离开 和会话的事件类型组合"""
+        if not len(day):
+            return
+        self._add_edges(day, last_type, np.full(len(day), EXIT, dtype=np.int64))
+        part = pd.DataFrame({"day": day, "flags": flags})
+        self.closed.add(part.groupby(["day", "flags"], sort=False).size().reset_index(name="sessions"))
+
+    def _close(self, mask: np.ndarray) -> None:
+        """结束选中的打开会话"""
+        if not mask.any():
+            return
+        closed = self.open[mask]
+        self._count(
+            closed["start_day"].to_numpy(), closed["last_type"].to_numpy(), closed["flags"].to_numpy()
+        )
+        self.open = self.open[~mask]
+
+    def tables(self) -> dict:
+        self._close(np.ones(len(self.open), dtype=bool))
+        return session_tables(self.edges.result(), self.closed.result())
+
+
+def session_tables(edges, closed) -> dict:
+    """
+    会话统计转为漏斗和桑基图的四张表（etl/sessionize.py 共用）
+    :param edges: 列为 day, source, target, flow_value（节点为 NODE_NAMES 的下标）
+    :param closed: 列为 day, flags（会话的事件类型位集合）, sessions
+    """
+    names = np.array(NODE_NAMES, dtype=object)
+    sankey = pd.DataFrame({
+        "dt": _dates(edges["day"]),
+        "source_node": names[edges["source"].to_numpy(dtype=np.int64)],
+        "target_node": names[edges["target"].to_numpy(dtype=np.int64)],
+        "flow_value": edges["flow_value"].to_numpy(),
+    }).sort_values(["dt", "source_node", "target_node"])
+
+    flags = closed["flags"].to_numpy(dtype=np.int64)
+    steps = [
+        pd.DataFrame({
+            "day": closed["day"].to_numpy(),
+            "step_name": name,
+            "step_value": np.where(flags & (1 << kind), closed["sessions"].to_numpy(), 0),
+        })
+        for kind, name in FUNNEL_STEPS
+    ]
+    funnel = pd.concat(steps).groupby(["day", "step_name"], as_index=False)["step_value"].sum()
+    funnel = funnel[funnel["step_value"] > 0]
+    funnel = pd.DataFrame({
+        "dt": _dates(funnel["day"]),
+        "step_name": funnel["step_name"].to_numpy(),
+        "step_value": funnel["step_value"].to_numpy(),
+    })
+    return {
+        "ads_conversion_funnel": funnel.groupby("step_name", as_index=False)["step_value"].sum(),
+        "ads_conversion_funnel_daily": funnel,
+        "ads_user_path_sankey": sankey.groupby(["source_node", "target_node"], as_index=False)["flow_value"].sum(),
+        "ads_user_path_sankey_daily": sankey,
+    }
+
+
+def event_frame(seconds, kind, product_id, category_code, brand, price, user_id, user_session):
+    """
+    事件列组装为聚合使用的 DataFrame：ts（秒）、day（1970-01-01 起的天数）、hour、type（事件类型编号）、
+    cents（价格，单位分；金额按整数分累加，结果与分块大小和相加顺序无关）
+    """
+    return pd.DataFrame({
+        "ts": seconds,
+        "day": seconds // SECONDS_PER_DAY,
+        "hour": seconds // 3600 % 24,
+        "type": kind,
+        "product_id": product_id,
+        "category_code": category_code,
+        "brand": brand,
+        "cents": np.rint(np.nan_to_num(np.asarray(price, dtype=np.float64)) * 100).astype(np.int64),
+        "user_id": user_id,
+        "user_session": user_session,
+    })
+
+
+def prepare_chunk(raw):
+    """原始事件块转为 event_frame；未知事件类型、缺少会话或用户的行丢弃"""
+    kind = pd.Index(EVENT_TYPES).get_indexer(raw["event_type"]).astype(np.int64)
+    events = event_frame(
+        parse_seconds(raw["event_time"]), kind, raw["product_id"].to_numpy(), raw["category_code"].to_numpy(),
+        raw["brand"].to_numpy(), raw["price"].to_numpy(), raw["user_id"].to_numpy(), raw["user_session"].to_numpy(),
+    )
+    valid = (kind >= 0) & events["user_session"].notna().to_numpy() & events["user_id"].notna().to_numpy()
+    return events[valid]
+
+
+def read_events(files: List[Path], chunk_rows: int) -> Iterator:
+    """按块读取事件文件，每块为 prepare_chunk 规整后的 DataFrame"""
+    for path in files:
+        with pd.read_csv(path, usecols=list(EVENT_COLUMNS), dtype=EVENT_DTYPES, chunksize=chunk_rows) as reader:
+            for raw in reader:
+                yield prepare_chunk(raw)
+
+
+def read_cached_events(cache: EventCache, chunk_rows: int) -> Iterator:
+    """
+    按块读取列式缓存，每块为 event_frame；各列从内存映射中切片，不解析文本
+    会话以字典编码（整数）参与分组，品牌、品类按字典还原为字符串
+    """
+    # 缓存中的事件类型编码转为 EVENT_TYPES 的下标
+    types = pd.Index(EVENT_TYPES).get_indexer(cache.dictionary("event_type")).astype(np.int64)
+    columns = {name: cache.column(name) for name in EVENT_COLUMNS}
+    for start in range(0, cache.rows, chunk_rows):
+        rows = slice(start, min(start + chunk_rows, cache.rows))
+        yield event_frame(
+            np.asarray(columns["event_time"][rows]),
+            types[columns["event_type"][rows]],
+            np.asarray(columns["product_id"][rows]),
+            cache.decode("category_code", columns["category_code"][rows]),
+            cache.decode("brand", columns["brand"][rows]),
+            columns["price"][rows],
+            np.asarray(columns["user_id"][rows]),
+            np.asarray(columns["user_session"][rows], dtype=np.int64),
+        )
+
+
+def write_table(output_dir: Path, table: str, frame) -> int:
+    """按模型列顺序写为 <output>/<表名>/000000_0（loader 的文本输入格式），返回行数"""
+    columns = [column.name for column in EXPORT_MODELS[table].__table__.columns]
+    directory = output_dir / table
+    directory.mkdir(parents=True, exist_ok=True)
+    frame[columns].to_csv(
+        directory / "000000_0", sep=FIELD_DELIMITER, header=False, index=False,
+        na_rep=HIVE_NULL, lineterminator="\n",
+    )
+    return len(frame)
+
+
+def build(
+    chunks: Iterator, idle_seconds: int, sketch_precision: int, heavy_hitter_capacity: int
+) -> Dict[str, object]:
+    """一遍读取全部事件块（read_events / read_cached_events），返回 表名 -> DataFrame"""
+    aggregators = [
+        TrafficTrend(sketch_precision), ActivityHeatmap(), Sales(heavy_hitter_capacity), RfmStat(), UserBitmaps(),
+        SessionPaths(idle_seconds),
+    ]
+    started = time.perf_counter()
+    rows = 0
+    for events in chunks:
+        if events.empty:
+            continue
+        for aggregator in aggregators:
+            aggregator.update(events)
+        rows += len(events)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{rows:,} 个事件，{rows / max(elapsed, 1e-9):,.0f} 行/s，"
+            f"打开的会话 {len(aggregators[-1].open):,}"
+        )
+    tables = {}
+    for aggregator in aggregators:
+        tables.update(aggregator.tables())
+    return tables
+
+
+def run(args: argparse.Namespace) -> int:
+    if pd is None:
+        print("构建 ADS 表需要安装 pandas")
+        return 2
+    if args.cache:
+        try:
+            chunks = read_cached_events(EventCache(Path(args.cache)), args.chunk_rows)
+        except ValueError as e:
+            print(f"event cache error: {e}")
+            return 2
+    else:
+        files = event_files(args.input)
+        missing = [str(path) for path in files if not path.is_file()]
+        if missing or not files:
+            print(f"找不到事件文件: {', '.join(missing) or ', '.join(args.input)}")
+            return 2
+        chunks = read_events(files, args.chunk_rows)
+
+    output_dir = Path(args.output)
+    started = time.perf_counter()
+    try:
+        tables = build(chunks, args.session_idle_minutes * 60, args.sketch_precision, args.heavy_hitter_capacity)
+        for table in sorted(tables):
+            print(f"{table}: {write_table(output_dir, table, tables[table])} 行")
+    except Exception as e:
+        print(f"build ads error: {e}")
+        return 1
+    print(f"已写入 {len(tables)} 张表到 {output_dir}，用时 {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="从原始事件文件一遍构建全部 ADS 表，输出为 etl.loader 的输入目录")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", nargs="+", help="事件 CSV 文件或目录（可多个，按给出顺序读取）")
+    source.add_argument("--cache", help="etl.event_cache 生成的列式缓存目录")
+    parser.add_argument("--output", required=True, help="输出目录，每张表一个子目录")
+    parser.add_argument("--chunk-rows", type=int, default=settings.BUILD_CHUNK_ROWS, help="每块读取的事件行数")
+    parser.add_argument(
+        "--session-idle-minutes", type=int, default=settings.SESSION_IDLE_MINUTES,
+        help="会话超过该分钟数没有新事件即视为结束",
+    )
+    parser.add_argument(
+        "--sketch-precision", type=int, default=settings.UV_SKETCH_PRECISION,
+        help=f"UV 草图精度（{hll.MIN_PRECISION}-{hll.MAX_PRECISION}）",
+    )
+    parser.add_argument(
+        "--heavy-hitter-capacity", type=int, default=settings.HEAVY_HITTER_CAPACITY,
+        help="每天品牌、品类热门项草图的计数器个数",
+    )
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
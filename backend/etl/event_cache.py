@@ -0,0 +1,244 @@
+"""
+原始事件文件的二进制列式缓存
+一次性把原始事件 CSV 转为每列一个二进制数组文件，之后的构建直接以 np.memmap 打开，只读取需要的列，
+不再解析 CSV：
+- event_time：int64 秒（UTC 1970-01-01 起）
+- event_type、category_code、brand、user_session：字典编码（event_type 为 int8，其余为 int32；
+  字典按首次出现的顺序编号，保存为 <列名>.dict，每行一个值；空值编码为 -1）
+- product_id、user_id：int64
+- price：float32（两位小数的价格在 8 万以内可精确还原到分）
+未知事件类型、缺少会话或用户的行在转换时丢弃（与 build_ads 的规则一致）。
+manifest.json 记录格式版本、行数、列类型和源文件（路径、大小、修改时间）；源文件未变化时重复运行直接跳过。
+先写入临时目录，完成后整体替换输出目录，中断不会留下不完整的缓存。
+
+用法（在 backend 目录下）：
+    python -m etl.event_cache --input /data/events/2019-Oct.csv --output /data/event_cache
+    python -m etl.build_ads --cache /data/event_cache --output /data/ads_build
+"""
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config.settings import settings
+
+try:
+    import pandas as pd
+except ImportError:  # 可选依赖，只有转换和构建 ADS 表时才需要
+    pd = None
+
+EVENT_COLUMNS = (
+    "event_time", "event_type", "product_id", "category_code",
+    "brand", "price", "user_id", "user_session",
+)
+EVENT_TYPES = ("view", "cart", "remove_from_cart", "purchase")
+# 读取原始 CSV 的列类型
+EVENT_DTYPES = {
+    "event_time": str, "event_type": str, "product_id": "int64", "category_code": str,
+    "brand": str, "price": "float64", "user_id": "int64", "user_session": str,
+}
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+# 列名 -> 二进制类型；字典编码的列另有 <列名>.dict
+CACHE_COLUMNS = {
+    "event_time": "<i8",
+    "event_type": "|i1",
+    "product_id": "<i8",
+    "category_code": "<i4",
+    "brand": "<i4",
+    "price": "<f4",
+    "user_id": "<i8",
+    "user_session": "<i4",
+}
+DICTIONARY_COLUMNS = ("event_type", "category_code", "brand", "user_session")
+
+
+def event_files(inputs: List[str]) -> List[Path]:
+    """输入路径展开为文件列表；目录取其中的文件（忽略以 . 或 _ 开头的文件），按名称排序"""
+    files = []
+    for name in inputs:
+        path = Path(name)
+        if path.is_dir():
+            files.extend(sorted(
+                child for child in path.iterdir()
+                if child.is_file() and not child.name.startswith((".", "_"))
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def parse_seconds(event_time) -> np.ndarray:
+    """event_time 字符串列（"YYYY-MM-DD HH:MM:SS UTC"）转为 int64 秒"""
+    return (
+        pd.to_datetime(event_time.str.slice(0, 19), format="%Y-%m-%d %H:%M:%S")
+        .to_numpy().astype("datetime64[s]").astype(np.int64)
+    )
+
+
+def sources_of(files: List[Path]) -> List[dict]:
+    """源文件指纹：路径、大小、修改时间"""
+    return [
+        {"path": str(path.resolve()), "size": path.stat().st_size, "mtime_ns": path.stat().st_mtime_ns}
+        for path in files
+    ]
+
+
+class EventCache:
+    """
+    打开列式缓存：column() 返回只读内存映射（不复制、按需分页读取），dictionary() 返回字典编码列的值数组
+    :raises ValueError: 目录不是本格式的缓存
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        try:
+            self.manifest = json.loads((self.directory / MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"invalid event cache {self.directory}: {e}")
+        if self.manifest.get("format") != FORMAT_VERSION:
+            raise ValueError(f"unsupported event cache format: {self.manifest.get('format')}")
+        self.rows: int = self.manifest["rows"]
+        self._dictionaries: Dict[str, np.ndarray] = {}
+
+    def column(self, name: str) -> np.ndarray:
+        dtype = np.dtype(self.manifest["columns"][name])
+        if not self.rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.directory / f"{name}.bin", dtype=dtype, mode="r", shape=(self.rows,))
+
+    def dictionary(self, name: str) -> np.ndarray:
+        """字典编码列的值（object 数组，下标即编码）"""
+        if name not in self._dictionaries:
+            text = (self.directory / f"{name}.dict").read_text(encoding="utf-8")
+            self._dictionaries[name] = np.array(text.split("\n") if text else [], dtype=object)
+        return self._dictionaries[name]
+
+    def decode(self, name: str, codes: np.ndarray) -> np.ndarray:
+        """编码转为值数组，-1 转为 None"""
+        values = np.append(self.dictionary(name), None)
+        return values[codes]
+
+
+class _Dictionary:
+    """按首次出现的顺序编号的字典"""
+
+    def __init__(self, values=()):
+        self.index = pd.Index(list(values), dtype=object)
+
+    def encode(self, values) -> np.ndarray:
+        missing = values.isna().to_numpy()
+        present = values.to_numpy(dtype=object)
+        codes = self.index.get_indexer(present)
+        new = (codes < 0) & ~missing
+        if new.any():
+            self.index = self.index.append(pd.Index(pd.unique(present[new]), dtype=object))
+            if len(self.index) > np.iinfo(np.int32).max:
+                raise ValueError("dictionary too large for int32 codes")
+            codes = self.index.get_indexer(present)
+        codes[missing] = -1
+        return codes
+
+    def text(self) -> str:
+        return "\n".join(self.index.astype(str).tolist())
+
+
+def convert(files: List[Path], output_dir: Path, chunk_rows: int) -> int:
+    """按块读取原始事件文件写入列式缓存，返回行数"""
+    temporary = output_dir.with_name(output_dir.name + ".tmp")
+    shutil.rmtree(temporary, ignore_errors=True)
+    temporary.mkdir(parents=True)
+    dictionaries = {name: _Dictionary() for name in DICTIONARY_COLUMNS}
+    # 事件类型字典固定为 EVENT_TYPES，编码与 build_ads 的类型编号一致
+    dictionaries["event_type"] = _Dictionary(EVENT_TYPES)
+    handles = {name: open(temporary / f"{name}.bin", "wb") for name in CACHE_COLUMNS}
+    rows = 0
+    started = time.perf_counter()
+    try:
+        for path in files:
+            with pd.read_csv(path, usecols=list(EVENT_COLUMNS), dtype=EVENT_DTYPES, chunksize=chunk_rows) as reader:
+                for raw in reader:
+                    kind = pd.Index(EVENT_TYPES).get_indexer(raw["event_type"])
+                    raw = raw[(kind >= 0) & raw["user_session"].notna().to_numpy() & raw["user_id"].notna().to_numpy()]
+                    columns = {
+                        "event_time": parse_seconds(raw["event_time"]),
+                        "product_id": raw["product_id"].to_numpy(),
+                        "price": raw["price"].to_numpy(),
+                        "user_id": raw["user_id"].to_numpy(),
+                    }
+                    for name in DICTIONARY_COLUMNS:
+                        columns[name] = dictionaries[name].encode(raw[name])
+                    for name, dtype in CACHE_COLUMNS.items():
+                        handles[name].write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+                    rows += len(raw)
+                    elapsed = time.perf_counter() - started
+                    print(f"{rows:,} 个事件，{rows / max(elapsed, 1e-9):,.0f} 行/s")
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    for name in DICTIONARY_COLUMNS:
+        (temporary / f"{name}.dict").write_text(dictionaries[name].text(), encoding="utf-8")
+    manifest = {
+        "format": FORMAT_VERSION,
+        "rows": rows,
+        "columns": CACHE_COLUMNS,
+        "sources": sources_of(files),
+    }
+    (temporary / MANIFEST).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    shutil.rmtree(output_dir, ignore_errors=True)
+    temporary.rename(output_dir)
+    return rows
+
+
+def is_current(output_dir: Path, files: List[Path]) -> bool:
+    """缓存存在、格式版本一致且源文件未变化"""
+    try:
+        cache = EventCache(output_dir)
+    except ValueError:
+        return False
+    return cache.manifest.get("sources") == sources_of(files)
+
+
+def run(args: argparse.Namespace) -> int:
+    if pd is None:
+        print("转换事件文件需要安装 pandas")
+        return 2
+    files = event_files(args.input)
+    missing = [str(path) for path in files if not path.is_file()]
+    if missing or not files:
+        print(f"找不到事件文件: {', '.join(missing) or ', '.join(args.input)}")
+        return 2
+
+    output_dir = Path(args.output)
+    if not args.force and is_current(output_dir, files):
+        print(f"{output_dir} 已是最新（源文件未变化），跳过；使用 --force 重新转换")
+        return 0
+    started = time.perf_counter()
+    try:
+        rows = convert(files, output_dir, args.chunk_rows)
+    except Exception as e:
+        print(f"event cache error: {e}")
+        return 1
+    size = sum(path.stat().st_size for path in output_dir.iterdir())
+    print(f"已写入 {output_dir}：{rows:,} 个事件，{size / 1e6:,.1f}MB，用时 {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="原始事件 CSV 转为二进制列式缓存（供 etl.build_ads --cache 读取）")
+    parser.add_argument("--input", required=True, nargs="+", help="事件 CSV 文件或目录（可多个，按给出顺序读取）")
+    parser.add_argument("--output", required=True, help="缓存目录")
+    parser.add_argument("--chunk-rows", type=int, default=settings.BUILD_CHUNK_ROWS, help="每块读取的事件行数")
+    parser.add_argument("--force", action="store_true", help="源文件未变化时也重新转换")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""
+ADS 表原子批量导入
+把 Hive 导出的文本文件（\\x01 分隔，NULL 为 \\N）或 Parquet 文件导入 app/models/data.py 中的 ads_* 表。
+每张表先导入影子表 _load_<表名>，行数校验通过后，所有表用一条 RENAME TABLE 同时换入：
+读取方在任何时刻看到的都是完整的旧批次或完整的新批次，数据集版本只变化一次。
+影子表和换出的旧表不以 ads_ 开头，导入过程中不会触发数据集版本变化。
+
+输入目录布局（与 Hive 仓库目录一致）：
+    <input>/<表名>/000000_0                    文本文件
+    <input>/<表名>/dt=2019-10-01/000000_0      分区目录，分区列的值取自目录名
+    <input>/<表名>/part-0000.parquet           Parquet 文件
+    <input>/<表名>.parquet                     单个 Parquet 文件
+以 . 或 _ 开头的文件（_SUCCESS 等）忽略。文件中的列顺序与模型中列的声明顺序一致（分区列除外）；
+模型新增的可空列（如 ads_traffic_trend_daily.uv_sketch）在旧版导出中可以缺少，导入为 NULL，
+正式表缺少这些列时在影子表上补建。
+
+导入方式：
+- infile：文本文件直接 LOAD DATA LOCAL INFILE（需要 MySQL 开启 local_infile），最快
+- insert：按 LOADER_BATCH_ROWS 行一批 executemany（PyMySQL 会合并为多行 INSERT）
+Parquet 文件（需要 pyarrow）总是使用 insert。
+
+用法（在 backend 目录下）：
+    python -m etl.loader --input /data/ads_export
+    python -m etl.loader --input /data/ads_export --tables ads_traffic_trend_daily --method insert
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+import pymysql
+from sqlalchemy.dialects import mysql
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from app.config.settings import settings
+from app.crud.export import EXPORT_MODELS
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖，只有导入 Parquet 时才需要
+    pq = None
+
+FIELD_DELIMITER = "\x01"
+HIVE_NULL = "\\N"
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+SHADOW_PREFIX = "_load_"
+RETIRED_PREFIX = "_old_"
+METHODS = ("infile", "insert")
+
+
+class Source:
+    """一个输入文件：路径、格式以及从分区目录得到的列值"""
+
+    def __init__(self, path: Path, fmt: str, partition: Dict[str, Optional[str]]):
+        self.path = path
+        self.fmt = fmt
+        self.partition = partition
+
+
+def _quote(name: str) -> str:
+    return f"`{name}`"
+
+
+def prepare_shadow(connection, table: str) -> str:
+    """确保正式表存在，并按正式表结构（含索引）重建空的影子表，返回影子表名"""
+    shadow = SHADOW_PREFIX + table
+    with connection.cursor() as cursor:
+        ddl = CreateTable(EXPORT_MODELS[table].__table__, if_not_exists=True).compile(dialect=mysql.dialect())
+        cursor.execute(str(ddl).strip())
+        cursor.execute(f"DROP TABLE IF EXISTS {_quote(shadow)}")
+        cursor.execute(f"CREATE TABLE {_quote(shadow)} LIKE {_quote(table)}")
+        # 正式表早于模型新增的列（如 uv_sketch）时，在影子表上补建，换入后正式表随之升级
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (shadow,),
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for column in EXPORT_MODELS[table].__table__.columns:
+            if column.name not in existing:
+                spec = CreateColumn(column).compile(dialect=mysql.dialect())
+                cursor.execute(f"ALTER TABLE {_quote(shadow)} ADD COLUMN {str(spec).strip()}")
+    return shadow
+
+
+def count_rows(connection, table: str) -> Optional[int]:
+    """表的行数；表不存在时返回 None"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,),
+        )
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(f"SELECT COUNT(*) FROM {_quote(table)}")
+        return int(cursor.fetchone()[0])
+
+
+def find_sources(input_dir: Path, table: str) -> List[Source]:
+    """按目录布局查找表的输入文件，按路径排序；没有输入时返回空列表"""
+    single = input_dir / f"{table}.parquet"
+    if single.is_file():
+        return [Source(single, "parquet", {})]
+    root = input_dir / table
+    if not root.is_dir():
+        return []
+
+    sources = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith((".", "_")))
+        base = Path(directory)
+        partition = {}
+        for part in base.relative_to(root).parts:
+            key, sep, value = part.partition("=")
+            if not sep:
+                raise ValueError(f"{base}: 子目录名必须为 列名=值 形式的分区目录")
+            partition[key] = None if value == HIVE_DEFAULT_PARTITION else value
+        for name in sorted(filenames):
+            if name.startswith((".", "_")):
+                continue
+            fmt = "parquet" if name.endswith(".parquet") else "text"
+            sources.append(Source(base / name, fmt, partition))
+    return sources
+
+
+def _count_lines(path: Path) -> int:
+    """文本文件行数（最后一行没有换行符时也计入）"""
+    count = 0
+    last = b"\n"
+    with open(path, "rb") as handle:
+        while True:
+            block = handle.read(1 << 20)
+            if not block:
+                break
+            count += block.count(b"\n")
+            last = block[-1:]
+    return count + (last != b"\n")
+
+
+def _optional_tail(columns: List[str], nullable: Collection[str]) -> int:
+    """列表末尾连续的可空列个数（旧版导出文件可以不含这些列）"""
+    count = 0
+    for name in reversed(columns):
+        if name not in nullable:
+            break
+        count += 1
+    return count
+
+
+def _text_batches(
+    source: Source, columns: List[str], batch_rows: int, nullable: Collection[str] = ()
+) -> Iterator[List[tuple]]:
+    """
+    按批读取文本文件，\\N 转为 NULL，分区列值追加在行尾
+    行尾缺少的可空列（模型新增列之前的旧版导出）补为 NULL
+    """
+    extra = tuple(source.partition.values())
+    shortest = len(columns) - _optional_tail(columns, nullable)
+    batch = []
+    with open(source.path, "r", encoding="utf-8", newline="\n") as handle:
+        for line_no, line in enumerate(handle, 1):
+            fields = line.rstrip("\r\n").split(FIELD_DELIMITER)
+            if not shortest <= len(fields) <= len(columns):
+                expected = f"{shortest}~{len(columns)}" if shortest < len(columns) else f"{len(columns)}"
+                raise ValueError(
+                    f"{source.path}:{line_no}: 应为 {expected} 列（{', '.join(columns)}），实际 {len(fields)} 列"
+                )
+            padding = (None,) * (len(columns) - len(fields))
+            batch.append(tuple(None if field == HIVE_NULL else field for field in fields) + padding + extra)
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _parquet_batches(
+    source: Source, columns: List[str], batch_rows: int, nullable: Collection[str] = ()
+) -> Iterator[List[tuple]]:
+    """按批读取 Parquet 文件，按列名取值，文件中没有的可空列补为 NULL，分区列值追加在行尾"""
+    if pq is None:
+        raise RuntimeError("导入 Parquet 文件需要安装 pyarrow")
+    parquet = pq.ParquetFile(source.path)
+    present = [name for name in columns if name in parquet.schema_arrow.names]
+    missing = [name for name in columns if name not in present and name not in nullable]
+    if missing:
+        raise ValueError(f"{source.path}: 缺少列 {', '.join(missing)}")
+    extra = tuple(source.partition.values())
+    for record_batch in parquet.iter_batches(batch_size=batch_rows, columns=present):
+        values = dict(zip(present, (column.to_pylist() for column in record_batch.columns)))
+        nulls = [None] * record_batch.num_rows
+        yield [row + extra for row in zip(*(values.get(name, nulls) for name in columns))]
+
+
+class TableLoader:
+    """把一张表的全部输入文件导入影子表"""
+
+    def __init__(self, connection, table: str, sources: List[Source], method: str, batch_rows: int):
+        self.connection = connection
+        self.table = table
+        self.model = EXPORT_MODELS[table]
+        self.sources = sources
+        self.method = method
+        self.batch_rows = batch_rows
+        self.shadow = SHADOW_PREFIX + table
+        self.nullable = {column.name for column in self.model.__table__.columns if column.nullable}
+
+    def _file_columns(self, source: Source) -> List[str]:
+        """文件中的列：模型列去掉分区列，保持声明顺序"""
+        names = [column.name for column in self.model.__table__.columns]
+        unknown = [key for key in source.partition if key not in names]
+        if unknown:
+            raise ValueError(f"{source.path}: 分区列 {', '.join(unknown)} 不是 {self.table} 的列")
+        return [name for name in names if name not in source.partition]
+
+    def prepare(self) -> None:
+        """重建空的影子表"""
+        prepare_shadow(self.connection, self.table)
+
+    def _load_infile(self, source: Source, columns: List[str]) -> int:
+        """LOAD DATA LOCAL INFILE 导入一个文本文件，返回文件行数"""
+        sql = (
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {_quote(self.shadow)} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY 0x01 LINES TERMINATED BY '\\n' "
+            f"({', '.join(_quote(name) for name in columns)})"
+        )
+        params = [str(source.path)]
+        if source.partition:
+            sql += " SET " + ", ".join(f"{_quote(key)} = %s" for key in source.partition)
+            params.extend(source.partition.values())
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return _count_lines(source.path)
+
+    def _load_insert(self, source: Source, columns: List[str]) -> int:
+        """分批 executemany 导入一个文件，返回行数"""
+        names = columns + list(source.partition)
+        sql = (
+            f"INSERT INTO {_quote(self.shadow)} ({', '.join(_quote(name) for name in names)}) "
+            f"VALUES ({', '.join(['%s'] * len(names))})"
+        )
+        reader = _parquet_batches if source.fmt == "parquet" else _text_batches
+        rows = 0
+        with self.connection.cursor() as cursor:
+            for batch in reader(source, columns, self.batch_rows, self.nullable):
+                cursor.executemany(sql, batch)
+                rows += len(batch)
+        return rows
+
+    def load(self) -> int:
+        """导入全部文件并提交，返回输入行数"""
+        expected = 0
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET SESSION unique_checks = 0")
+        for source in self.sources:
+            columns = self._file_columns(source)
+            if self.method == "infile" and source.fmt == "text":
+                expected += self._load_infile(source, columns)
+            else:
+                expected += self._load_insert(source, columns)
+        self.connection.commit()
+        with self.connection.cursor() as cursor:
+            cursor.execute("SET SESSION unique_checks = 1")
+        return expected
+
+    def validate(self, expected: int, allow_empty: bool, max_shrink: Optional[float]) -> Tuple[int, Optional[int]]:
+        """
+        校验影子表行数，返回 (新行数, 正式表当前行数)
+        :raises ValueError: 行数与输入不一致（重复主键被忽略、行被截断等）、为空或比正式表缩水过多
+        """
+        loaded = count_rows(self.connection, self.shadow)
+        if loaded != expected:
+            raise ValueError(f"{self.table}: 输入 {expected} 行，影子表中为 {loaded} 行")
+        if not loaded and not allow_empty:
+            raise ValueError(f"{self.table}: 输入为空（使用 --allow-empty 允许导入空表）")
+        live = count_rows(self.connection, self.table)
+        if max_shrink is not None and live and loaded < live * (1 - max_shrink):
+            raise ValueError(f"{self.table}: 新批次 {loaded} 行，比当前 {live} 行减少超过 {max_shrink:.0%}")
+        return loaded, live
+
+
+def swap(connection, tables: List[str], keep_old: bool) -> None:
+    """一条 RENAME TABLE 同时换入所有影子表（MySQL 保证整条语句原子执行），再删除换出的旧表"""
+    pairs = []
+    for table in tables:
+        pairs.append(f"{_quote(table)} TO {_quote(RETIRED_PREFIX + table)}")
+        pairs.append(f"{_quote(SHADOW_PREFIX + table)} TO {_quote(table)}")
+    with connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS " + ", ".join(_quote(RETIRED_PREFIX + table) for table in tables))
+        cursor.execute("RENAME TABLE " + ", ".join(pairs))
+        if not keep_old:
+            cursor.execute("DROP TABLE " + ", ".join(_quote(RETIRED_PREFIX + table) for table in tables))
+
+
+def drop_shadows(connection, tables: List[str]) -> None:
+    """导入失败时清理影子表，正式表保持不变"""
+    if not tables:
+        return
+    try:
+        connection.rollback()
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS " + ", ".join(_quote(SHADOW_PREFIX + table) for table in tables))
+    except Exception as e:
+        print(f"drop shadow tables error: {e}")
+
+
+def connect(local_infile: bool):
+    """按应用配置连接 MySQL"""
+    return pymysql.connect(
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        database=settings.DB_NAME,
+        charset="utf8mb4",
+        local_infile=local_infile,
+        autocommit=False,
+    )
+
+
+def run(args: argparse.Namespace) -> int:
+    input_dir = Path(args.input)
+    requested = [name.strip() for name in args.tables.split(",")] if args.tables else None
+    unknown = [name for name in requested or [] if name not in EXPORT_MODELS]
+    if unknown:
+        print(f"未知的表: {', '.join(unknown)}")
+        return 2
+
+    plan = []
+    for table in requested or sorted(EXPORT_MODELS):
+        sources = find_sources(input_dir, table)
+        if sources:
+            plan.append((table, sources))
+        elif requested:
+            print(f"{table}: {input_dir} 中没有输入文件")
+            return 2
+    if not plan:
+        print(f"{input_dir} 中没有任何 ads_* 表的输入文件")
+        return 2
+
+    connection = connect(local_infile=args.method == "infile")
+    prepared = []
+    try:
+        for table, sources in plan:
+            started = time.perf_counter()
+            loader = TableLoader(connection, table, sources, args.method, args.batch_rows)
+            loader.prepare()
+            prepared.append(table)
+            expected = loader.load()
+            loaded, live = loader.validate(expected, args.allow_empty, args.max_shrink)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{table}: {len(sources)} 个文件，{loaded} 行（当前 {live if live is not None else '-'} 行），"
+                f"{elapsed:.1f}s，{loaded / max(elapsed, 1e-9):,.0f} 行/s"
+            )
+        if args.dry_run:
+            print("dry run：影子表已校验，不换入")
+            drop_shadows(connection, prepared)
+            return 0
+        swap(connection, prepared, args.keep_old)
+        print(f"已换入 {len(prepared)} 张表: {', '.join(prepared)}")
+        return 0
+    except Exception as e:
+        print(f"ads load error: {e}")
+        drop_shadows(connection, prepared)
+        return 1
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="把 Hive 导出文件原子地导入 ads_* 表")
+    parser.add_argument("--input", required=True, help="导出目录，每张表一个子目录或一个 .parquet 文件")
+    parser.add_argument("--tables", help="逗号分隔的表名，默认导入输入目录中存在的全部 ads_* 表")
+    parser.add_argument("--method", choices=METHODS, default="infile", help="文本文件的导入方式")
+    parser.add_argument("--batch-rows", type=int, default=settings.LOADER_BATCH_ROWS, help="insert 方式每批行数")
+    parser.add_argument("--allow-empty", action="store_true", help="允许导入空表")
+    parser.add_argument("--max-shrink", type=float, help="新批次比当前行数减少超过该比例（0-1）时放弃换入")
+    parser.add_argument("--keep-old", action="store_true", help="保留换出的旧表 _old_<表名>")
+    parser.add_argument("--dry-run", action="store_true", help="只导入并校验影子表，不换入")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+外排序会话统计（漏斗和桑基图）
+ads_conversion_funnel(_daily) 和 ads_user_path_sankey(_daily) 需要事件按 (user_session, event_time) 全局有序。
+本模块在本地对大于内存的原始事件文件做外部归并排序，再逐个会话走一遍得到漏斗步骤和路径转移计数，
+不要求输入按时间有序（etl/build_ads.py 的会话跟踪依赖输入大致按时间排序）。
+
+- 生成有序段（多进程）：未压缩的 CSV 按字节切分，每段约 SESSIONIZE_RUN_ROWS 行，由进程池中的进程各自读取、
+  只解析 event_time、event_type、user_id、user_session 四列，按 (会话, 时间, 原始顺序) 排序后
+  溢写为 .npy 文件；压缩文件不能按字节切分，整个文件由一个进程按块读取，每块一个有序段
+- 归并（单进程、有界内存）：每个有序段用 np.load(mmap_mode="r") 打开，各取一块缓冲（合计约
+  SESSIONIZE_RUN_ROWS 行）；所有缓冲中会话小于"各段缓冲末尾会话的最小值"的行都已完整，取出后排序、统计，
+  其余行留待下一轮，缓冲取空或只剩一个会话的段继续读取下一块
+- 统计口径与 build_ads 一致（节点、漏斗步骤、相邻相同类型合并、整个会话计在首个事件的日期上），
+  写出的四张表可直接覆盖 build_ads 输出目录中的同名表；区别是会话即整个 user_session，不按空闲时间切分
+
+内存：生成阶段每个进程约为一个有序段，归并阶段约为 2×SESSIONIZE_RUN_ROWS 行，与输入大小无关；
+溢写文件约占 (会话ID长度 + 17) 字节/行 的临时磁盘空间，结束后删除。
+
+用法（在 backend 目录下）：
+    python -m etl.sessionize --input /data/events/2019-Oct.csv --output /data/ads_build
+    python -m etl.sessionize --input /data/events --output /data/ads_build --workers 8 --tmp-dir /data/tmp
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from .build_ads import ENTER, EXIT, SECONDS_PER_DAY, _Partial, session_tables, write_table
+from .event_cache import EVENT_TYPES, event_files, parse_seconds
+
+try:
+    import pandas as pd
+except ImportError:  # 可选依赖，只有构建 ADS 表时才需要
+    pd = None
+
+SESSION_COLUMNS = ("event_time", "event_type", "user_id", "user_session")
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".zip", ".xz", ".zst", ".tar")
+# 按字节切分时用于估计平均行长的采样字节数
+SAMPLE_BYTES = 1 << 20
+# 归并阶段每个有序段的最小缓冲行数
+MIN_BLOCK_ROWS = 10000
+# 原始顺序编号：有序段所属任务序号左移 32 位 + 任务内行号
+SEQ_SHIFT = 32
+
+
+def plan_tasks(files: List[Path], run_rows: int) -> List[dict]:
+    """
+    每个文件切分为读取任务：未压缩文件按估计的平均行长切为约 run_rows 行的字节区间，压缩文件整个一个任务
+    任务按文件顺序、文件内偏移编号，编号即原始顺序编号的高位
+    """
+    tasks = []
+    for path in files:
+        if path.name.endswith(COMPRESSED_SUFFIXES):
+            tasks.append({"path": str(path), "start": 0, "end": None})
+            continue
+        with open(path, "rb") as f:
+            header_bytes = f.readline()
+            sample = f.read(SAMPLE_BYTES)
+        columns = header_bytes.decode("utf-8").strip().split(",")
+        size = path.stat().st_size
+        line_bytes = len(sample) / max(sample.count(b"\n"), 1)
+        split = max(int(run_rows * line_bytes), SAMPLE_BYTES)
+        start = len(header_bytes)
+        while start < size:
+            end = min(start + split, size)
+            tasks.append({"path": str(path), "start": start, "end": end, "columns": columns})
+            start = end
+    for index, task in enumerate(tasks):
+        task["index"] = index
+        task["run_rows"] = run_rows
+    return tasks
+
+
+def read_range(path: str, start: int, end: int) -> bytes:
+    """读取字节区间 [start, end) 内开始的完整行（区间开头的半行属于上一个区间，结尾的半行读完）"""
+    with open(path, "rb") as f:
+        f.seek(start - 1)
+        if f.read(1) != b"\n":
+            f.readline()
+        if f.tell() >= end:
+            return b""
+        data = f.read(end - f.tell())
+        if not data.endswith(b"\n"):
+            data += f.readline()
+    return data
+
+
+def to_records(raw, seq_base: int) -> np.ndarray:
+    """
+    原始事件块转为有序段记录 (session, ts, seq, type)，按 (会话, 时间, 原始顺序) 排序
+    丢弃规则与 build_ads.prepare_chunk 一致：未知事件类型、缺少会话或用户的行丢弃
+    """
+    kind = pd.Index(EVENT_TYPES).get_indexer(raw["event_type"]).astype(np.int8)
+    valid = (kind >= 0) & raw["user_session"].notna().to_numpy() & raw["user_id"].notna().to_numpy()
+    raw = raw[valid]
+    seconds = parse_seconds(raw["event_time"])
+    sessions = raw["user_session"].str.encode("utf-8").to_numpy().astype(np.bytes_)
+    records = np.empty(len(raw), dtype=[
+        ("session", sessions.dtype), ("ts", "<i8"), ("seq", "<i8"), ("type", "i1"),
+    ])
+    records["session"] = sessions
+    records["ts"] = seconds
+    records["seq"] = seq_base + np.flatnonzero(valid)
+    records["type"] = kind[valid]
+    return records[np.lexsort((records["seq"], records["ts"], records["session"]))]
+
+
+def make_runs(task: dict) -> Tuple[int, int, List[str]]:
+    """子进程：读取一个任务并溢写有序段，返回 (任务序号, 事件数, 有序段文件列表)"""
+    dtypes = {column: str for column in SESSION_COLUMNS}
+    seq_base = task["index"] << SEQ_SHIFT
+    if task["end"] is None:
+        chunks = pd.read_csv(task["path"], usecols=list(SESSION_COLUMNS), dtype=dtypes, chunksize=task["run_rows"])
+    else:
+        data = read_range(task["path"], task["start"], task["end"])
+        chunks = [pd.read_csv(
+            io.BytesIO(data), header=None, names=task["columns"], usecols=list(SESSION_COLUMNS), dtype=dtypes,
+        )] if data else []
+
+    runs, events, offset = [], 0, 0
+    for part, raw in enumerate(chunks):
+        records = to_records(raw.reset_index(drop=True), seq_base + offset)
+        offset += len(raw)
+        if not len(records):
+            continue
+        path = os.path.join(task["spill_dir"], f"run-{task['index']:06d}-{part:04d}.npy")
+        np.save(path, records)
+        runs.append(path)
+        events += len(records)
+    return task["index"], events, runs
+
+
+class RunReader:
+    """有序段的分块读取：文件以内存映射打开，buffer 为尚未取出的行"""
+
+    def __init__(self, path: str, dtype: np.dtype):
+        self.array = np.load(path, mmap_mode="r")
+        self.dtype = dtype
+        self.position = 0
+        self.buffer = self._read(0)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.position >= len(self.array)
+
+    def _read(self, rows: int) -> np.ndarray:
+        block = np.asarray(self.array[self.position:self.position + rows]).astype(self.dtype)
+        self.position += len(block)
+        return block
+
+    def refill(self, rows: int) -> None:
+        """读取下一块追加到缓冲"""
+        self.buffer = np.concatenate((self.buffer, self._read(rows)))
+
+    def take(self, bound: Optional[bytes]) -> np.ndarray:
+        """取出会话小于 bound 的行（bound 为 None 时取出全部）"""
+        count = len(self.buffer) if bound is None else int(np.searchsorted(self.buffer["session"], bound, "left"))
+        taken, self.buffer = self.buffer[:count], self.buffer[count:]
+        return taken
+
+
+def merge_runs(paths: List[str], buffer_rows: int):
+    """
+    k 路归并全部有序段，依次产出只包含完整会话、按 (会话, 时间, 原始顺序) 排序的记录块
+    各段缓冲末尾会话的最小值之前的会话不会再出现在任何段的后续数据中，可以安全取出
+    """
+    if not paths:
+        return
+    width = max(np.load(path, mmap_mode="r").dtype["session"].itemsize for path in paths)
+    dtype = np.dtype([("session", f"S{width}"), ("ts", "<i8"), ("seq", "<i8"), ("type", "i1")])
+    block_rows = max(buffer_rows // len(paths), MIN_BLOCK_ROWS)
+    readers = [RunReader(path, dtype) for path in paths]
+    for reader in readers:
+        reader.refill(block_rows)
+
+    while readers:
+        pending = [reader for reader in readers if not reader.exhausted]
+        bound = min(reader.buffer["session"][-1] for reader in pending) if pending else None
+        parts = [reader.take(bound) for reader in readers]
+        batch = np.concatenate(parts)
+        if len(batch):
+            yield batch[np.lexsort((batch["seq"], batch["ts"], batch["session"]))]
+        for reader in pending:
+            # 缓冲取空或只剩一个会话（可能未完整）时读取下一块，保证下一轮的界限前移
+            if not len(reader.buffer) or reader.buffer["session"][0] == reader.buffer["session"][-1]:
+                reader.refill(block_rows)
+        readers = [reader for reader in readers if len(reader.buffer) or not reader.exhausted]
+
+
+class SessionWalker:
+    """逐个完整会话统计：入口边、相邻类型不同的事件之间的边、离开边，以及会话的事件类型组合"""
+
+    def __init__(self):
+        self.edges = _Partial(["day", "source", "target"], {"flow_value": "sum"})
+        self.closed = _Partial(["day", "flags"], {"sessions": "sum"})
+        self.sessions = 0
+
+    def update(self, batch: np.ndarray) -> None:
+        session = batch["session"]
+        ts = batch["ts"]
+        kind = batch["type"].astype(np.int64)
+        first = np.r_[True, session[1:] != session[:-1]]
+        starts = np.flatnonzero(first)
+        ends = np.r_[starts[1:], len(batch)] - 1
+        start_day = ts[starts] // SECONDS_PER_DAY
+        day = start_day[np.cumsum(first) - 1]
+
+        step = ~first[1:] & (kind[1:] != kind[:-1])
+        count = len(starts)
+        part = pd.DataFrame({
+            "day": np.r_[start_day, day[:-1][step], start_day],
+            "source": np.r_[np.full(count, ENTER), kind[:-1][step], kind[ends]],
+            "target": np.r_[kind[starts], kind[1:][step], np.full(count, EXIT)],
+        })
+        self.edges.add(part.groupby(["day", "source", "target"], sort=False).size().reset_index(name="flow_value"))
+
+        flags = np.bitwise_or.reduceat(np.left_shift(1, kind), starts)
+        part = pd.DataFrame({"day": start_day, "flags": flags})
+        self.closed.add(part.groupby(["day", "flags"], sort=False).size().reset_index(name="sessions"))
+        self.sessions += count
+
+    def tables(self) -> dict:
+        return session_tables(self.edges.result(), self.closed.result())
+
+
+def run(args: argparse.Namespace) -> int:
+    if pd is None:
+        print("外排序会话统计需要安装 pandas")
+        return 2
+    files = event_files(args.input)
+    missing = [str(path) for path in files if not path.is_file()]
+    if missing or not files:
+        print(f"找不到事件文件: {', '.join(missing) or ', '.join(args.input)}")
+        return 2
+
+    output_dir = Path(args.output)
+    started = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="sessionize-", dir=args.tmp_dir) as spill_dir:
+            tasks = plan_tasks(files, args.run_rows)
+            for task in tasks:
+                task["spill_dir"] = spill_dir
+            print(f"{len(files)} 个文件，{len(tasks)} 个读取任务，{args.workers} 个进程")
+
+            runs: List[Tuple[int, List[str]]] = []
+            events = 0
+            with ProcessPoolExecutor(max_workers=args.workers) as pool:
+                futures = [pool.submit(make_runs, task) for task in tasks]
+                for finished, future in enumerate(as_completed(futures), 1):
+                    index, rows, paths = future.result()
+                    runs.append((index, paths))
+                    events += rows
+                    elapsed = time.perf_counter() - started
+                    print(f"[{finished}/{len(tasks)}] 有序段 {events:,} 个事件，{events / max(elapsed, 1e-9):,.0f} 行/s")
+            paths = [path for _, task_paths in sorted(runs) for path in task_paths]
+
+            walker = SessionWalker()
+            merged = 0
+            merge_started = time.perf_counter()
+            for batch in merge_runs(paths, args.run_rows):
+                walker.update(batch)
+                merged += len(batch)
+            print(
+                f"归并 {len(paths)} 个有序段：{merged:,} 个事件，{walker.sessions:,} 个会话，"
+                f"用时 {time.perf_counter() - merge_started:.1f}s"
+            )
+        if merged != events:
+            print(f"事件数校验失败：有序段 {events} 个，归并 {merged} 个")
+            return 1
+        tables = walker.tables()
+        for table in sorted(tables):
+            print(f"{table}: {write_table(output_dir, table, tables[table])} 行")
+    except Exception as e:
+        print(f"sessionize error: {e}")
+        return 1
+    print(f"已写入 {len(tables)} 张表到 {output_dir}，用时 {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="外部归并排序原始事件，按会话统计漏斗和桑基图，输出为 etl.loader 的输入目录")
+    parser.add_argument("--input", required=True, nargs="+", help="事件 CSV 文件或目录（可多个）")
+    parser.add_argument("--output", required=True, help="输出目录，每张表一个子目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="生成有序段的进程数，默认为 CPU 核数")
+    parser.add_argument(
+        "--run-rows", type=int, default=settings.SESSIONIZE_RUN_ROWS,
+        help="每个有序段的事件行数（同时是归并阶段缓冲的总行数）",
+    )
+    parser.add_argument("--tmp-dir", help="溢写文件目录，默认为系统临时目录")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+批量 SKU 销量预测
+读取 ads_sku_sales_daily 中每个 SKU 最近 SKU_FORECAST_HISTORY_DAYS 天的日销量（缺失日期按 0 计），
+为每个 SKU 预测未来 FORECAST_HORIZON 天，结果写入 ads_sku_sales_daily_prediction。
+
+- 分片：SKU 按商品ID排序后每 SKU_FORECAST_SHARD_SIZE 个一片，分片以商品ID区间表示，按主键范围读取
+- 并行：分片分发到进程池，每个进程用自己的数据库连接读取、拟合、写入，父进程只负责调度和进度；
+  每个进程只用一个 BLAS 线程，并行度完全由进程数决定，单机上随核数近似线性扩展
+- 向量化：一个分片的全部 SKU 组成矩阵，由 app.utils.forecast.forecast_batch 一次拟合全部模型并逐 SKU 选模型
+- 原子：结果先写入影子表 _load_ads_sku_sales_daily_prediction，全部分片完成且行数校验通过后 RENAME 换入
+- 断点续跑：每完成一个分片写一次检查点文件；中断后用相同参数重新运行，跳过已完成的分片
+  （分片写入前先删除该分片区间内的旧结果，重复执行同一分片不会产生重复行）
+
+用法（在 backend 目录下）：
+    python -m etl.sku_forecast
+    python -m etl.sku_forecast --workers 8 --base-date 2019-10-31
+"""
+import os
+
+# 每个进程只用一个 BLAS 线程，避免 进程数 × 线程数 超额占用 CPU（须在导入 NumPy 之前设置）
+for _name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_name, "1")
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.config.settings import settings
+from app.models.data import SkuSalesDaily, SkuSalesDailyPrediction
+from app.utils.forecast import INTERVAL_Z, forecast_batch
+from .loader import SHADOW_PREFIX, connect, count_rows, prepare_shadow, swap
+
+SOURCE_TABLE = SkuSalesDaily.__tablename__
+TARGET_TABLE = SkuSalesDailyPrediction.__tablename__
+SHADOW_TABLE = SHADOW_PREFIX + TARGET_TABLE
+SEASON = 7
+
+_INSERT_SQL = (
+    f"INSERT INTO `{SHADOW_TABLE}` "
+    "(product_id, dt, forecast_sales, lower_bound, upper_bound, model_name) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+
+
+def plan_shards(connection, shard_size: int) -> List[Tuple[str, str]]:
+    """按商品ID排序切分 SKU，返回每个分片的 (首个商品ID, 末个商品ID)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT product_id FROM `{SOURCE_TABLE}` ORDER BY product_id")
+        ids = [row[0] for row in cursor.fetchall()]
+    return [(ids[i], ids[min(i + shard_size, len(ids)) - 1]) for i in range(0, len(ids), shard_size)]
+
+
+def latest_date(connection) -> Optional[date]:
+    """日销量表的最后日期"""
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(dt) FROM `{SOURCE_TABLE}`")
+        return cursor.fetchone()[0]
+
+
+def build_matrix(rows, start: date, days: int) -> Tuple[List[str], np.ndarray]:
+    """(商品ID, 日期, 销量) 行转为 (SKU数, 天数) 的销量矩阵，缺失日期为 0"""
+    ids = sorted({row[0] for row in rows})
+    position = {product_id: i for i, product_id in enumerate(ids)}
+    matrix = np.zeros((len(ids), days))
+    if rows:
+        sku_idx = np.fromiter((position[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+        day_idx = np.fromiter(((row[1] - start).days for row in rows), dtype=np.int64, count=len(rows))
+        sales = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        np.add.at(matrix, (sku_idx, day_idx), sales)
+    return ids, matrix
+
+
+def fit_shard(task: dict) -> Tuple[int, int, int]:
+    """
+    子进程：读取一个分片、批量拟合并写入影子表，返回 (分片序号, SKU数, 写入行数)
+    删除分片区间内的旧结果和写入新结果在同一事务中完成
+    """
+    base = date.fromisoformat(task["base"])
+    days, horizon = task["history_days"], task["horizon"]
+    start = base - timedelta(days=days - 1)
+    connection = connect(local_infile=False)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id, dt, sales_count FROM `{SOURCE_TABLE}` "
+                "WHERE product_id BETWEEN %s AND %s AND dt BETWEEN %s AND %s",
+                (task["first"], task["last"], start, base),
+            )
+            rows = cursor.fetchall()
+        ids, matrix = build_matrix(rows, start, days)
+        if not ids:
+            return task["index"], 0, 0
+
+        names, mean, std = forecast_batch(matrix, horizon, SEASON)
+        forecast = np.maximum(mean, 0).round(3)
+        lower = np.maximum(mean - INTERVAL_Z * std, 0).round(3)
+        upper = np.maximum(mean + INTERVAL_Z * std, 0).round(3)
+        dates = [base + timedelta(days=k) for k in range(1, horizon + 1)]
+        records = [
+            (product_id, dates[k], float(forecast[i, k]), float(lower[i, k]), float(upper[i, k]), names[i])
+            for i, product_id in enumerate(ids)
+            for k in range(horizon)
+        ]
+
+        batch_rows = settings.LOADER_BATCH_ROWS
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM `{SHADOW_TABLE}` WHERE product_id BETWEEN %s AND %s",
+                (task["first"], task["last"]),
+            )
+            for i in range(0, len(records), batch_rows):
+                cursor.executemany(_INSERT_SQL, records[i:i + batch_rows])
+        connection.commit()
+        return task["index"], len(ids), len(records)
+    finally:
+        connection.close()
+
+
+class Checkpoint:
+    """断点续跑检查点：运行参数 + 已完成分片的 SKU 数和写入行数"""
+
+    def __init__(self, path: Path, params: dict):
+        self.path = path
+        self.params = params
+        self.done: Dict[int, Tuple[int, int]] = {}
+
+    def load(self) -> bool:
+        """读取检查点；参数与本次运行一致时恢复已完成分片并返回 True"""
+        if not self.path.exists():
+            return False
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"checkpoint read error: {e}")
+            return False
+        if state.get("params") != self.params:
+            print(f"检查点 {self.path} 的参数与本次运行不同，重新开始")
+            return False
+        self.done = {int(index): tuple(counts) for index, counts in state["done"].items()}
+        return True
+
+    def save(self) -> None:
+        """先写临时文件再替换，中断时不会留下损坏的检查点"""
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps({"params": self.params, "done": self.done}), encoding="utf-8")
+        os.replace(temporary, self.path)
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+def run(args: argparse.Namespace) -> int:
+    connection = connect(local_infile=False)
+    try:
+        base = date.fromisoformat(args.base_date) if args.base_date else latest_date(connection)
+        if base is None:
+            print(f"{SOURCE_TABLE} 为空")
+            return 2
+        shards = plan_shards(connection, args.shard_size)
+        params = {
+            "base": base.isoformat(),
+            "history_days": args.history_days,
+            "horizon": args.horizon,
+            # 以列表保存，与从 JSON 读回的检查点参数可直接比较
+            "shards": [list(shard) for shard in shards],
+        }
+        checkpoint = Checkpoint(Path(args.checkpoint or f"sku_forecast.{base.isoformat()}.ckpt"), params)
+        resumed = checkpoint.load() and count_rows(connection, SHADOW_TABLE) is not None
+        if resumed:
+            print(f"从检查点继续：已完成 {len(checkpoint.done)}/{len(shards)} 个分片")
+        else:
+            checkpoint.done = {}
+            prepare_shadow(connection, TARGET_TABLE)
+            checkpoint.save()
+
+        pending = [
+            {"index": i, "first": first, "last": last, "base": base.isoformat(),
+             "history_days": args.history_days, "horizon": args.horizon}
+            for i, (first, last) in enumerate(shards) if i not in checkpoint.done
+        ]
+        print(f"{len(shards)} 个分片，待处理 {len(pending)} 个，{args.workers} 个进程，预测基准日 {base}")
+
+        started = time.perf_counter()
+        processed = finished = 0
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(fit_shard, task) for task in pending]
+            for future in as_completed(futures):
+                index, skus, rows = future.result()
+                checkpoint.done[index] = (skus, rows)
+                checkpoint.save()
+                processed += skus
+                finished += 1
+                elapsed = time.perf_counter() - started
+                rate = processed / max(elapsed, 1e-9)
+                eta = (len(pending) - finished) * elapsed / finished
+                print(
+                    f"[{len(checkpoint.done)}/{len(shards)}] 分片 {index}: {skus} 个SKU，{rows} 行；"
+                    f"{rate:,.0f} SKU/s，剩余约 {eta:.0f}s"
+                )
+
+        expected = sum(rows for _, rows in checkpoint.done.values())
+        loaded = count_rows(connection, SHADOW_TABLE)
+        if loaded != expected:
+            print(f"行数校验失败：应为 {expected} 行，影子表中为 {loaded} 行")
+            return 1
+        swap(connection, [TARGET_TABLE], keep_old=False)
+        checkpoint.remove()
+        skus = sum(skus for skus, _ in checkpoint.done.values())
+        print(f"已换入 {TARGET_TABLE}：{skus} 个SKU，{expected} 行，用时 {time.perf_counter() - started:.1f}s")
+        return 0
+    except Exception as e:
+        # 影子表和检查点保留，修复后用相同参数重新运行即可继续
+        print(f"sku forecast error: {e}")
+        return 1
+    finally:
+        connection.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量 SKU 销量预测，写入 ads_sku_sales_daily_prediction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="进程数，默认为 CPU 核数")
+    parser.add_argument("--shard-size", type=int, default=settings.SKU_FORECAST_SHARD_SIZE, help="每个分片的 SKU 数")
+    parser.add_argument("--history-days", type=int, default=settings.SKU_FORECAST_HISTORY_DAYS, help="拟合使用的天数")
+    parser.add_argument("--horizon", type=int, default=settings.FORECAST_HORIZON, help="预测天数")
+    parser.add_argument("--base-date", help="预测基准日 YYYY-MM-DD（预测其后的日期），默认为日销量表的最后日期")
+    parser.add_argument("--checkpoint", help="检查点文件，默认为 sku_forecast.<基准日>.ckpt")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
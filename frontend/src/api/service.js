@@ -74,6 +74,23 @@ export function fetchDashboardData(startDate, endDate) {
   return api.get('/data/dashboard', { params })
 }
 
+/**
+ * 订阅驾驶舱数据推送（Server-Sent Events）
+ * 连接后服务端先推送一次当前数据，之后只在数据集刷新时推送，无需定时轮询
+ * @param {string} startDate - YYYY-MM-DD
+ * @param {string} endDate - YYYY-MM-DD
+ * @param {Function} onData - 收到数据时的回调，参数与 fetchDashboardData 的返回值相同
+ * @returns {Function} 取消订阅
+ */
+export function subscribeDashboardData(startDate, endDate, onData) {
+  const params = new URLSearchParams()
+  if (startDate) params.set('start_date', startDate)
+  if (endDate) params.set('end_date', endDate)
+  const source = new EventSource(`${api.defaults.baseURL}/data/stream/dashboard?${params}`)
+  source.addEventListener('payload', (event) => onData(JSON.parse(event.data)))
+  return () => source.close()
+}
+
 /**
  * 获取转化数据
  */